@@ -0,0 +1,55 @@
+import argparse
+import sys
+
+from benchmarks.cases import CASES
+from benchmarks.runner import run_benchmarks, write_results, read_results, compare
+
+
+def main(arguments=None):
+    """
+    Runs the benchmarks or compares two result files.
+        python -m benchmarks run --output results.json [--simulators fluid cloth] [--sizes 16 32]
+        python -m benchmarks compare baseline.json results.json [--threshold 0.15]
+    :return: the exit code, 1 if the comparison found regressions
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=main.__doc__.split(':return')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="run the benchmarks and write the results as JSON")
+    run.add_argument('--output', '-o', default='benchmark_results.json', help="the file to write the results to")
+    run.add_argument('--simulators', nargs='+', choices=list(CASES), help="the simulators to benchmark (default: all)")
+    run.add_argument('--variants', nargs='+', help="the variants to benchmark, e.g. implicit_euler (default: all)")
+    run.add_argument(
+        '--sizes', nargs='+', type=int, help="the problem sizes of all simulators (default: per simulator)"
+    )
+    run.add_argument('--min-seconds', type=float, default=0.5, help="the minimum timed duration of every case")
+
+    comparison = commands.add_parser('compare', help="flag regressions between two result files")
+    comparison.add_argument('baseline', help="the results of the reference run")
+    comparison.add_argument('current', help="the results of the new run")
+    comparison.add_argument('--threshold', type=float, default=0.15, help="the relative change flagged as regression")
+
+    arguments = parser.parse_args(arguments)
+    if arguments.command == 'run':
+        results = run_benchmarks(arguments.simulators, arguments.variants, arguments.sizes, arguments.min_seconds)
+        write_results(results, arguments.output)
+        print(f"Wrote {len(results['results'])} results to {arguments.output}")
+        return 0
+
+    regressions = compare(read_results(arguments.baseline), read_results(arguments.current), arguments.threshold)
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression['simulator']} {regression['variant']} {regression['size']}: "
+            f"{regression['metric']} {regression['baseline']:.4g} -> {regression['current']:.4g} "
+            f"({regression['change']:+.1%})"
+        )
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
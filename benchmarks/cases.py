@@ -0,0 +1,234 @@
+import os
+
+import numpy as np
+import scipy.sparse as sp
+import scipy.sparse.linalg as spl
+
+from heated_plate import heated_plate_simulation as hps
+from cloth_simulation import cloth_simulation as cs, rk2_simulation as rk2, implicit_euler as ie
+from fluid_simulation import fluid_simulation as fs, fluid_simulation_3d as fs3d, projection_3d
+from fluid_simulation.projection import setup_solver, clear_solver_cache
+
+# ---------- Heated plate, the configuration of heated_plate_animation ----------
+heat_diffusion_constant = 250
+heat_dx = 1
+heat_dt = 0.001  # the forward euler method is stable for a * dt / dx^2 <= 0.25
+heat_boundary_conditions = ['wrap_around', 'isolated', 'unisolated']
+
+# ---------- Cloth, the configuration of cloth_animation ----------
+cloth_mass = 0.3
+cloth_spacing = 1
+cloth_spring_constants = np.array([100, 50, 10])
+cloth_damping_constants = np.array([0, 0, 0])
+cloth_gravity = np.array([0, 0, 10])
+cloth_dt = 0.01
+cloth_fixed_corners = 2
+
+# ---------- Fluid, the configuration of fluid_animation ----------
+fluid_rho = 1.5
+fluid_dt = 0.02
+fluid_advection_scheme = 'semi_lagrangian'
+fluid_backtrace = 'euler'
+# the threaded variants use the most expensive advection, whose bands of rows are run in parallel. They scale from one
+# thread to all cores in powers of two
+cpu_count = os.cpu_count() or 1
+fluid_workers = sorted({2 ** power for power in range(cpu_count.bit_length())} | {cpu_count})
+fluid_banded_advection_scheme = 'maccormack'
+fluid_banded_backtrace = 'rk2'
+
+# ---------- Fluid ensembles, two random vortices per member ----------
+ensemble_spacial_dim = 32
+ensemble_solver = 'direct'
+
+# ---------- 3D smoke, a ball of smoke rising by its buoyancy ----------
+smoke_dt = 0.2
+smoke_buoyancy = 1
+
+
+def heated_plate_case(simulator, boundary_conditions):
+    """
+    :param simulator: 'forward' or 'implicit', see heated_plate_simulation.run_simulation
+    :param boundary_conditions: 'wrap_around', 'isolated' or 'unisolated'
+    :return: a function size -> step, which sets up a heated plate of size x size points like run_simulation and
+    returns a function performing one step
+    """
+    def setup(size):
+        fdm_matrix = hps.generate_sparse_fdm_matrix(size, boundary_conditions)
+        grid = np.zeros(size ** 2)
+        grid[(size // 4) * size + size // 4] = 750
+        state = [grid]
+
+        if simulator == 'forward':
+            def step():
+                state[0] = hps.calculate_forward_euler_step(
+                    state[0], heat_dx, heat_dt, heat_diffusion_constant, fdm_matrix
+                )
+        else:
+            solve = spl.factorized(
+                sp.eye(size ** 2).tocsc() - heat_diffusion_constant * heat_dt / heat_dx ** 2 * fdm_matrix.tocsc()
+            )
+
+            def step():
+                state[0] = hps.calculate_implicit_euler_step(state[0], solve)
+
+        return step
+
+    return setup
+
+
+def cloth_case(simulation_type):
+    """
+    :param simulation_type: 'rk2' or 'implicit_euler', see cloth_simulation.run_simulation
+    :return: a function size -> step, which sets up a cloth of size x size vertices like run_simulation and returns a
+    function performing one step
+    """
+    def setup(size):
+        positions = cs.setup_positions(size, cloth_spacing).reshape((size * size, 3))
+        state = [positions, np.zeros((size * size, 3))]
+
+        if simulation_type == 'rk2':
+            def step():
+                state[:] = rk2.step(
+                    size, state[0], state[1], cloth_mass, cloth_spacing, cloth_spring_constants,
+                    cloth_damping_constants, cloth_gravity, cloth_dt, cloth_fixed_corners
+                )
+        else:
+            M = ie.setup_M(cloth_mass, size)
+            Ds = ie.setup_Ds(cloth_damping_constants, size)
+
+            def step():
+                state[:] = ie.step(
+                    size, state[0], state[1], M, cloth_spacing, cloth_spring_constants, cloth_damping_constants, Ds,
+                    cloth_gravity, cloth_dt, cloth_fixed_corners
+                )
+
+        return step
+
+    return setup
+
+
+def fluid_case(solver, advection_scheme=fluid_advection_scheme, backtrace=fluid_backtrace, workers=1, allocating=False):
+    """
+    :param solver: the pressure solver, 'direct', 'spectral' or 'cg' (see projection.setup_solver)
+    :param advection_scheme: the advection scheme, see advection.advect_fields
+    :param backtrace: the integration of the backtrace, see advection.trace_faces
+    :param workers: the number of threads running the advection and the projection in bands of rows
+    :param allocating: step with fluid_simulation.step, which allocates new grids every step, instead of a FluidStepper
+    :return: a function size -> step, which sets up two vortices in a box of size x size cells and returns a function
+    performing one step. The cached solvers are cleared, so the setup includes their factorization
+    """
+    def setup(size):
+        clear_solver_cache()
+        velocities = fs.setup_vortices(size, [5, 5], [(size / 3, size / 3), (2 * size / 3, 2 * size / 3)], [True, True])
+        solve = setup_solver(size, solver)
+        if not allocating:
+            stepper = fs.FluidStepper(
+                velocities, solve, fluid_dt, fluid_rho, advection_scheme, backtrace, workers=workers
+            )
+            return stepper.step
+
+        state = [velocities]
+
+        def step():
+            state[0], _, _ = fs.step(state[0], solve, fluid_dt, fluid_rho, advection_scheme, backtrace, workers=workers)
+
+        return step
+
+    return setup
+
+
+def fluid_ensemble_case(batched):
+    """
+    :param batched: whether the members are stepped as one batch of grids (see fluid_simulation.run_ensemble) or one
+    by one
+    :return: a function size -> step, which sets up an ensemble of size members, each with two random vortices, and
+    returns a function performing one step of all members
+    """
+    def setup(size):
+        clear_solver_cache()
+        rng = np.random.default_rng(0)
+        speeds = rng.uniform(1, 6, size=(size, 2)).tolist()
+        centers = rng.uniform(0.2 * ensemble_spacial_dim, 0.8 * ensemble_spacial_dim, size=(size, 2, 2)).tolist()
+        clockwise = (rng.random((size, 2)) < 0.5).tolist()
+        solve = setup_solver(ensemble_spacial_dim, ensemble_solver)
+
+        if batched:
+            velocities = fs.setup_ensemble(ensemble_spacial_dim, speeds, centers, clockwise)
+            return fs.FluidStepper(velocities, solve, fluid_dt, fluid_rho, fluid_advection_scheme).step
+
+        steppers = [
+            fs.FluidStepper(
+                fs.setup_vortices(ensemble_spacial_dim, speeds[member], centers[member], clockwise[member]), solve,
+                fluid_dt, fluid_rho, fluid_advection_scheme
+            )
+            for member in range(size)
+        ]
+
+        def step():
+            for stepper in steppers:
+                stepper.step()
+
+        return step
+
+    return setup
+
+
+def fluid_3d_case(solver):
+    """
+    :param solver: the pressure solver, 'spectral' or 'cg' (see projection_3d.setup_solver). The direct solver only
+    fits small grids
+    :return: a function size -> step, which sets up a ball of smoke in a box of size^3 cells and returns a function
+    performing one step
+    """
+    def setup(size):
+        velocities, smoke = fs3d.setup_smoke(size, (size / 2, 0.75 * size, size / 2), size / 8)
+        solve = projection_3d.setup_solver(size, solver)
+        state = [velocities, smoke]
+
+        def step():
+            state[0], _, state[1] = fs3d.step(state[0], solve, smoke_dt, scalars=state[1], buoyancy=smoke_buoyancy)
+
+        return step
+
+    return setup
+
+
+# the benchmark cases of every simulator, keyed by their variant
+CASES = {
+    'heated_plate': {
+        f"{simulator}-{boundary_conditions}": heated_plate_case(simulator, boundary_conditions)
+        for simulator in ['forward', 'implicit']
+        for boundary_conditions in heat_boundary_conditions
+    },
+    'cloth': {simulation_type: cloth_case(simulation_type) for simulation_type in ['rk2', 'implicit_euler']},
+    'fluid': {
+        **{solver: fluid_case(solver) for solver in ['direct', 'spectral', 'cg']},
+        'spectral-allocating': fluid_case('spectral', allocating=True),
+        **{
+            f"banded-{workers}-workers": fluid_case(
+                'spectral', fluid_banded_advection_scheme, fluid_banded_backtrace, workers
+            )
+            for workers in fluid_workers
+        },
+    },
+    'fluid_ensemble': {'batched': fluid_ensemble_case(True), 'one-by-one': fluid_ensemble_case(False)},
+    'fluid_3d': {solver: fluid_3d_case(solver) for solver in ['spectral', 'cg']},
+}
+
+# the problem sizes of every simulator: the points along each axis of the plate, the vertices along each axis of the
+# cloth, the cells along each axis of the fluid, the members of the ensembles and the cells along each axis of the smoke
+SIZES = {
+    'heated_plate': [25, 50, 100],
+    'cloth': [4, 8, 16],
+    'fluid': [32, 64, 128],
+    'fluid_ensemble': [1, 4, 16, 64],
+    'fluid_3d': [16, 32, 64],
+}
+
+# the sizes of the variants, which are measured on other sizes than the rest of their simulator: the banded kernels
+# only pay off on large grids, the allocations of the stepper are compared to the allocating step on a 256x256 grid
+VARIANT_SIZES = {
+    **{('fluid', f"banded-{workers}-workers"): [256, 1024] for workers in fluid_workers},
+    ('fluid', 'spectral'): [32, 64, 128, 256],
+    ('fluid', 'spectral-allocating'): [32, 64, 128, 256],
+}
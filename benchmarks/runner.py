@@ -0,0 +1,192 @@
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+
+from benchmarks.cases import CASES, SIZES, VARIANT_SIZES
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# the metrics compared between two result files, and whether larger values are better
+METRICS = {
+    'steps_per_second': True,
+    'setup_seconds': False,
+    'peak_traced_bytes': False,
+    'step_peak_traced_bytes': False,
+}
+
+# timings below this many seconds are dominated by noise and are not compared
+MIN_COMPARED_SECONDS = 1e-3
+
+
+def measure(setup, size, min_seconds=0.5, min_steps=3, max_steps=10000):
+    """
+    Measures one benchmark case. The timings and the memory are measured in separate runs, since tracing the memory
+    slows down the steps.
+    :param setup: a function size -> step, see benchmarks.cases
+    :param size: the problem size
+    :param min_seconds: the steps are repeated for at least this long
+    :param min_steps: the minimum number of timed steps
+    :param max_steps: the maximum number of timed steps
+    :return: a dict with the setup time, the number of timed steps, the steps per second, the peak memory allocated by
+    Python and NumPy during the setup and one step (traced by tracemalloc), the peak memory allocated by a step at
+    steady state and the memory it keeps allocated (both on top of the memory allocated before the step), and the peak
+    resident memory of the process so far (None, where it is not available)
+    """
+    gc.collect()
+    start = time.perf_counter()
+    step = setup(size)
+    setup_seconds = time.perf_counter() - start
+
+    step()  # the first step might allocate buffers and warm up caches
+    steps = 0
+    start = time.perf_counter()
+    while steps < min_steps or (time.perf_counter() - start < min_seconds and steps < max_steps):
+        step()
+        steps += 1
+    seconds = time.perf_counter() - start
+    del step
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        step = setup(size)
+        step()
+        _, peak_traced_bytes = tracemalloc.get_traced_memory()
+        # the second step runs at steady state, the buffers allocated by the first step are reused
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        step()
+        after, step_peak = tracemalloc.get_traced_memory()
+        del step
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'setup_seconds': setup_seconds,
+        'steps': steps,
+        'steps_per_second': steps / seconds,
+        'peak_traced_bytes': peak_traced_bytes,
+        'step_peak_traced_bytes': step_peak - before,
+        'step_retained_bytes': after - before,
+        'max_rss_bytes': max_rss_bytes(),
+    }
+
+
+def max_rss_bytes():
+    """
+    :return: the peak resident memory of the process in bytes, or None, where it is not available
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kibibytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def machine_info():
+    """
+    :return: a description of the machine and the library versions, which is stored with the results
+    """
+    return {
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+    }
+
+
+def run_benchmarks(simulators=None, variants=None, sizes=None, min_seconds=0.5, log=print):
+    """
+    Runs the benchmark cases of the simulators across their problem sizes
+    :param simulators: None for all simulators, or a list of the simulators (see benchmarks.cases.CASES)
+    :param variants: None for all variants, or a list of the variants to run (e.g. 'implicit_euler')
+    :param sizes: None for the default sizes of every case (see benchmarks.cases.SIZES and VARIANT_SIZES), or a list
+    of sizes used for all cases
+    :param min_seconds: the steps of every case are repeated for at least this long
+    :param log: a function receiving a line of progress for every case, None for no output
+    :return: a dict with the machine information and a list of the results of every case
+    """
+    simulators = list(CASES) if simulators is None else simulators
+    for simulator in simulators:
+        if simulator not in CASES:
+            raise ValueError(f"Invalid simulator '{simulator}'. Please choose from {', '.join(CASES)}")
+
+    results = []
+    for simulator in simulators:
+        for variant, setup in CASES[simulator].items():
+            if variants is not None and variant not in variants:
+                continue
+            default_sizes = VARIANT_SIZES.get((simulator, variant), SIZES[simulator])
+            for size in default_sizes if sizes is None else sizes:
+                result = {'simulator': simulator, 'variant': variant, 'size': size}
+                result.update(measure(setup, size, min_seconds))
+                results.append(result)
+                if log is not None:
+                    log(
+                        f"{simulator:>14} {variant:>22} {size:>5}: setup {result['setup_seconds']:8.4f} s, "
+                        f"{result['steps_per_second']:10.2f} steps/s, "
+                        f"peak {result['peak_traced_bytes'] / 2 ** 20:8.2f} MiB, "
+                        f"peak per step {result['step_peak_traced_bytes'] / 2 ** 20:8.2f} MiB"
+                    )
+    return {'machine': machine_info(), 'results': results}
+
+
+def write_results(results, path):
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def read_results(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(baseline, current, threshold=0.15):
+    """
+    Compares the results of two benchmark runs. A case is matched by its simulator, variant and size, cases missing in
+    one of the runs are skipped.
+    :param baseline: the results of the reference run, see run_benchmarks
+    :param current: the results of the new run
+    :param threshold: the relative change of a metric, above which it is flagged as a regression
+    :return: a list of the regressions, each a dict with the case, the metric, both values and the relative change
+    (positive for a regression)
+    """
+    def key(result):
+        return result['simulator'], result['variant'], result['size']
+
+    baseline_results = {key(result): result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        reference = baseline_results.get(key(result))
+        if reference is None:
+            continue
+        for metric, larger_is_better in METRICS.items():
+            before, after = reference.get(metric), result.get(metric)
+            if before is None or after is None or before <= 0:
+                continue
+            if metric.endswith('seconds') and max(before, after) < MIN_COMPARED_SECONDS:
+                continue
+            change = (before - after) / before if larger_is_better else (after - before) / before
+            if change > threshold:
+                regressions.append({
+                    'simulator': result['simulator'],
+                    'variant': result['variant'],
+                    'size': result['size'],
+                    'metric': metric,
+                    'baseline': before,
+                    'current': after,
+                    'change': change,
+                })
+    return regressions
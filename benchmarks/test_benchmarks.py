@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from benchmarks.__main__ import main
+from benchmarks.cases import VARIANT_SIZES, fluid_workers
+from benchmarks.runner import run_benchmarks, write_results, read_results, compare
+
+
+class BenchmarksTest(unittest.TestCase):
+    def test_run_benchmarks(self):
+        lines = []
+        results = run_benchmarks(
+            ['heated_plate', 'cloth', 'fluid'], ['implicit-isolated', 'rk2', 'spectral'], [6], min_seconds=0,
+            log=lines.append
+        )
+
+        self.assertEqual(len(lines), 3)
+        self.assertEqual([result['simulator'] for result in results['results']], ['heated_plate', 'cloth', 'fluid'])
+        for result in results['results']:
+            self.assertEqual(result['size'], 6)
+            self.assertGreaterEqual(result['steps'], 3)
+            self.assertGreater(result['steps_per_second'], 0)
+            self.assertGreater(result['peak_traced_bytes'], 0)
+            self.assertGreaterEqual(result['peak_traced_bytes'], result['step_peak_traced_bytes'])
+        self.assertIn('numpy', results['machine'])
+
+        with self.assertRaises(ValueError):
+            run_benchmarks(['water'])
+
+    def test_fluid_cases(self):
+        variants = ['spectral', 'spectral-allocating', 'banded-1-workers', 'batched', 'one-by-one', 'cg']
+        results = run_benchmarks(['fluid', 'fluid_ensemble', 'fluid_3d'], variants, [4], min_seconds=0, log=None)
+        self.assertEqual([(result['simulator'], result['variant']) for result in results['results']], [
+            ('fluid', 'spectral'), ('fluid', 'cg'), ('fluid', 'spectral-allocating'), ('fluid', 'banded-1-workers'),
+            ('fluid_ensemble', 'batched'), ('fluid_ensemble', 'one-by-one'),
+            ('fluid_3d', 'spectral'), ('fluid_3d', 'cg')
+        ])
+        self.assertTrue(all(result['steps_per_second'] > 0 for result in results['results']))
+
+        # the banded kernels scale from one thread to all cores on grids of up to 1024x1024 cells
+        self.assertEqual(fluid_workers[0], 1)
+        self.assertEqual(fluid_workers[-1], os.cpu_count() or 1)
+        self.assertEqual(VARIANT_SIZES[('fluid', f"banded-{fluid_workers[-1]}-workers")][-1], 1024)
+
+        # the stepper reuses its grids and its pressure, the allocating step keeps new ones after every step
+        stepper, allocating = results['results'][0], results['results'][2]
+        self.assertLess(stepper['step_retained_bytes'], allocating['step_retained_bytes'])
+        self.assertIn(256, VARIANT_SIZES[('fluid', 'spectral')])
+
+    def test_compare(self):
+        def result(steps_per_second, setup_seconds, size=32):
+            return {
+                'simulator': 'fluid', 'variant': 'direct', 'size': size, 'steps_per_second': steps_per_second,
+                'setup_seconds': setup_seconds, 'peak_traced_bytes': 1000
+            }
+
+        baseline = {'results': [result(100, 0.5), result(50, 0.0001, 64)]}
+        # faster steps and a slower setup below the noise floor are no regressions
+        self.assertEqual(compare(baseline, {'results': [result(120, 0.5), result(50, 0.0009, 64)]}), [])
+
+        regressions = compare(baseline, {'results': [result(80, 0.5), result(50, 0.0001, 128)]})
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0]['metric'], 'steps_per_second')
+        self.assertAlmostEqual(regressions[0]['change'], 0.2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline_path = os.path.join(directory, 'baseline.json')
+            current_path = os.path.join(directory, 'current.json')
+            write_results(baseline, baseline_path)
+            write_results({'results': [result(80, 0.5)]}, current_path)
+            self.assertEqual(read_results(baseline_path), baseline)
+            self.assertEqual(main(['compare', baseline_path, baseline_path]), 0)
+            self.assertEqual(main(['compare', baseline_path, current_path]), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
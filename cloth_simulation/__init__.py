@@ -0,0 +1 @@
+from .cloth_simulation import run_simulation, setup_positions
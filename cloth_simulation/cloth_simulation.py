@@ -1,7 +1,8 @@
-import rk2_simulation as rk2
-import implicit_euler as ie
+from . import rk2_simulation as rk2
+from . import implicit_euler as ie
 import numpy as np
-from tqdm import tqdm
+
+from profiling import phase
 
 
 def setup_positions(spacial_dim, spacing):
@@ -24,7 +25,9 @@ def run_simulation(
         dt,
         num_steps,
         simulation_type='rk2',
-        num_of_fixed_corners=2
+        num_of_fixed_corners=2,
+        mesh_writer=None,
+        profiler=None
 ):
     """
     Run a simulation of a cloth using the given parameters
@@ -38,13 +41,30 @@ def run_simulation(
     :param num_steps: the number of steps to simulate
     :param simulation_type: the type of simulation to run (rk2, implicit_euler)
     :param num_of_fixed_corners: the number of corners to fix in place
+    :param mesh_writer: an optional writer (see mesh_export.create_mesh_writer), that every frame is streamed to
+    :param profiler: an optional profiler (see profiling.Profiler), which times the phases of every step
     :return: a list of the positions of the vertices at each time step in the format [(X1, Y1, Z1), (X2, Y2, Z2), ...]
     """
+    if simulation_type not in ['rk2', 'implicit_euler']:
+        raise ValueError("Invalid simulation type. Please choose 'rk2' or 'implicit_euler'")
+    from tqdm import tqdm  # imported on demand, so importing the simulation stays fast
+
     positions = [setup_positions(spacial_dim, spacing).reshape((spacial_dim * spacial_dim, 3))]
     velocities = [np.zeros((spacial_dim, spacial_dim, 3)).reshape((spacial_dim * spacial_dim), 3)]
+    if mesh_writer is not None:
+        mesh_writer.write_frame(positions[0])
+    if simulation_type == 'implicit_euler':
+        with phase(profiler, 'setup_matrices'):
+            M = ie.setup_M(mass, spacial_dim)
+            Ds = ie.setup_Ds(damping_constants, spacial_dim)
+    if profiler is not None:
+        profiler.end_setup()
 
+    progress = tqdm(range(num_steps), desc="Running simulation", unit="steps")
+    if profiler is not None:
+        profiler.attach(progress)
     if simulation_type == 'rk2':
-        for i in tqdm(range(num_steps), desc="Running simulation", unit="steps"):
+        for i in progress:
             pos, vel = rk2.step(
                 spacial_dim,
                 positions[i],
@@ -55,14 +75,18 @@ def run_simulation(
                 damping_constants,
                 gravity,
                 dt,
-                num_of_fixed_corners
+                num_of_fixed_corners,
+                profiler
             )
             velocities.append(vel)
             positions.append(pos)
-    elif simulation_type == 'implicit_euler':
-        M = ie.setup_M(mass, spacial_dim)
-        Ds = ie.setup_Ds(damping_constants, spacial_dim)
-        for i in tqdm(range(num_steps), desc="Running simulation", unit="steps"):
+            if mesh_writer is not None:
+                with phase(profiler, 'export'):
+                    mesh_writer.write_frame(pos)
+            if profiler is not None:
+                profiler.end_step()
+    else:
+        for i in progress:
             pos, vel = ie.step(
                 spacial_dim,
                 positions[i],
@@ -74,12 +98,16 @@ def run_simulation(
                 Ds,
                 gravity,
                 dt,
-                num_of_fixed_corners
+                num_of_fixed_corners,
+                profiler
             )
             velocities.append(vel)
             positions.append(pos)
-    else:
-        raise ValueError("Invalid simulation type. Please choose 'rk2' or 'implicit_euler'")
+            if mesh_writer is not None:
+                with phase(profiler, 'export'):
+                    mesh_writer.write_frame(pos)
+            if profiler is not None:
+                profiler.end_step()
 
     results = []
     for i in tqdm(range(len(positions)), desc="Reshaping results", unit="steps"):
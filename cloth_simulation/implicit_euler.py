@@ -1,7 +1,8 @@
 import numpy as np
 import scipy.sparse as sp
-import scipy.sparse.linalg as spl
-import rk2_simulation as rk2
+
+from profiling import phase
+from . import rk2_simulation as rk2
 
 
 def step(
@@ -15,21 +16,29 @@ def step(
         Ds,
         gravity,
         dt,
-        num_of_fixed_corners
+        num_of_fixed_corners,
+        profiler=None
 ):
-    Ks = calc_Ks(positions, spacing, spring_constants, spacial_dim)
-    fs = calc_fs(spacial_dim, num_of_fixed_corners, spring_constants, damping_constants, spacing, positions, velocities)
+    with phase(profiler, 'assemble_K'):
+        Ks = calc_Ks(positions, spacing, spring_constants, spacial_dim)
+    with phase(profiler, 'forces'):
+        fs = calc_fs(
+            spacial_dim, num_of_fixed_corners, spring_constants, damping_constants, spacing, positions, velocities
+        )
 
     delta_v = np.zeros((3 * spacial_dim ** 2))
 
-    # do step for structural springs
-    delta_v += solve_step(M, Ds[0], Ks[0], fs[0], dt, velocities, spacial_dim)
+    with phase(profiler, 'spsolve'):
+        # do step for structural springs
+        delta_v += solve_step(M, Ds[0], Ks[0], fs[0], dt, velocities, spacial_dim)
 
-    # do step for shear springs
-    delta_v += solve_step(M, Ds[1], Ks[1], fs[1], dt, velocities, spacial_dim)
+        # do step for shear springs
+        delta_v += solve_step(M, Ds[1], Ks[1], fs[1], dt, velocities, spacial_dim)
 
-    # do step for flexion springs
-    delta_v += solve_step(M, Ds[2], Ks[2], fs[2], dt, velocities, spacial_dim)
+        # do step for flexion springs
+        delta_v += solve_step(M, Ds[2], Ks[2], fs[2], dt, velocities, spacial_dim)
+    if profiler is not None:
+        profiler.count('solves', 3)
 
     # do step for gravity
     delta_v -= dt * np.tile(gravity, spacial_dim ** 2)
@@ -184,6 +193,8 @@ def calc_diagonal_entries(data, indices, indptr, spacial_dim):
 
 
 def solve_step(M, D, K, f, delta_t, velocities, spacial_dim):
+    import scipy.sparse.linalg as spl  # imported on first use, it is slow to load
+
     return spl.spsolve(
         (M + delta_t * D + delta_t ** 2 * K),
         delta_t * (f + delta_t * K @ velocities.reshape((3 * spacial_dim ** 2)))
@@ -0,0 +1,255 @@
+import os
+
+import numpy as np
+
+BINARY_MAGIC = b'CLTH'
+BINARY_VERSION = 1
+
+# magic, version, vertex count, triangle count, frame count
+_HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('version', '<u4'),
+    ('vertex_count', '<u4'),
+    ('triangle_count', '<u4'),
+    ('frame_count', '<u4'),
+])
+
+
+def triangle_indices(spacial_dim):
+    """
+    Calculate the triangle indices of the cloth mesh. Every quad of the grid is split into two triangles.
+    :param spacial_dim: the number of vertices along each axis of the cloth
+    :return: an array of shape (2 * (spacial_dim - 1) ** 2, 3) containing the vertex indices of each triangle
+    """
+    rows, cols = np.meshgrid(np.arange(spacial_dim - 1), np.arange(spacial_dim - 1), indexing='ij')
+    top_left = (rows * spacial_dim + cols).reshape(-1)
+    top_right = top_left + 1
+    bottom_left = top_left + spacial_dim
+    bottom_right = bottom_left + 1
+
+    upper = np.stack([top_left, bottom_left, top_right], axis=1)
+    lower = np.stack([top_right, bottom_left, bottom_right], axis=1)
+    return np.concatenate([upper, lower]).astype(np.uint32)
+
+
+def vertex_positions(positions, vertex_count):
+    """
+    :param positions: the positions of the vertices with the x, y and z coordinates along the last axis
+    :param vertex_count: the number of vertices of the mesh
+    :return: the positions as an array of shape (vertex_count, 3)
+    """
+    positions = np.asarray(positions)
+    if positions.shape[-1:] != (3,) or positions.size != vertex_count * 3:
+        raise ValueError(
+            f"Invalid positions of shape {positions.shape}. Please provide the x, y and z coordinates of "
+            f"{vertex_count} vertices along the last axis"
+        )
+    return positions.reshape(-1, 3)
+
+
+class BinaryMeshWriter:
+    """
+    Streams the frames of a cloth simulation into a single binary file.
+    The file starts with a header and the index buffer, which are written once, followed by one float32 vertex buffer
+    of shape (vertex_count, 3) per frame. All values are stored in little endian byte order.
+    """
+
+    def __init__(self, path, spacial_dim):
+        """
+        Creates the file and writes the header and the index buffer
+        :param path: the path of the file to write
+        :param spacial_dim: the number of vertices along each axis of the cloth
+        """
+        self.path = path
+        self.vertex_count = spacial_dim ** 2
+        self.frame_count = 0
+
+        indices = triangle_indices(spacial_dim)
+        self._file = open(path, 'wb')
+        self._write_header(len(indices))
+        self._file.write(indices.astype('<u4').tobytes())
+
+    def _write_header(self, triangle_count):
+        header = np.array(
+            [(BINARY_MAGIC, BINARY_VERSION, self.vertex_count, triangle_count, self.frame_count)],
+            dtype=_HEADER_DTYPE
+        )
+        self._file.write(header.tobytes())
+
+    def write_frame(self, positions):
+        """
+        Appends one frame to the file
+        :param positions: the positions of the vertices with the x, y and z coordinates along the last axis, e.g. of
+        shape (vertex_count, 3) or (spacial_dim, spacial_dim, 3)
+        """
+        positions = vertex_positions(positions, self.vertex_count)
+        self._file.write(np.ascontiguousarray(positions, dtype='<f4').tobytes())
+        self.frame_count += 1
+
+    def close(self):
+        """
+        Writes the final frame count into the header and closes the file
+        """
+        if self._file.closed:
+            return
+        self._file.seek(_HEADER_DTYPE.fields['frame_count'][1])
+        self._file.write(np.array(self.frame_count, dtype='<u4').tobytes())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PlySequenceWriter:
+    """
+    Writes every frame of a cloth simulation into a separate binary PLY file.
+    The face section is identical for all frames, so it is only encoded once.
+    """
+
+    def __init__(self, directory, spacial_dim, prefix='frame'):
+        """
+        :param directory: the directory the PLY files are written to
+        :param spacial_dim: the number of vertices along each axis of the cloth
+        :param prefix: the prefix of the file names, followed by the frame number
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.vertex_count = spacial_dim ** 2
+        self.frame_count = 0
+
+        indices = triangle_indices(spacial_dim)
+        faces = np.empty(len(indices), dtype=[('count', 'u1'), ('indices', '<i4', (3,))])
+        faces['count'] = 3
+        faces['indices'] = indices
+        self._faces = faces.tobytes()
+        self._header = (
+            "ply\n"
+            "format binary_little_endian 1.0\n"
+            f"element vertex {self.vertex_count}\n"
+            "property float x\n"
+            "property float y\n"
+            "property float z\n"
+            f"element face {len(indices)}\n"
+            "property list uchar int vertex_indices\n"
+            "end_header\n"
+        ).encode('ascii')
+
+    def write_frame(self, positions):
+        """
+        Writes one frame into its own PLY file
+        :param positions: the positions of the vertices with the x, y and z coordinates along the last axis, e.g. of
+        shape (vertex_count, 3) or (spacial_dim, spacial_dim, 3)
+        """
+        positions = vertex_positions(positions, self.vertex_count)
+        path = os.path.join(self.directory, f"{self.prefix}_{self.frame_count:05d}.ply")
+        with open(path, 'wb') as file:
+            file.write(self._header)
+            file.write(np.ascontiguousarray(positions, dtype='<f4').tobytes())
+            file.write(self._faces)
+        self.frame_count += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ObjSequenceWriter:
+    """
+    Writes every frame of a cloth simulation into a separate OBJ file.
+    The face section is identical for all frames, so it is only formatted once.
+    """
+
+    def __init__(self, directory, spacial_dim, prefix='frame'):
+        """
+        :param directory: the directory the OBJ files are written to
+        :param spacial_dim: the number of vertices along each axis of the cloth
+        :param prefix: the prefix of the file names, followed by the frame number
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.vertex_count = spacial_dim ** 2
+        self.frame_count = 0
+
+        indices = triangle_indices(spacial_dim)
+        self._vertex_format = "v %.6f %.6f %.6f\n" * self.vertex_count
+        # OBJ indices start at 1
+        self._faces = ("f %d %d %d\n" * len(indices)) % tuple((indices.reshape(-1) + 1).tolist())
+
+    def write_frame(self, positions):
+        """
+        Writes one frame into its own OBJ file
+        :param positions: the positions of the vertices with the x, y and z coordinates along the last axis, e.g. of
+        shape (vertex_count, 3) or (spacial_dim, spacial_dim, 3)
+        """
+        positions = vertex_positions(positions, self.vertex_count)
+        path = os.path.join(self.directory, f"{self.prefix}_{self.frame_count:05d}.obj")
+        with open(path, 'w') as file:
+            file.write(self._vertex_format % tuple(positions.astype(np.float32).reshape(-1).tolist()))
+            file.write(self._faces)
+        self.frame_count += 1
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def create_mesh_writer(path, spacial_dim, mesh_format='binary'):
+    """
+    Creates a writer, that streams the frames of a cloth simulation to disk
+    :param path: the file (binary) or directory (ply, obj) to write to
+    :param spacial_dim: the number of vertices along each axis of the cloth
+    :param mesh_format: the format to write (binary, ply, obj)
+    :return: a writer with the methods write_frame(positions) and close()
+    """
+    if mesh_format == 'binary':
+        return BinaryMeshWriter(path, spacial_dim)
+    elif mesh_format == 'ply':
+        return PlySequenceWriter(path, spacial_dim)
+    elif mesh_format == 'obj':
+        return ObjSequenceWriter(path, spacial_dim)
+    else:
+        raise ValueError("Invalid mesh format. Please choose 'binary', 'ply' or 'obj'")
+
+
+def read_binary_mesh(path):
+    """
+    Reads a file written by the BinaryMeshWriter without loading the frames into memory
+    :param path: the path of the file to read
+    :return: the triangle indices of shape (triangle_count, 3) and a memory mapped array of the frames of shape
+    (frame_count, vertex_count, 3)
+    """
+    header = np.fromfile(path, dtype=_HEADER_DTYPE, count=1)[0]
+    if header['magic'] != BINARY_MAGIC:
+        raise ValueError(f"{path} is not a binary cloth mesh file")
+    if header['version'] != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary cloth mesh version ({header['version']})")
+
+    vertex_count = int(header['vertex_count'])
+    triangle_count = int(header['triangle_count'])
+    indices = np.fromfile(path, dtype='<u4', count=triangle_count * 3, offset=_HEADER_DTYPE.itemsize)
+
+    frames_offset = _HEADER_DTYPE.itemsize + indices.nbytes
+    frame_size = vertex_count * 3 * 4
+    # the frame count is derived from the file size, so files of interrupted simulations can still be read
+    frame_count = (os.path.getsize(path) - frames_offset) // frame_size
+    if frame_count == 0:
+        frames = np.zeros((0, vertex_count, 3), dtype='<f4')
+    else:
+        frames = np.memmap(path, dtype='<f4', mode='r', offset=frames_offset, shape=(frame_count, vertex_count, 3))
+
+    return indices.reshape(triangle_count, 3), frames
@@ -1,5 +1,7 @@
 import numpy as np
 
+from profiling import phase
+
 
 def step(
         spacial_dim,
@@ -11,35 +13,38 @@ def step(
         damping_constants,
         gravity,
         dt,
-        num_of_fixed_corners
+        num_of_fixed_corners,
+        profiler=None
 ):
     # inner step
-    pos, vel = F(
-        spacial_dim,
-        positions,
-        velocities,
-        mass,
-        spacing,
-        spring_constants,
-        damping_constants,
-        gravity,
-        num_of_fixed_corners
-    )
+    with phase(profiler, 'forces'):
+        pos, vel = F(
+            spacial_dim,
+            positions,
+            velocities,
+            mass,
+            spacing,
+            spring_constants,
+            damping_constants,
+            gravity,
+            num_of_fixed_corners
+        )
     pos = positions + 0.5 * dt * pos
     vel = velocities + 0.5 * dt * vel
 
     # outer step
-    pos, vel = F(
-        spacial_dim,
-        pos,
-        vel,
-        mass,
-        spacing,
-        spring_constants,
-        damping_constants,
-        gravity,
-        num_of_fixed_corners
-    )
+    with phase(profiler, 'forces'):
+        pos, vel = F(
+            spacial_dim,
+            pos,
+            vel,
+            mass,
+            spacing,
+            spring_constants,
+            damping_constants,
+            gravity,
+            num_of_fixed_corners
+        )
     return positions + dt * pos, velocities + dt * vel
 
 
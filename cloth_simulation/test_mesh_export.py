@@ -0,0 +1,118 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from .cloth_simulation import run_simulation
+from .mesh_export import BINARY_MAGIC, BINARY_VERSION, _HEADER_DTYPE, triangle_indices, create_mesh_writer, \
+    read_binary_mesh
+
+
+class MeshExportTest(unittest.TestCase):
+    def test_triangle_indices(self):
+        indices = triangle_indices(3)
+        self.assertEqual(indices.shape, (8, 3))
+        self.assertEqual(indices.dtype, np.uint32)
+        self.assertTrue(np.array_equal(indices[0], [0, 3, 1]))
+        self.assertTrue(np.array_equal(indices[4], [1, 3, 4]))
+        # every vertex of the grid is part of a triangle
+        self.assertEqual(set(indices.reshape(-1).tolist()), set(range(9)))
+
+    def test_binary_round_trip(self):
+        rng = np.random.default_rng(26)
+        frames = rng.normal(size=(4, 9, 3))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cloth.bin')
+            with create_mesh_writer(path, 3) as writer:
+                for frame in frames:
+                    # the vertices can also be given as a grid, the coordinates are always along the last axis
+                    writer.write_frame(frame.reshape(3, 3, 3))
+
+            header = np.fromfile(path, dtype=_HEADER_DTYPE, count=1)[0]
+            self.assertEqual(header['magic'], BINARY_MAGIC)
+            self.assertEqual(header['version'], BINARY_VERSION)
+            self.assertEqual(header['vertex_count'], 9)
+            self.assertEqual(header['triangle_count'], 8)
+            # the frame count is patched into the header on close
+            self.assertEqual(header['frame_count'], 4)
+
+            indices, read_frames = read_binary_mesh(path)
+            self.assertTrue(np.array_equal(indices, triangle_indices(3)))
+            self.assertEqual(read_frames.dtype, np.float32)
+            self.assertEqual(read_frames.shape, (4, 9, 3))
+            self.assertTrue(np.array_equal(read_frames, frames.astype(np.float32)))
+            del read_frames  # release the memory map before the directory is removed
+
+            with open(path, 'r+b') as file:
+                file.write(b'MESH')
+            with self.assertRaises(ValueError):
+                read_binary_mesh(path)
+
+    def test_run_simulation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cloth.bin')
+            for simulation_type in ['rk2', 'implicit_euler']:
+                with create_mesh_writer(path, 3) as writer:
+                    positions = run_simulation(
+                        3, 0.3, 1, np.array([100., 50, 10]), np.zeros(3), np.array([0., 0, 10]), 0.01, 5,
+                        simulation_type, mesh_writer=writer
+                    )
+
+                # the initial positions and every step are streamed
+                _, frames = read_binary_mesh(path)
+                self.assertEqual(len(frames), 6)
+                for frame, (x, y, z) in zip(frames, positions):
+                    expected = np.stack([x, y, z], axis=-1).reshape(-1, 3).astype(np.float32)
+                    self.assertTrue(np.array_equal(frame, expected))
+                del frames
+
+    def test_invalid_positions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for mesh_format, path in [('binary', 'cloth.bin'), ('ply', 'ply'), ('obj', 'obj')]:
+                with create_mesh_writer(os.path.join(directory, path), 4, mesh_format) as writer:
+                    # the x, y and z coordinates as separate grids would mix up the coordinates of the vertices
+                    with self.assertRaises(ValueError):
+                        writer.write_frame(np.zeros((3, 4, 4)))
+                    with self.assertRaises(ValueError):
+                        writer.write_frame(np.zeros((15, 3)))
+                    self.assertEqual(writer.frame_count, 0)
+
+    def test_sequences(self):
+        positions = np.random.default_rng(27).normal(size=(9, 3))
+        with tempfile.TemporaryDirectory() as directory:
+            for mesh_format in ['ply', 'obj']:
+                sequence = os.path.join(directory, mesh_format)
+                with create_mesh_writer(sequence, 3, mesh_format) as writer:
+                    for _ in range(3):
+                        writer.write_frame(positions)
+
+                names = sorted(os.listdir(sequence))
+                self.assertEqual(names, [f"frame_{frame:05d}.{mesh_format}" for frame in range(3)])
+
+                path = os.path.join(sequence, names[-1])
+                if mesh_format == 'ply':
+                    with open(path, 'rb') as file:
+                        content = file.read()
+                    header, body = content.split(b'end_header\n')
+                    self.assertIn(b'element vertex 9\n', header)
+                    self.assertIn(b'element face 8\n', header)
+                    # the vertices as float32, then every face as its vertex count and three int32 indices
+                    self.assertEqual(len(body), 9 * 3 * 4 + 8 * (1 + 3 * 4))
+                    vertices = np.frombuffer(body[:9 * 3 * 4], dtype='<f4').reshape(9, 3)
+                    self.assertTrue(np.array_equal(vertices, positions.astype(np.float32)))
+                else:
+                    with open(path) as file:
+                        lines = file.read().splitlines()
+                    self.assertEqual(sum(line.startswith('v ') for line in lines), 9)
+                    faces = [line for line in lines if line.startswith('f ')]
+                    self.assertEqual(len(faces), 8)
+                    # OBJ indices start at 1
+                    self.assertEqual(faces[0], "f 1 4 2")
+
+        with self.assertRaises(ValueError):
+            create_mesh_writer(directory, 3, 'stl')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,2 @@
+from .fluid_simulation import run_simulation, run_ensemble, setup_vortices, step, FluidStepper, SimulationResult
+from .projection import setup_solver
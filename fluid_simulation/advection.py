@@ -1,26 +1,362 @@
 import numpy as np
 
-from datastructures.errors import StaggeredGridIndexError
-from datastructures.staggered_grid import StaggeredGrid
-
-
-def advect(velocities, dt):
-    new_grid = StaggeredGrid(velocities.grid_dim)
-    for row in range(velocities.grid_dim):
-        for col in range(velocities.grid_dim):
-            # TODO: verify if the boundaries are advected or not
-            if col < velocities.grid_dim - 1:
-                # trace the particle located at the right wall, if we are not at the rightmost column
-                origin_x, origin_y = trace_particle(row, col, velocities.RIGHT, velocities, dt)
-                u = interpolate_u(origin_x, origin_y, velocities)
-                new_grid.set_right(row, col, u)
-
-            # trace the particle located at the bottom wall, if we are not at the bottom row
-            if row < velocities.grid_dim - 1:
-                origin_x, origin_y = trace_particle(row, col, velocities.BOTTOM, velocities, dt)
-                v = interpolate_v(origin_x, origin_y, velocities)
-                new_grid.set_bottom(row, col, v)
+from .datastructures.errors import StaggeredGridIndexError
+from .datastructures.staggered_grid import StaggeredGrid
+from .parallel import map_bands
 
+
+def advect(velocities, dt, scheme='semi_lagrangian', backtrace='euler', limiter=True):
+    """
+    Advect the velocities by dt seconds.
+    All faces are traced back and sampled at once. For the semi-Lagrangian scheme with the euler backtrace, the result
+    matches tracing every face with trace_particle and sampling it with interpolate_u or interpolate_v.
+    If the grid has ghost layers, they are filled before sampling and all samples are read from the padded arrays.
+    :param velocities: the grid containing the velocities
+    :param dt: the time step
+    :param scheme: the advection scheme:
+        'semi_lagrangian' samples the velocities at the traced back positions,
+        'maccormack' corrects the semi-Lagrangian result by half the error of advecting it back again,
+        'bfecc' corrects the velocities by half the error of advecting them forth and back and advects the result
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see trace_faces
+    :param limiter: clamp the results of the 'maccormack' and 'bfecc' schemes to the values the semi-Lagrangian
+    interpolation was computed from, which prevents new extrema
+    :return: the new grid containing the advected velocities
+    """
+    velocities, _ = advect_fields(velocities, None, dt, scheme, backtrace, limiter)
+    return velocities
+
+
+def advect_fields(
+        velocities,
+        scalars,
+        dt,
+        scheme='semi_lagrangian',
+        backtrace='euler',
+        limiter=True,
+        out=None,
+        workers=1,
+        scratch=None
+):
+    """
+    Advect the velocities and cell centered scalar fields (e.g. dye, density or temperature) by dt seconds.
+    The faces and the cell centers are traced back once, all scalar fields are sampled at the same origins. So every
+    additional field only costs one sampling pass.
+    :param velocities: the grid containing the velocities, or a batch of grids, which are advected at once
+    :param scalars: None, or the scalar fields as an array of shape (rows, cols) or (number of fields, rows, cols). The
+    fields of a batch of grids are stacked along the third last axis: (..., batch_size, rows, cols)
+    :param dt: the time step
+    :param scheme: the advection scheme of the velocities and the scalars, see advect
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see trace_faces
+    :param limiter: clamp the results of the error correcting schemes, see advect
+    :param out: a grid of the same dimensions to write the advected velocities into instead of allocating a new one.
+    Its boundaries have to be zero and it must not be the grid of the velocities
+    :param workers: the number of threads. The rows are split into bands, which are advected in parallel (see
+    parallel.map_bands). The results do not depend on the number of workers
+    :param scratch: None, or a dict keeping the intermediate grids and arrays of the error correcting schemes between
+    calls, so they are only allocated once. It must only be shared by calls for grids and scalars of the same shape
+    :return: the new grid containing the advected velocities and the advected scalars (None, if no scalars are given)
+    """
+    if scheme not in ['semi_lagrangian', 'maccormack', 'bfecc']:
+        raise ValueError("Invalid advection scheme. Please choose 'semi_lagrangian', 'maccormack' or 'bfecc'")
+
+    # the ghost cells are filled once, the bands only read them
+    if velocities.ghost_layers > 0:
+        velocities.fill_ghost_cells()
+    rows = velocities.rows
+    batched = velocities.batch_size is not None
+
+    def new_grid(name=None):
+        # only the inner faces are written, so the boundaries of the reused grids stay zero
+        if scratch is None or name is None:
+            return StaggeredGrid(velocities.grid_dim, velocities.ghost_layers, velocities.batch_size)
+        if name not in scratch:
+            scratch[name] = new_grid()
+        return scratch[name]
+
+    def new_array(name=None):
+        if scratch is None or name is None:
+            return np.empty(scalars.shape)
+        if name not in scratch:
+            scratch[name] = new_array()
+        return scratch[name]
+
+    # the results are new (or out), only the intermediate results of the error correcting schemes are reused
+    semi_lagrangian = scheme == 'semi_lagrangian'
+    if semi_lagrangian:
+        advected = new_grid() if out is None else out
+    else:
+        advected = new_grid('advected')
+    advected_scalars = None
+    if scalars is not None:
+        scalars = np.asarray(scalars, dtype=float)
+        advected_scalars = new_array(None if semi_lagrangian else 'advected_scalars')
+
+    def advect_band(band):
+        band_origins = trace_faces(velocities, dt, backtrace, band)
+        sample_faces(velocities, band_origins, advected, band)
+        band_cell_origins = None
+        if scalars is not None:
+            band_cell_origins = trace_cells(velocities, dt, backtrace, band)
+            advected_scalars[..., band[0]:band[1], :] = sample_cells(scalars, band_cell_origins, batched)
+        return band_origins, band_cell_origins
+
+    origins, cell_origins = zip(*map_bands(advect_band, rows, workers))
+    if semi_lagrangian:
+        return advected, advected_scalars
+
+    if advected.ghost_layers > 0:
+        advected.fill_ghost_cells()
+    corrected = new_grid() if out is None else out
+    # the correction of the error is the result of the MacCormack scheme, the BFECC scheme advects it once more
+    correction = corrected if scheme == 'maccormack' else new_grid('correction')
+    reversed_velocities = new_grid('reversed')
+    corrected_scalars = correction_scalars = None
+    if scalars is not None:
+        corrected_scalars = new_array()
+        correction_scalars = corrected_scalars if scheme == 'maccormack' else new_array('correction_scalars')
+
+    def correct_band(band):
+        sample_faces(advected, trace_faces(velocities, -dt, backtrace, band), reversed_velocities, band)
+        base = advected if scheme == 'maccormack' else velocities
+        correct_faces(base, velocities, reversed_velocities, correction, band)
+        if scalars is not None:
+            start, stop = band
+            reversed_scalars = sample_cells(advected_scalars, trace_cells(velocities, -dt, backtrace, band), batched)
+            base_scalars = advected_scalars if scheme == 'maccormack' else scalars
+            correction_scalars[..., start:stop, :] = (
+                    base_scalars[..., start:stop, :] + 0.5 * (scalars[..., start:stop, :] - reversed_scalars)
+            )
+
+    map_bands(correct_band, rows, workers)
+
+    if scheme == 'bfecc':
+        if correction.ghost_layers > 0:
+            correction.fill_ghost_cells()
+
+        def resample_band(band, band_origins, band_cell_origins):
+            sample_faces(correction, band_origins, corrected, band)
+            if scalars is not None:
+                corrected_scalars[..., band[0]:band[1], :] = sample_cells(
+                    correction_scalars, band_cell_origins, batched
+                )
+
+        map_bands(resample_band, rows, workers, origins, cell_origins)
+
+    if limiter:
+        def limit_band(band, band_origins, band_cell_origins):
+            (u_x, u_y), (v_x, v_y) = band_origins
+            (u_start, u_stop), (v_start, v_stop) = face_bands(velocities.rows, band)
+            cols = velocities.cols
+            u_min, u_max = stencil_bounds_u(u_x, u_y, velocities)
+            v_min, v_max = stencil_bounds_v(v_x, v_y, velocities)
+            band_u = corrected.u[..., u_start:u_stop, 1:cols]
+            band_v = corrected.v[..., v_start:v_stop, :]
+            np.clip(band_u, u_min, u_max, out=band_u)
+            np.clip(band_v, v_min, v_max, out=band_v)
+            if scalars is not None:
+                band_scalars = corrected_scalars[..., band[0]:band[1], :]
+                np.clip(band_scalars, *cell_stencil_bounds(scalars, band_cell_origins, batched), out=band_scalars)
+
+        map_bands(limit_band, rows, workers, origins, cell_origins)
+
+    return corrected, corrected_scalars
+
+
+def face_bands(rows, band=None):
+    """
+    Finds the inner faces of a band of cell rows: the u-faces of the rows of the band and the v-faces at the bottom walls
+    of the rows of the band, except for the bottom row of the grid.
+    :param rows: the number of rows of the grid
+    :param band: the cell rows (start, stop), None for all rows
+    :return: the rows (start, stop) of the u-faces and of the inner v-faces in the arrays u and v
+    """
+    start, stop = (0, rows) if band is None else band
+    return (start, stop), (start + 1, min(stop, rows - 1) + 1)
+
+
+def trace_faces(velocities, dt, backtrace='euler', band=None):
+    """
+    Traces the particles located at all inner faces of the grid back in time by dt seconds.
+    :param velocities: the grid containing the velocities
+    :param dt: the time in seconds to trace the particles back
+    :param backtrace: the integration of the backtrace:
+        'euler' a single step with the velocity at the face (see integrate_backtrace),
+        'rk2' the midpoint method,
+        'rk3' Ralston's third order method
+    :param band: None for all faces, or the cell rows (start, stop) whose faces are traced (see face_bands). The ghost
+    cells are only filled, if all faces are traced
+    :return: the origins ((x, y) of the u-faces, (x, y) of the v-faces). For a batch of grids, the origins of every
+    grid are stacked along the first axis
+    """
+    if velocities.ghost_layers > 0 and band is None:
+        velocities.fill_ghost_cells()
+    (u_start, u_stop), (v_start, v_stop) = face_bands(velocities.rows, band)
+
+    origins = []
+    # the particles located at the right walls, except for the rightmost column, and at the bottom walls, except for
+    # the bottom row
+    for side, cell_rows, cell_cols in [
+        (velocities.RIGHT, (u_start, u_stop), velocities.cols - 1),
+        (velocities.BOTTOM, (v_start - 1, v_stop - 1), velocities.cols)
+    ]:
+        rows, cols = batch_coords(velocities, *np.mgrid[cell_rows[0]:cell_rows[1], 0:cell_cols])
+        x, y = face_coords(rows, cols, side)
+        u, v = face_velocities(rows, cols, side, velocities)
+        origins.append(integrate_backtrace(x, y, u, v, velocities, dt, backtrace))
+
+    return tuple(origins)
+
+
+def trace_cells(velocities, dt, backtrace='euler', band=None):
+    """
+    Traces the particles located at the centers of all cells back in time by dt seconds.
+    :param velocities: the grid containing the velocities
+    :param dt: the time in seconds to trace the particles back
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see trace_faces
+    :param band: None for all cells, or the rows (start, stop) of the cells to trace. The ghost cells are only filled, if
+    all cells are traced
+    :return: the origins (x, y) of the cell centers, each of shape (rows, cols), or (batch_size, rows, cols) for a batch
+    """
+    if velocities.ghost_layers > 0 and band is None:
+        velocities.fill_ghost_cells()
+    start, stop = (0, velocities.rows) if band is None else band
+
+    y, x = batch_coords(velocities, *np.mgrid[start:stop, 0:velocities.cols])
+    # the velocity at the center of a cell is the mean of the velocities of its walls
+    u = 0.5 * (velocities.u[..., start:stop, :-1] + velocities.u[..., start:stop, 1:])
+    v = 0.5 * (velocities.v[..., start:stop, :] + velocities.v[..., start + 1:stop + 1, :])
+    return integrate_backtrace(x, y, u, v, velocities, dt, backtrace)
+
+
+def integrate_backtrace(x, y, k1_x, k1_y, velocities, dt, backtrace):
+    """
+    Integrates the path of particles back in time by dt seconds.
+    :param x: the x coordinates of the particles
+    :param y: the y coordinates of the particles
+    :param k1_x: the u velocities at the particles
+    :param k1_y: the v velocities at the particles
+    :param velocities: the grid containing the velocities, which is interpolated for the intermediate steps
+    :param dt: the time in seconds to trace the particles back
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see trace_faces
+    :return: the origins (x, y) of the particles
+    """
+    if backtrace == 'euler':
+        return x - dt * k1_x, y - dt * k1_y
+
+    if backtrace == 'rk2':
+        mid_x, mid_y = x - 0.5 * dt * k1_x, y - 0.5 * dt * k1_y
+        return (
+            x - dt * interpolate_u_array(mid_x, mid_y, velocities),
+            y - dt * interpolate_v_array(mid_x, mid_y, velocities)
+        )
+
+    if backtrace == 'rk3':
+        k2_x = interpolate_u_array(x - 0.5 * dt * k1_x, y - 0.5 * dt * k1_y, velocities)
+        k2_y = interpolate_v_array(x - 0.5 * dt * k1_x, y - 0.5 * dt * k1_y, velocities)
+        k3_x = interpolate_u_array(x - 0.75 * dt * k2_x, y - 0.75 * dt * k2_y, velocities)
+        k3_y = interpolate_v_array(x - 0.75 * dt * k2_x, y - 0.75 * dt * k2_y, velocities)
+        return (
+            x - dt * (2 / 9 * k1_x + 3 / 9 * k2_x + 4 / 9 * k3_x),
+            y - dt * (2 / 9 * k1_y + 3 / 9 * k2_y + 4 / 9 * k3_y)
+        )
+
+    raise ValueError("Invalid backtrace. Please choose 'euler', 'rk2' or 'rk3'")
+
+
+def sample_faces(field, origins, out=None, band=None):
+    """
+    Samples a staggered field at the origins of all inner faces.
+    :param field: the grid to sample
+    :param origins: the origins of the faces, as returned by trace_faces
+    :param out: a grid with zero boundaries to write the samples into, instead of allocating a new one
+    :param band: None for all faces, or the cell rows (start, stop) the origins were traced for (see face_bands). The
+    ghost cells are only filled, if all faces are sampled
+    :return: a new grid (or out), whose inner faces contain the samples
+    """
+    if field.ghost_layers > 0 and band is None:
+        field.fill_ghost_cells()
+    (u_x, u_y), (v_x, v_y) = origins
+    (u_start, u_stop), (v_start, v_stop) = face_bands(field.rows, band)
+
+    new_grid = StaggeredGrid(field.grid_dim, field.ghost_layers, field.batch_size) if out is None else out
+    new_grid.u[..., u_start:u_stop, 1:field.cols] = interpolate_u_array(u_x, u_y, field)
+    new_grid.v[..., v_start:v_stop, :] = interpolate_v_array(v_x, v_y, field)
+    return new_grid
+
+
+def cell_stencil(fields, origins, batched=False):
+    """
+    Finds the four cell centers around the origins. Positions outside the grid are clamped to the closest cell, so the
+    scalars are continued constantly beyond the walls.
+    :param fields: the scalar fields, of shape (..., rows, cols)
+    :param origins: the positions (x, y) to sample at
+    :param batched: whether the fields belong to a batch of grids. The fields are then of shape
+    (..., batch_size, rows, cols) and the first axis of the origins is the batch, so every grid is sampled at its own
+    origins
+    :return: the values (top_left, top_right, bottom_left, bottom_right) of every field and the weights alpha (along the
+    x-axis) and beta (along the y-axis)
+    """
+    x, y = origins
+    rows, cols = fields.shape[-2:]
+    x = np.clip(x, 0, cols - 1)
+    y = np.clip(y, 0, rows - 1)
+
+    col = np.minimum(np.floor(x).astype(int), cols - 2)
+    row = np.minimum(np.floor(y).astype(int), rows - 2)
+    alpha = x - col
+    beta = y - row
+
+    if batched:
+        batch = np.arange(fields.shape[-3]).reshape((-1,) + (1,) * (row.ndim - 1))
+        return (
+            fields[..., batch, row, col], fields[..., batch, row, col + 1],
+            fields[..., batch, row + 1, col], fields[..., batch, row + 1, col + 1],
+            alpha, beta
+        )
+    return (
+        fields[..., row, col], fields[..., row, col + 1],
+        fields[..., row + 1, col], fields[..., row + 1, col + 1],
+        alpha, beta
+    )
+
+
+def sample_cells(fields, origins, batched=False):
+    """
+    Bilinearly interpolates cell centered scalar fields at the origins, see cell_stencil.
+    :param fields: the scalar fields, of shape (..., rows, cols)
+    :param origins: the positions (x, y) to sample at, as returned by trace_cells
+    :param batched: whether the fields belong to a batch of grids, see cell_stencil
+    :return: the sampled fields, of the same shape as fields
+    """
+    top_left, top_right, bottom_left, bottom_right, alpha, beta = cell_stencil(fields, origins, batched)
+    top = top_left * (1 - alpha) + top_right * alpha
+    bottom = bottom_left * (1 - alpha) + bottom_right * alpha
+    return top * (1 - beta) + bottom * beta
+
+
+def cell_stencil_bounds(fields, origins, batched=False):
+    """
+    :return: the minimum and maximum of the four values sample_cells interpolates between
+    """
+    top_left, top_right, bottom_left, bottom_right, _, _ = cell_stencil(fields, origins, batched)
+    return (
+        np.minimum(np.minimum(top_left, top_right), np.minimum(bottom_left, bottom_right)),
+        np.maximum(np.maximum(top_left, top_right), np.maximum(bottom_left, bottom_right))
+    )
+
+
+def correct_faces(base, original, reversed_field, out=None, band=None):
+    """
+    Corrects a field by half the error of advecting a field forth and back: base + (original - reversed_field) / 2.
+    Only the inner faces (of the band of cell rows, see face_bands) are calculated.
+    :return: a new grid (or out, if given) containing the corrected field
+    """
+    (u_start, u_stop), (v_start, v_stop) = face_bands(base.rows, band)
+    u = (Ellipsis, slice(u_start, u_stop), slice(1, base.cols))
+    v = (Ellipsis, slice(v_start, v_stop), slice(None))
+    new_grid = StaggeredGrid(base.grid_dim, base.ghost_layers, base.batch_size) if out is None else out
+    new_grid.u[u] = base.u[u] + 0.5 * (original.u[u] - reversed_field.u[u])
+    new_grid.v[v] = base.v[v] + 0.5 * (original.v[v] - reversed_field.v[v])
     return new_grid
 
 
@@ -121,8 +457,8 @@ def get_or_extrapolate(row, col, side, velocities):
 
 
 def extrapolate(row, col, side, velocities):
-    closest_row = np.clip(row, 0, velocities.grid_dim - 1)
-    closest_col = np.clip(col, 0, velocities.grid_dim - 1)
+    closest_row = np.clip(row, 0, velocities.rows - 1)
+    closest_col = np.clip(col, 0, velocities.cols - 1)
 
     if row == closest_row:
         # Extrapolate in the x-direction
@@ -158,7 +494,7 @@ def extrapolate_horizontally(row, closest_col, side, velocities, steps):
                 - velocities[row, closest_col + 1, side]
         )
         return velocities[row, closest_col, side] + du * steps
-    elif closest_col == velocities.grid_dim - 1:
+    elif closest_col == velocities.cols - 1:
         # we are at the right boundary
         # if the side we are looking for is left, we take a step less and use the right side
         if side == velocities.LEFT:
@@ -187,7 +523,7 @@ def extrapolate_vertically(closest_row, col, side, velocities, steps):
                 - velocities[closest_row + 1, col, side]
         )
         return velocities[closest_row, col, side] + dv * steps
-    elif closest_row == velocities.grid_dim - 1:
+    elif closest_row == velocities.rows - 1:
         # we are at the bottom boundary
         # if the side we are looking for is top, we take a step less and use the bottom side
         if side == velocities.TOP:
@@ -201,3 +537,333 @@ def extrapolate_vertically(closest_row, col, side, velocities, steps):
         return velocities[closest_row, col, side] + dv * -steps
     else:
         raise ValueError("This is not a boundary cell")
+
+
+def face_velocities(rows, cols, side, velocities):
+    """
+    Calculates the velocities at the given side of the cells at (rows, cols). The velocity component normal to the side
+    is stored in the grid, the other one is interpolated.
+    :return: the velocities (u, v)
+    """
+    x, y = face_coords(rows, cols, side)
+    batch = batch_indices(velocities, np.shape(rows))
+    if side == velocities.LEFT or side == velocities.RIGHT:
+        return face_values(rows, cols, side, velocities, batch), interpolate_v_array(x, y, velocities)
+    elif side == velocities.TOP or side == velocities.BOTTOM:
+        return interpolate_u_array(x, y, velocities), face_values(rows, cols, side, velocities, batch)
+    else:
+        raise ValueError("Invalid side")
+
+
+def face_coords(rows, cols, side):
+    """
+    Vectorized version of StaggeredGrid.coords
+    :return: the coordinates (x, y) of the centers of the sides of the cells at (rows, cols)
+    """
+    if side == StaggeredGrid.TOP:
+        return cols, rows - 0.5
+    if side == StaggeredGrid.RIGHT:
+        return cols + 0.5, rows
+    if side == StaggeredGrid.BOTTOM:
+        return cols, rows + 0.5
+    if side == StaggeredGrid.LEFT:
+        return cols - 0.5, rows
+
+    raise ValueError("Invalid side")
+
+
+def face_values(rows, cols, side, velocities, batch=None):
+    """
+    Reads the velocities of the given side of the cells at (rows, cols) without any bounds checks
+    :param batch: None for a single grid, or the grid of every cell of a batch of grids (see batch_indices)
+    """
+    if side == velocities.TOP:
+        return batch_index(velocities.v, batch, rows, cols)
+    if side == velocities.RIGHT:
+        return batch_index(velocities.u, batch, rows, cols + 1)
+    if side == velocities.BOTTOM:
+        return batch_index(velocities.v, batch, rows + 1, cols)
+    if side == velocities.LEFT:
+        return batch_index(velocities.u, batch, rows, cols)
+
+    raise ValueError("Invalid side")
+
+
+def batch_coords(velocities, *coords):
+    """
+    Repeats the coordinates of the cells of a grid for every grid of a batch along a new first axis, so that every grid
+    can be traced to its own origins. The coordinates of a single grid are returned unchanged.
+    """
+    if velocities.batch_size is None:
+        return coords
+    return tuple(np.broadcast_to(c, (velocities.batch_size,) + c.shape) for c in coords)
+
+
+def batch_indices(velocities, shape):
+    """
+    :param shape: the shape of coordinates in a batch of grids, whose first axis is the batch (see batch_coords)
+    :return: None for a single grid, or the grid of every coordinate of a batch of grids
+    """
+    if velocities.batch_size is None:
+        return None
+    return np.broadcast_to(np.arange(velocities.batch_size).reshape((-1,) + (1,) * (len(shape) - 1)), shape)
+
+
+def batch_index(array, batch, rows, cols):
+    """
+    :return: the values of a single array at (rows, cols), or of the arrays of a batch at (batch, rows, cols)
+    """
+    if batch is None:
+        return array[rows, cols]
+    # a single flat index is gathered considerably faster than three index arrays
+    array_rows, array_cols = array.shape[-2:]
+    return np.take(array, (batch * array_rows + rows) * array_cols + cols)
+
+
+def batch_select(batch, mask):
+    """
+    :return: the grids of the masked coordinates of a batch, None for a single grid
+    """
+    return None if batch is None else batch[mask]
+
+
+def padded_face_values(rows, cols, side, velocities, batch=None):
+    """
+    Reads the velocities of the given side of the cells at (rows, cols) from the padded arrays of a grid with ghost
+    layers. The ghost layers have to be filled by StaggeredGrid.fill_ghost_cells beforehand. Samples further outside
+    than the ghost layers are clamped to the outermost ghost layer.
+    :param batch: None for a single grid, or the grid of every cell of a batch of grids (see batch_indices)
+    """
+    g = velocities.ghost_layers
+    if side == velocities.TOP or side == velocities.BOTTOM:
+        padded = velocities.v_padded
+        rows = rows + 1 if side == velocities.BOTTOM else rows
+    elif side == velocities.LEFT or side == velocities.RIGHT:
+        padded = velocities.u_padded
+        cols = cols + 1 if side == velocities.RIGHT else cols
+    else:
+        raise ValueError("Invalid side")
+
+    return batch_index(
+        padded,
+        batch,
+        np.clip(rows + g, 0, padded.shape[-2] - 1),
+        np.clip(cols + g, 0, padded.shape[-1] - 1)
+    )
+
+
+def interpolate_u_array(x, y, velocities):
+    """
+    Vectorized version of interpolate_u
+    :param x: the x coordinates to sample at
+    :param y: the y coordinates to sample at
+    :param velocities: the grid containing the velocities
+    :return: the interpolated u velocities
+    """
+    left1, right1, left2, right2, alpha, beta = u_stencil(x, y, velocities)
+
+    x_vel1 = left1 * (1 - alpha) + right1 * alpha
+    x_vel2 = left2 * (1 - alpha) + right2 * alpha
+    return x_vel1 * (1 - beta) + x_vel2 * beta
+
+
+def interpolate_v_array(x, y, velocities):
+    """
+    Vectorized version of interpolate_v
+    :param x: the x coordinates to sample at
+    :param y: the y coordinates to sample at
+    :param velocities: the grid containing the velocities
+    :return: the interpolated v velocities
+    """
+    top1, bottom1, top2, bottom2, alpha, beta = v_stencil(x, y, velocities)
+
+    y_vel1 = top1 * (1 - alpha) + bottom1 * alpha
+    y_vel2 = top2 * (1 - alpha) + bottom2 * alpha
+    return y_vel1 * (1 - beta) + y_vel2 * beta
+
+
+def stencil_bounds_u(x, y, velocities):
+    """
+    :return: the minimum and maximum of the four u velocities interpolate_u_array interpolates between
+    """
+    left1, right1, left2, right2, _, _ = u_stencil(x, y, velocities)
+    return (
+        np.minimum(np.minimum(left1, right1), np.minimum(left2, right2)),
+        np.maximum(np.maximum(left1, right1), np.maximum(left2, right2))
+    )
+
+
+def stencil_bounds_v(x, y, velocities):
+    """
+    :return: the minimum and maximum of the four v velocities interpolate_v_array interpolates between
+    """
+    top1, bottom1, top2, bottom2, _, _ = v_stencil(x, y, velocities)
+    return (
+        np.minimum(np.minimum(top1, bottom1), np.minimum(top2, bottom2)),
+        np.maximum(np.maximum(top1, bottom1), np.maximum(top2, bottom2))
+    )
+
+
+def u_stencil(x, y, velocities):
+    """
+    Finds the four u velocities around the given positions, see interpolate_u
+    :return: the velocities (left1, right1, left2, right2) and the weights alpha (along the x-axis) and beta (along the
+    y-axis)
+    """
+    row, col = np.round(y).astype(int), np.round(x).astype(int)
+    row2 = np.where(y > row, row + 1, row - 1)
+
+    left1 = get_or_extrapolate_array(row, col, velocities.LEFT, velocities)
+    right1 = get_or_extrapolate_array(row, col, velocities.RIGHT, velocities)
+    left2 = get_or_extrapolate_array(row2, col, velocities.LEFT, velocities)
+    right2 = get_or_extrapolate_array(row2, col, velocities.RIGHT, velocities)
+
+    # weights (alpha, 1-alpha) for linear interpolation along x-axis
+    alpha = (x - (col - 0.5)) / ((col + 0.5) - (col - 0.5))
+
+    # weights (beta, 1-beta) for linear interpolation along y-axis
+    beta = (y - row) / (row2 - row)
+
+    return left1, right1, left2, right2, alpha, beta
+
+
+def v_stencil(x, y, velocities):
+    """
+    Finds the four v velocities around the given positions, see interpolate_v
+    :return: the velocities (top1, bottom1, top2, bottom2) and the weights alpha (along the y-axis) and beta (along the
+    x-axis)
+    """
+    row, col = np.round(y).astype(int), np.round(x).astype(int)
+    col2 = np.where(x > col, col + 1, col - 1)
+
+    top1 = get_or_extrapolate_array(row, col, velocities.TOP, velocities)
+    bottom1 = get_or_extrapolate_array(row, col, velocities.BOTTOM, velocities)
+    top2 = get_or_extrapolate_array(row, col2, velocities.TOP, velocities)
+    bottom2 = get_or_extrapolate_array(row, col2, velocities.BOTTOM, velocities)
+
+    # weights (alpha, 1-alpha) for linear interpolation along y-axis
+    alpha = (y - (row - 0.5)) / ((row + 0.5) - (row - 0.5))
+
+    # weights (beta, 1-beta) for linear interpolation along x-axis
+    beta = (x - col) / (col2 - col)
+
+    return top1, bottom1, top2, bottom2, alpha, beta
+
+
+def get_or_extrapolate_array(rows, cols, side, velocities):
+    """
+    Vectorized version of get_or_extrapolate. Instead of catching a StaggeredGridIndexError for every sample, the
+    samples outside the bounds of StaggeredGrid.test_bounds are masked and extrapolated together.
+    If the grid has ghost layers, the samples are read from the padded arrays instead (see padded_face_values).
+    The coordinates of a batch of grids have the batch as their first axis.
+    """
+    batch = batch_indices(velocities, rows.shape)
+    if velocities.ghost_layers > 0:
+        return padded_face_values(rows, cols, side, velocities, batch)
+
+    in_bounds = (rows >= -1) & (rows <= velocities.rows) & (cols >= -1) & (cols <= velocities.cols)
+    if side != velocities.BOTTOM:
+        in_bounds &= rows != -1
+    if side != velocities.TOP:
+        in_bounds &= rows != velocities.rows
+    if side != velocities.RIGHT:
+        in_bounds &= cols != -1
+    if side != velocities.LEFT:
+        in_bounds &= cols != velocities.cols
+
+    if in_bounds.all():
+        return face_values(rows, cols, side, velocities, batch)
+
+    values = np.empty(rows.shape)
+    values[in_bounds] = face_values(
+        rows[in_bounds], cols[in_bounds], side, velocities, batch_select(batch, in_bounds)
+    )
+    outside = ~in_bounds
+    values[outside] = extrapolate_array(
+        rows[outside], cols[outside], side, velocities, batch_select(batch, outside)
+    )
+    return values
+
+
+def extrapolate_array(rows, cols, side, velocities, batch=None):
+    """
+    Vectorized version of extrapolate, for samples outside the bounds of the grid
+    :param batch: None for a single grid, or the grid of every sample of a batch of grids (see batch_indices)
+    """
+    closest_rows = np.clip(rows, 0, velocities.rows - 1)
+    closest_cols = np.clip(cols, 0, velocities.cols - 1)
+    horizontal_steps = np.abs(cols - closest_cols)
+    vertical_steps = np.abs(rows - closest_rows)
+
+    values = np.empty(rows.shape)
+
+    # extrapolate in the x-direction
+    horizontal = rows == closest_rows
+    values[horizontal] = extrapolate_horizontally_array(
+        rows[horizontal], closest_cols[horizontal], side, velocities, horizontal_steps[horizontal],
+        batch_select(batch, horizontal)
+    )
+
+    # extrapolate in the y-direction
+    vertical = ~horizontal & (cols == closest_cols)
+    values[vertical] = extrapolate_vertically_array(
+        closest_rows[vertical], cols[vertical], side, velocities, vertical_steps[vertical],
+        batch_select(batch, vertical)
+    )
+
+    # extrapolate in both directions and interpolate
+    diagonal = ~horizontal & ~vertical
+    h_steps = horizontal_steps[diagonal]
+    v_steps = vertical_steps[diagonal]
+    diagonal_batch = batch_select(batch, diagonal)
+    h = extrapolate_horizontally_array(
+        closest_rows[diagonal], closest_cols[diagonal], side, velocities, h_steps + v_steps, diagonal_batch
+    )
+    v = extrapolate_vertically_array(
+        closest_rows[diagonal], closest_cols[diagonal], side, velocities, h_steps + v_steps, diagonal_batch
+    )
+    values[diagonal] = (h_steps * h + v_steps * v) / (h_steps + v_steps)
+
+    return values
+
+
+def extrapolate_horizontally_array(rows, closest_cols, side, velocities, steps, batch=None):
+    """
+    Vectorized version of extrapolate_horizontally, closest_cols may contain both boundaries
+    """
+    # at the left boundary the right side takes a step less and uses the left side
+    left_side, left_steps = (velocities.LEFT, steps - 1) if side == velocities.RIGHT else (side, steps)
+    left_value = face_values(rows, 0, left_side, velocities, batch)
+    du_left = left_value - face_values(rows, 1, left_side, velocities, batch)
+
+    # at the right boundary the left side takes a step less and uses the right side
+    right_side, right_steps = (velocities.RIGHT, steps - 1) if side == velocities.LEFT else (side, steps)
+    right_value = face_values(rows, velocities.cols - 1, right_side, velocities, batch)
+    du_right = face_values(rows, velocities.cols - 2, right_side, velocities, batch) - right_value
+
+    return np.where(
+        closest_cols == 0,
+        left_value + du_left * left_steps,
+        right_value + du_right * -right_steps
+    )
+
+
+def extrapolate_vertically_array(closest_rows, cols, side, velocities, steps, batch=None):
+    """
+    Vectorized version of extrapolate_vertically, closest_rows may contain both boundaries
+    """
+    # at the top boundary the bottom side takes a step less and uses the top side
+    top_side, top_steps = (velocities.TOP, steps - 1) if side == velocities.BOTTOM else (side, steps)
+    top_value = face_values(0, cols, top_side, velocities, batch)
+    dv_top = top_value - face_values(1, cols, top_side, velocities, batch)
+
+    # at the bottom boundary the top side takes a step less and uses the bottom side
+    bottom_side, bottom_steps = (velocities.BOTTOM, steps - 1) if side == velocities.TOP else (side, steps)
+    bottom_value = face_values(velocities.rows - 1, cols, bottom_side, velocities, batch)
+    dv_bottom = face_values(velocities.rows - 2, cols, bottom_side, velocities, batch) - bottom_value
+
+    return np.where(
+        closest_rows == 0,
+        top_value + dv_top * top_steps,
+        bottom_value + dv_bottom * -bottom_steps
+    )
@@ -0,0 +1,149 @@
+import numpy as np
+
+from .datastructures.staggered_grid_3d import StaggeredGrid3D
+from .parallel import map_bands
+
+# the number of faces traced at once. It bounds the memory of the temporary arrays independently of the grid size, so
+# the memory of a step grows linearly with the number of cells
+CHUNK_SIZE = 2 ** 16
+
+
+def advect_fields(velocities, scalars, dt, backtrace='euler', out=None, workers=1):
+    """
+    Advect the velocities of a 3D grid and cell centered scalar fields (e.g. smoke density) by dt seconds with the
+    semi-Lagrangian method. The inner faces and the cell centers are traced back through the velocities and sampled
+    trilinearly at their origins, see sample_velocities. The faces on the boundary of the box stay walls.
+    The faces are processed in chunks of layers, the chunks are split into bands of layers for the workers.
+    :param velocities: the 3D grid containing the velocities
+    :param scalars: None, or the scalar fields as an array of shape (layers, rows, cols) or
+    (number of fields, layers, rows, cols)
+    :param dt: the time step
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see integrate_backtrace
+    :param out: a grid of the same dimensions to write the advected velocities into instead of allocating a new one.
+    Its boundaries have to be zero and it must not be the grid of the velocities
+    :param workers: the number of threads, the results do not depend on it
+    :return: the new grid containing the advected velocities and the advected scalars (None, if no scalars are given)
+    """
+    if backtrace not in ['euler', 'rk2', 'rk3']:
+        raise ValueError("Invalid backtrace. Please choose 'euler', 'rk2' or 'rk3'")
+    if out is velocities:
+        raise ValueError("The advection cannot write into the grid of the velocities. Please choose another grid")
+    new_velocities = StaggeredGrid3D(velocities.grid_dim) if out is None else out
+    layers, rows, cols = velocities.shape
+
+    # the inner faces of every component: the field, the target, the (start, stop) of their layers, rows and columns
+    # and the offset of the indices of the field to the coordinates (x, y, z)
+    regions = [
+        (velocities.u, new_velocities.u, (0, layers), (0, rows), (1, cols), (0.5, 0, 0)),
+        (velocities.v, new_velocities.v, (0, layers), (1, rows), (0, cols), (0, 0.5, 0)),
+        (velocities.w, new_velocities.w, (1, layers), (0, rows), (0, cols), (0, 0, 0.5)),
+    ]
+    new_scalars = None
+    if scalars is not None:
+        fields = np.reshape(scalars, (-1,) + velocities.shape)
+        new_scalars = np.empty(np.shape(scalars))
+        regions.append((fields, new_scalars.reshape(fields.shape), (0, layers), (0, rows), (0, cols), (0, 0, 0)))
+
+    for field, target, layer_range, row_range, col_range, offset in regions:
+        def advect_band(band):
+            start, stop = band
+            chunk_layers = max(1, CHUNK_SIZE // ((row_range[1] - row_range[0]) * (col_range[1] - col_range[0])))
+            for chunk_start in range(layer_range[0] + start, layer_range[0] + stop, chunk_layers):
+                chunk_stop = min(chunk_start + chunk_layers, layer_range[0] + stop)
+                z, y, x = np.mgrid[chunk_start:chunk_stop, row_range[0]:row_range[1], col_range[0]:col_range[1]]
+                x, y, z = integrate_backtrace(
+                    x - offset[0], y - offset[1], z - offset[2], velocities, dt, backtrace
+                )
+                chunk = (Ellipsis, slice(chunk_start, chunk_stop), slice(*row_range), slice(*col_range))
+                target[chunk] = trilinear(field, x + offset[0], y + offset[1], z + offset[2])
+
+        map_bands(advect_band, layer_range[1] - layer_range[0], workers)
+
+    return new_velocities, new_scalars
+
+
+def integrate_backtrace(x, y, z, velocities, dt, backtrace):
+    """
+    Integrates the path of particles back in time by dt seconds.
+    :param x: the x coordinates of the particles
+    :param y: the y coordinates of the particles
+    :param z: the z coordinates of the particles
+    :param velocities: the 3D grid containing the velocities
+    :param dt: the time in seconds to trace the particles back
+    :param backtrace: the integration of the backtrace:
+        'euler' a single step with the velocity at the particles,
+        'rk2' the midpoint method,
+        'rk3' Ralston's third order method
+    :return: the origins (x, y, z) of the particles
+    """
+    k1 = sample_velocities(velocities, x, y, z)
+    if backtrace == 'euler':
+        return x - dt * k1[0], y - dt * k1[1], z - dt * k1[2]
+
+    k2 = sample_velocities(velocities, x - 0.5 * dt * k1[0], y - 0.5 * dt * k1[1], z - 0.5 * dt * k1[2])
+    if backtrace == 'rk2':
+        return x - dt * k2[0], y - dt * k2[1], z - dt * k2[2]
+
+    if backtrace == 'rk3':
+        k3 = sample_velocities(velocities, x - 0.75 * dt * k2[0], y - 0.75 * dt * k2[1], z - 0.75 * dt * k2[2])
+        return tuple(
+            position - dt * (2 / 9 * a + 3 / 9 * b + 4 / 9 * c)
+            for position, a, b, c in zip((x, y, z), k1, k2, k3)
+        )
+
+    raise ValueError("Invalid backtrace. Please choose 'euler', 'rk2' or 'rk3'")
+
+
+def sample_velocities(velocities, x, y, z):
+    """
+    Trilinearly interpolates the staggered velocities of a 3D grid at arbitrary positions. Positions beyond the
+    outermost faces are clamped to them, nothing is extrapolated.
+    :param velocities: the 3D grid containing the velocities
+    :param x: the x coordinates of the positions
+    :param y: the y coordinates of the positions
+    :param z: the z coordinates of the positions
+    :return: the velocities (u, v, w) at the positions
+    """
+    return (
+        trilinear(velocities.u, x + 0.5, y, z),
+        trilinear(velocities.v, x, y + 0.5, z),
+        trilinear(velocities.w, x, y, z + 0.5)
+    )
+
+
+def trilinear(values, i, j, k):
+    """
+    Trilinearly interpolates a 3D array at continuous indices, clamped to the array
+    :param values: the array of shape (layers, rows, cols), with at least two layers, rows and columns, or a stack of
+    such arrays along a leading axis, which are all interpolated at the same indices
+    :param i: the column indices
+    :param j: the row indices
+    :param k: the layer indices
+    :return: the interpolated values, of the shape of the indices (with the leading axis of a stack)
+    """
+    layers, rows, cols = values.shape[-3:]
+    # the clipped indices are not negative, so truncating them rounds them down
+    i = np.clip(i, 0, cols - 1)
+    j = np.clip(j, 0, rows - 1)
+    k = np.clip(k, 0, layers - 1)
+    left = np.minimum(i.astype(np.int64), cols - 2)
+    top = np.minimum(j.astype(np.int64), rows - 2)
+    front = np.minimum(k.astype(np.int64), layers - 2)
+    alpha = i - left
+    beta = j - top
+    gamma = k - front
+
+    # the eight neighbours are gathered from the flattened array with a single index, the right neighbours from the
+    # array shifted by one
+    flat = values.reshape(values.shape[:-3] + (-1,))
+    shifted = flat[..., 1:]
+    index = (front * rows + top) * cols + left
+    lines = []
+    for offset in [0, cols, rows * cols, rows * cols + cols]:
+        corners = index + offset if offset else index
+        line = np.take(flat, corners, axis=-1)
+        line += (np.take(shifted, corners, axis=-1) - line) * alpha
+        lines.append(line)
+    front_layer = lines[0] + (lines[1] - lines[0]) * beta
+    back_layer = lines[2] + (lines[3] - lines[2]) * beta
+    return front_layer + (back_layer - front_layer) * gamma
@@ -1,6 +1,6 @@
 import numpy as np
 
-from datastructures.errors import StaggeredGridIndexError
+from .errors import StaggeredGridIndexError
 
 
 class StaggeredGrid:
@@ -9,14 +9,67 @@ class StaggeredGrid:
     BOTTOM = 2
     LEFT = 3
 
-    def __init__(self, grid_dim: int):
+    def __init__(self, grid_dim, ghost_layers: int = 0, batch_size=None):
         """
         Initializes a staggered grid with zeros
-        :param grid_dim: the grid dimension
+        :param grid_dim: the grid dimension, either an int for a square grid or the number of cells (rows, cols) of a
+        rectangular grid
+        :param ghost_layers: the number of ghost layers stored around u and v. If it is larger than zero, u and v are
+        views into the padded arrays u_padded and v_padded, whose ghost layers are filled by fill_ghost_cells
+        :param batch_size: None for a single grid, or the number of grids of a batch. The grids of a batch are stacked
+        along a leading axis of u and v, of the shapes (batch_size, rows, cols + 1) and (batch_size, rows + 1, cols).
+        The access of single faces (top, right, ...) is only supported for single grids
         """
         self.grid_dim = grid_dim
-        self.u = np.zeros((grid_dim, grid_dim + 1)) # u velocity component (x-axis)
-        self.v = np.zeros((grid_dim + 1, grid_dim)) # v velocity component (y-axis)
+        self.rows, self.cols = grid_shape(grid_dim)
+        self.shape = (self.rows, self.cols)
+        self.ghost_layers = ghost_layers
+        self.batch_size = batch_size
+        self.batch_shape = () if batch_size is None else (batch_size,)
+        rows, cols = self.shape
+        if ghost_layers > 0:
+            g = ghost_layers
+            self.u_padded = np.zeros(self.batch_shape + (rows + 2 * g, cols + 1 + 2 * g))
+            self.v_padded = np.zeros(self.batch_shape + (rows + 1 + 2 * g, cols + 2 * g))
+            self._u = self.u_padded[..., g:-g, g:-g]
+            self._v = self.v_padded[..., g:-g, g:-g]
+        else:
+            self._u = np.zeros(self.batch_shape + (rows, cols + 1))  # u velocity component (x-axis)
+            self._v = np.zeros(self.batch_shape + (rows + 1, cols))  # v velocity component (y-axis)
+
+    @property
+    def u(self):
+        return self._u
+
+    @u.setter
+    def u(self, value):
+        if self.ghost_layers > 0:
+            self._u[...] = value
+        else:
+            self._u = value
+
+    @property
+    def v(self):
+        return self._v
+
+    @v.setter
+    def v(self, value):
+        if self.ghost_layers > 0:
+            self._v[...] = value
+        else:
+            self._v = value
+
+    def fill_ghost_cells(self):
+        """
+        Fills the ghost layers of u_padded and v_padded by extrapolating u and v linearly.
+        A ghost value is extrapolated from the closest face inside the grid, using the differences to its inner
+        neighbours in both directions. This matches the extrapolation of the advection, except for ghost values that lie
+        outside in both directions: there the advection result also depends on the side of the cell it was accessed by.
+        """
+        if self.ghost_layers == 0:
+            raise ValueError("The grid has no ghost layers")
+        _fill_ghost_layers(self.u_padded, self.ghost_layers)
+        _fill_ghost_layers(self.v_padded, self.ghost_layers)
 
     def top(self, row, col):
         self.test_bounds(row, col, self.TOP)
@@ -109,55 +162,77 @@ class StaggeredGrid:
     def to_regular_grid(self):
         """
         Converts the staggered grid to a regular grid, by averaging the velocities of the sides
-        :return: a regular grid of shape (n, n, 2) where n is the grid dimension
+        :return: a regular grid of shape (rows, cols, 2), or (batch_size, rows, cols, 2) for a batch
         """
-        grid_dim = self.u.shape[0]
-        grid = np.zeros((grid_dim, grid_dim, 2))
-        for row in range(grid_dim):
-            for col in range(grid_dim):
-                grid[row, col] = (
-                    (self.left(row, col) + self.right(row, col)) / 2,
-                    (self.top(row, col) + self.bottom(row, col)) / 2
-                )
-
+        grid = np.empty(self.batch_shape + (self.rows, self.cols, 2))
+        grid[..., 0] = (self.u[..., :-1] + self.u[..., 1:]) / 2  # (left + right) / 2
+        grid[..., 1] = (self.v[..., :-1, :] + self.v[..., 1:, :]) / 2  # (top + bottom) / 2
         return grid
 
     def test_bounds(self, row, col, side):
-        if row < -1 or row > self.grid_dim:
+        if row < -1 or row > self.rows:
             raise StaggeredGridIndexError(f"Row index out of bounds ({row})")
 
-        if col < -1 or col > self.grid_dim:
+        if col < -1 or col > self.cols:
             raise StaggeredGridIndexError(f"Column index out of bounds ({col})")
 
         if row == -1 and side != self.BOTTOM:
             raise StaggeredGridIndexError("Your row is out of regular bounds. You can only access the bottom side!")
 
-        if row == self.grid_dim and side != self.TOP:
+        if row == self.rows and side != self.TOP:
             raise StaggeredGridIndexError("Your row is out of regular bounds. You can only access the top side!")
 
         if col == -1 and side != self.RIGHT:
             raise StaggeredGridIndexError("Your column is out of regular bounds. You can only access the right side!")
 
-        if col == self.grid_dim and side != self.LEFT:
+        if col == self.cols and side != self.LEFT:
             raise StaggeredGridIndexError("Your column is out of regular bounds. You can only access the left side!")
 
+
+def grid_shape(grid_dim):
+    """
+    :param grid_dim: the grid dimension, either an int for a square grid or the number of cells (rows, cols)
+    :return: the number of cells (rows, cols)
+    """
+    if np.ndim(grid_dim) == 0:
+        return int(grid_dim), int(grid_dim)
+    rows, cols = grid_dim
+    return int(rows), int(cols)
+
+
+def _fill_ghost_layers(padded, g):
+    """
+    Fills the outer g layers of a padded array (or of a batch of padded arrays along the leading axis) by linear
+    extrapolation of its inner part
+    """
+    inner = padded[..., g:-g, g:-g]
+    rows = inner.shape[-2]
+    steps = np.arange(1, g + 1)
+
+    # top and bottom layers, extrapolated along the columns
+    top, bottom = inner[..., 0:1, :], inner[..., -1:, :]
+    padded[..., :g, g:-g] = top + steps[::-1, None] * (top - inner[..., 1:2, :])
+    padded[..., -g:, g:-g] = bottom + steps[:, None] * (bottom - inner[..., -2:-1, :])
+
+    # left and right layers (including the corners), extrapolated along the rows with the differences of the closest
+    # inner row
+    closest_rows = np.clip(np.arange(-g, rows + g), 0, rows - 1)
+    left_slope = (inner[..., :, 0] - inner[..., :, 1])[..., closest_rows]
+    right_slope = (inner[..., :, -1] - inner[..., :, -2])[..., closest_rows]
+    padded[..., :g] = padded[..., g, None] + steps[::-1] * left_slope[..., None]
+    padded[..., -g:] = padded[..., -g - 1, None] + steps * right_slope[..., None]
+
+
 def from_regular_grid(grid) -> StaggeredGrid:
     """
     Initializes a staggered grid from a regular grid, by averaging the velocities of the cells
-    :param grid: a regular grid of shape (n, n, 2) where n is the grid dimension
+    :param grid: a regular grid of shape (rows, cols, 2)
     """
-    assert grid.shape[0] == grid.shape[1]
-    grid_dim = grid.shape[0]
+    rows, cols = grid.shape[:2]
 
-    s = StaggeredGrid(grid_dim)
+    s = StaggeredGrid(rows if rows == cols else (rows, cols))
 
-    s.u = np.zeros((grid_dim, grid_dim + 1))  # u velocity component (x-axis)
-    s.v = np.zeros((grid_dim + 1, grid_dim))  # v velocity component (y-axis)
-    for row in range(grid_dim):
-        for col in range(grid_dim):
-            if col != grid_dim - 1:
-                s.u[row, col + 1] = (grid[row, col][0] + grid[row, col + 1][0]) / 2
-            if row != grid_dim - 1:
-                s.v[row + 1, col] = (grid[row, col][1] + grid[row + 1, col][1]) / 2
+    s.u[:, 1:-1] = (grid[:, :-1, 0] + grid[:, 1:, 0]) / 2
+    s.v[1:-1, :] = (grid[:-1, :, 1] + grid[1:, :, 1]) / 2
 
-    return s
\ No newline at end of file
+    return s
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class StaggeredGrid3D:
+    """
+    A 3D staggered (MAC) grid. Every cell has six faces, the velocity components are stored at the faces they are
+    normal to: u at the faces between neighbouring columns, v between neighbouring rows and w between neighbouring
+    layers. Like StaggeredGrid, x is the column, y the row and z the layer of a cell center, with dx = 1.
+    The u-face (layer, row, col) is located at (col - 0.5, row, layer), the v-face at (col, row - 0.5, layer) and the
+    w-face at (col, row, layer - 0.5). The faces on the boundary of the box are walls.
+    """
+
+    def __init__(self, grid_dim):
+        """
+        Initializes a 3D staggered grid with zeros
+        :param grid_dim: the grid dimension, either an int for a cubic grid or the number of cells (layers, rows, cols)
+        """
+        self.grid_dim = grid_dim
+        self.layers, self.rows, self.cols = grid_shape_3d(grid_dim)
+        self.shape = (self.layers, self.rows, self.cols)
+        self.batch_shape = ()
+        layers, rows, cols = self.shape
+        self.u = np.zeros((layers, rows, cols + 1))  # u velocity component (x-axis)
+        self.v = np.zeros((layers, rows + 1, cols))  # v velocity component (y-axis)
+        self.w = np.zeros((layers + 1, rows, cols))  # w velocity component (z-axis)
+
+    @property
+    def faces(self):
+        """
+        :return: the face arrays (u, v, w)
+        """
+        return self.u, self.v, self.w
+
+    def copy(self):
+        grid = StaggeredGrid3D(self.grid_dim)
+        np.copyto(grid.u, self.u)
+        np.copyto(grid.v, self.v)
+        np.copyto(grid.w, self.w)
+        return grid
+
+    def to_regular_grid(self):
+        """
+        Converts the staggered grid to a regular grid, by averaging the velocities of the opposite faces of every cell
+        :return: a regular grid of shape (layers, rows, cols, 3)
+        """
+        grid = np.empty(self.shape + (3,))
+        grid[..., 0] = (self.u[..., :-1] + self.u[..., 1:]) / 2
+        grid[..., 1] = (self.v[:, :-1, :] + self.v[:, 1:, :]) / 2
+        grid[..., 2] = (self.w[:-1] + self.w[1:]) / 2
+        return grid
+
+
+def grid_shape_3d(grid_dim):
+    """
+    :param grid_dim: the grid dimension, either an int for a cubic grid or the number of cells (layers, rows, cols)
+    :return: the number of cells (layers, rows, cols)
+    """
+    if np.ndim(grid_dim) == 0:
+        return int(grid_dim), int(grid_dim), int(grid_dim)
+    layers, rows, cols = grid_dim
+    return int(layers), int(rows), int(cols)
+
+
+def from_regular_grid_3d(grid) -> StaggeredGrid3D:
+    """
+    Initializes a 3D staggered grid from a regular grid, by averaging the velocities of the cells. The faces on the
+    boundary stay walls.
+    :param grid: a regular grid of shape (layers, rows, cols, 3)
+    """
+    s = StaggeredGrid3D(grid.shape[:3])
+    s.u[:, :, 1:-1] = (grid[:, :, :-1, 0] + grid[:, :, 1:, 0]) / 2
+    s.v[:, 1:-1, :] = (grid[:, :-1, :, 1] + grid[:, 1:, :, 1]) / 2
+    s.w[1:-1] = (grid[:-1, ..., 2] + grid[1:, ..., 2]) / 2
+    return s
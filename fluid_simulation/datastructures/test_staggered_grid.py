@@ -1,8 +1,8 @@
 import unittest
 import numpy as np
 
-import staggered_grid as sg
-from staggered_grid import StaggeredGrid
+from . import staggered_grid as sg
+from .staggered_grid import StaggeredGrid
 
 
 class StaggeredGridTest(unittest.TestCase):
@@ -67,6 +67,49 @@ class StaggeredGridTest(unittest.TestCase):
         staggered_grid.test_bounds(0, -1, staggered_grid.RIGHT)
         staggered_grid.test_bounds(-1, 0, staggered_grid.BOTTOM)
 
+    def test_rectangular_grid(self):
+        grid = np.arange(3 * 5 * 2, dtype=float).reshape(3, 5, 2)
+        staggered_grid = sg.from_regular_grid(grid)
+
+        self.assertEqual(staggered_grid.shape, (3, 5))
+        self.assertEqual(staggered_grid.u.shape, (3, 6))
+        self.assertEqual(staggered_grid.v.shape, (4, 5))
+        self.assertEqual(staggered_grid.to_regular_grid().shape, (3, 5, 2))
+        self.assertEqual(StaggeredGrid((3, 5), ghost_layers=1).u_padded.shape, (5, 8))
+
+        # the bounds differ along the rows and the columns
+        self.assertEqual(staggered_grid[2, 4, staggered_grid.LEFT], staggered_grid.u[2, 4])
+        self.assertEqual(staggered_grid[3, 4, staggered_grid.TOP], staggered_grid.v[3, 4])
+        with self.assertRaises(ValueError):
+            staggered_grid.test_bounds(4, 0, staggered_grid.TOP)
+        with self.assertRaises(ValueError):
+            staggered_grid.test_bounds(0, 5, staggered_grid.TOP)
+
+    def test_ghost_layers(self):
+        staggered_grid = StaggeredGrid(2, ghost_layers=2)
+        staggered_grid.u = np.array([[1, 2, 3], [4, 5, 6]])
+        staggered_grid.v = np.array([[1, 2], [3, 4], [5, 6]])
+
+        assert staggered_grid.u_padded.shape == (6, 7), \
+            f"Padding failed: expected u_padded of shape (6, 7), but got {staggered_grid.u_padded.shape}"
+        assert staggered_grid.v_padded.shape == (7, 6), \
+            f"Padding failed: expected v_padded of shape (7, 6), but got {staggered_grid.v_padded.shape}"
+        assert staggered_grid[0, 0] == (1, 2, 3, 1), \
+            f"Access failed for (0,0): expected (1, 2, 3, 1), but got {staggered_grid[0, 0]}"
+
+        staggered_grid.fill_ghost_cells()
+
+        # the values are linear, so the ghost layers continue them
+        rows, cols = np.indices((6, 7)) - 2
+        assert np.array_equal(staggered_grid.u_padded, 1 + cols + 3 * rows), \
+            f"Filling the ghost layers of u failed, got {staggered_grid.u_padded}"
+        rows, cols = np.indices((7, 6)) - 2
+        assert np.array_equal(staggered_grid.v_padded, 1 + cols + 2 * rows), \
+            f"Filling the ghost layers of v failed, got {staggered_grid.v_padded}"
+
+        with self.assertRaises(ValueError):
+            StaggeredGrid(2).fill_ghost_cells()
+
 
 
 
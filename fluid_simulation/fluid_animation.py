@@ -1,17 +1,13 @@
 import sys
 
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import numpy as np
 
-import fluid_simulation as fs
-
-if sys.platform == 'win32' or sys.platform == 'linux':
-    print('\nRunning on Windows or Linux: setting matplotlib backend to TkAgg\n')
-    mpl.use('TkAgg')
-elif sys.platform == 'darwin':
-    print('\nRunning on MacOS: setting matplotlib backend to macosx\n')
-    mpl.use('macosx')
+from profiling import JsonLinesSink, read_json_lines
+from . import fluid_simulation as fs
+from . import spectral_simulation as ss
+from .datastructures.staggered_grid import grid_shape
+from .telemetry import summarize
+from .tracers import TracerParticles
 
 # ---------- Video Configuration ----------
 animation_length = 60
@@ -21,68 +17,157 @@ fps = 50
 visible_frames = animation_length * fps
 frame_skip_factor = animation_frames / visible_frames
 
-print(f"Rendering video with the following configuration:")
-print(f"    Animation length: {animation_length}")
-print(f"    Animation time step: {animation_time_step}")
-print(f"    Animation frames: {animation_frames}")
-print(f"    FPS: {fps}")
-print(f"    Visible frames: {visible_frames}")
-print(f"    Frame skip factor: {frame_skip_factor}\n")
-
 # ---------- Simulation Parameters ----------
-spacial_dim = 30
+spacial_dim = 30  # or the number of cells (rows, cols) of a rectangular domain
+engine = 'staggered'  # 'staggered' for a closed box, or 'spectral' for a periodic domain (pressure and quiver only)
 rho = 1.5
+viscosity = 0  # the kinematic viscosity, 0 for an inviscid fluid
 vortex_speeds = [5, 5]
 vortex_centers = [(9.5, 9.5), (19.5, 19.5)]
 clockwise = [True, True]
-
-print("Simulation parameters:")
-print(f"    Spacial dimension: {spacial_dim}")
-print(f"    Density: {rho}\n")
-print(f"    Vortex speeds: {vortex_speeds}")
-print(f"    Vortex centers: {vortex_centers}")
-print(f"    Clockwise: {clockwise}\n")
-
-# ---------- Simulation ----------
-velocities, pressures = fs.run_simulation(
-    spacial_dim,
-    vortex_speeds,
-    vortex_centers,
-    clockwise,
-    animation_frames,
-    animation_time_step,
-    rho
-)
-
-# ---------- Plotting ----------
-fig, ax = plt.subplots(figsize=(16, 16))
-fig.set_tight_layout(False)
-ax.set_xlabel('x')
-ax.set_ylabel('y')
-ax.set_title('Fluid Simulation')
-ax.set_aspect('equal')
-
-pressure_map = ax.imshow(pressures[0], cmap='Blues')
-flow_quiver = ax.quiver(velocities[0][:, :, 0], velocities[0][:, :, 1], color='Black', angles='xy')
-
-cbar = fig.colorbar(pressure_map, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
-cbar.set_label('Pressure')
-
-
-def update(frame):
-    frame = int(frame * frame_skip_factor)
-    pressure_map.set_data(pressures[frame])
-    pressure_map.autoscale()
-    cbar.update_normal(pressure_map)
-    flow_quiver.set_UVC(velocities[frame][:, :, 0], velocities[frame][:, :, 1])
-    return pressure_map, cbar, flow_quiver
-
-
-ani = animation.FuncAnimation(fig, update, frames=int(visible_frames), interval=2000/fps)
-
-Writer = animation.writers['ffmpeg']
-writer = Writer(fps=fps, metadata=dict(artist='Me'), bitrate=1800)
-
-ani.save('fluid_animation.mp4', writer=writer)
-
-plt.show()
\ No newline at end of file
+solver = 'direct'  # 'direct', 'spectral' or 'cg'
+solver_options = {}  # for 'cg': rtol, maxiter and preconditioner ('multigrid', 'jacobi' or None)
+advection_scheme = 'semi_lagrangian'  # 'semi_lagrangian', 'maccormack' or 'bfecc'
+backtrace = 'euler'  # 'euler', 'rk2' or 'rk3'
+cfl = None  # None for one step per frame, or the target CFL number of adaptive substeps (e.g. 1)
+solid = None  # None or a boolean array of shape (spacial_dim, spacial_dim), which is True for obstacle cells
+show_dye = False  # shows a dye transported by the fluid instead of the pressure
+workers = 1  # the number of threads of the advection and the projection, the results do not depend on it
+tracer_count = 0  # 0 for a quiver plot of the velocities, or the number of tracer particles (e.g. 10 ** 5). Every frame
+# keeps a copy of the positions, 8 bytes per particle
+tracer_lifetime = 500  # None, or the number of steps after which a tracer is respawned at a random position
+telemetry_path = None  # None, or the path of a JSON lines file receiving the divergence and the timings of every step
+
+
+def main():
+    print(f"Rendering video with the following configuration:")
+    print(f"    Animation length: {animation_length}")
+    print(f"    Animation time step: {animation_time_step}")
+    print(f"    Animation frames: {animation_frames}")
+    print(f"    FPS: {fps}")
+    print(f"    Visible frames: {visible_frames}")
+    print(f"    Frame skip factor: {frame_skip_factor}\n")
+
+    print("Simulation parameters:")
+    print(f"    Spacial dimension: {spacial_dim}")
+    print(f"    Engine: {engine}")
+    print(f"    Density: {rho}")
+    print(f"    Viscosity: {viscosity}\n")
+    print(f"    Vortex speeds: {vortex_speeds}")
+    print(f"    Vortex centers: {vortex_centers}")
+    print(f"    Clockwise: {clockwise}")
+    print(f"    Solver: {solver}")
+    print(f"    Advection: {advection_scheme} ({backtrace} backtrace)")
+    print(f"    CFL number: {cfl if cfl is not None else 'fixed time step'}")
+    print(f"    Workers: {workers}")
+    print(f"    Tracers: {tracer_count if tracer_count > 0 else 'none (quiver plot)'}")
+    print(f"    Telemetry: {telemetry_path if telemetry_path is not None else 'off'}\n")
+
+    # ---------- Simulation ----------
+    # a dye filling the left half of the fluid
+    dye = np.zeros(grid_shape(spacial_dim))
+    dye[:, :dye.shape[1] // 2] = 1
+    # the spectral engine only provides the velocities and the pressure
+    plot_dye = show_dye and engine != 'spectral'
+    plot_tracers = tracer_count > 0 and engine != 'spectral'
+
+    if engine == 'spectral':
+        results = ss.run_simulation(
+            spacial_dim,
+            vortex_speeds,
+            vortex_centers,
+            clockwise,
+            animation_frames,
+            animation_time_step,
+            rho,
+            viscosity=viscosity,
+            cfl=cfl,
+            workers=workers
+        )
+    else:
+        telemetry = JsonLinesSink(telemetry_path) if telemetry_path is not None else None
+        results = fs.run_simulation(
+            spacial_dim,
+            vortex_speeds,
+            vortex_centers,
+            clockwise,
+            animation_frames,
+            animation_time_step,
+            rho,
+            solver=solver,
+            solver_options=solver_options,
+            advection_scheme=advection_scheme,
+            backtrace=backtrace,
+            scalars=dye if plot_dye else None,
+            cfl=cfl,
+            solid=solid,
+            viscosity=viscosity,
+            workers=workers,
+            tracers=TracerParticles(tracer_count, spacial_dim, tracer_lifetime, solid) if plot_tracers else None,
+            telemetry=telemetry
+        )
+        if telemetry is not None:
+            telemetry.close()
+            for metric, values in summarize(read_json_lines(telemetry_path)).items():
+                print(f"    {metric}: mean {values['mean']:.3g}, max {values['max']:.3g}")
+    velocities, pressures = results.velocities, results.pressures
+    # the map shows either the pressure or the dye
+    scalar_maps = results.scalars if plot_dye else pressures
+    tracer_positions = results.tracer_positions
+
+    # ---------- Plotting ----------
+    # matplotlib and its GUI backend are only loaded to show the results, not when the module is imported
+    import matplotlib as mpl
+
+    if sys.platform == 'win32' or sys.platform == 'linux':
+        print('\nRunning on Windows or Linux: setting matplotlib backend to TkAgg\n')
+        mpl.use('TkAgg')
+    elif sys.platform == 'darwin':
+        print('\nRunning on MacOS: setting matplotlib backend to macosx\n')
+        mpl.use('macosx')
+
+    import matplotlib.pyplot as plt
+    import matplotlib.animation as animation
+
+    fig, ax = plt.subplots(figsize=(16, 16))
+    fig.set_tight_layout(False)
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.set_title('Fluid Simulation')
+    ax.set_aspect('equal')
+
+    pressure_map = ax.imshow(scalar_maps[0], cmap='Blues')
+    if tracer_positions is None:
+        flow_quiver = ax.quiver(velocities[0][:, :, 0], velocities[0][:, :, 1], color='Black', angles='xy')
+    else:
+        # a scatter plot only updates the offsets of its points, which stays fast for many particles
+        flow_quiver = ax.scatter(
+            tracer_positions[0][:, 0], tracer_positions[0][:, 1], s=0.5, c='Black', marker='.', linewidths=0
+        )
+
+    cbar = fig.colorbar(pressure_map, ax=ax, orientation='vertical', fraction=0.046, pad=0.04)
+    cbar.set_label('Dye' if plot_dye else 'Pressure')
+
+    def update(frame):
+        frame = int(frame * frame_skip_factor)
+        pressure_map.set_data(scalar_maps[frame])
+        pressure_map.autoscale()
+        cbar.update_normal(pressure_map)
+        if tracer_positions is None:
+            flow_quiver.set_UVC(velocities[frame][:, :, 0], velocities[frame][:, :, 1])
+        else:
+            flow_quiver.set_offsets(tracer_positions[frame])
+        return pressure_map, cbar, flow_quiver
+
+    ani = animation.FuncAnimation(fig, update, frames=int(visible_frames), interval=2000/fps)
+
+    Writer = animation.writers['ffmpeg']
+    writer = Writer(fps=fps, metadata=dict(artist='Me'), bitrate=1800)
+
+    ani.save('fluid_animation.mp4', writer=writer)
+
+    plt.show()
+
+
+if __name__ == '__main__':
+    main()
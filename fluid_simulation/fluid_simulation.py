@@ -1,72 +1,485 @@
+import time
+from collections import namedtuple
+
 import numpy as np
-from tqdm import tqdm
 
-from advection import advect
-from datastructures.staggered_grid import StaggeredGrid
-from projection import project, setup_solver
+from profiling import phase
+from .advection import advect_fields
+from .datastructures.staggered_grid import StaggeredGrid
+from .obstacles import face_masks, apply_obstacles
+from .viscosity import setup_viscosity_solver
+from .projection import project, setup_solver, ConjugateGradientSolver
 
 
 def setup_vortex(spacial_dim, vortex_speed, vortex_center, clockwise=True):
-    velocities = StaggeredGrid(spacial_dim)
-    direction = 1 if clockwise else -1
-
-    for row in range(spacial_dim):
-        for col in range(spacial_dim):
-            if col < spacial_dim - 1:
-                # calculate the velocity at the center of the right wall
-                x, y = velocities.coords(row, col, velocities.RIGHT)
-                r = np.array([x, y]) - vortex_center
-                r_norm = np.linalg.norm(r)
-                u = vortex_speed / r_norm ** 2 * -r[1] * direction
-                velocities.set_right(row, col, u)
-
-            if row < spacial_dim - 1:
-                # calculate the velocity at the center of the bottom wall
-                x, y = velocities.coords(row, col, velocities.BOTTOM)
-                r = np.array([x, y]) - vortex_center
-                r_norm = np.linalg.norm(r)
-                v = vortex_speed / r_norm ** 2 * r[0] * direction
-                velocities.set_bottom(row, col, v)
+    return setup_vortices(spacial_dim, [vortex_speed], [vortex_center], [clockwise])
+
+
+def setup_vortices(spacial_dim, vortex_speeds, vortex_centers, clockwise, ghost_layers=0):
+    """
+    Sets up the superposition of any number of vortices. The velocity of a vortex decreases with the inverse of the
+    distance to its center, the velocity at the center itself is zero.
+    :param spacial_dim: the number of cells along each axis, or the number of cells (rows, cols) of a rectangular grid
+    :param vortex_speeds: the speeds of the vortices
+    :param vortex_centers: the centers (x, y) of the vortices
+    :param clockwise: whether the vortices rotate clockwise
+    :param ghost_layers: the number of ghost layers of the grid
+    :return: the grid containing the velocities
+    """
+    speeds = np.asarray(vortex_speeds, dtype=float) * np.where(np.asarray(clockwise), 1, -1)
+    centers = np.asarray(vortex_centers, dtype=float).reshape(-1, 2)
+
+    def velocity_function(x, y):
+        u = np.zeros(x.shape)
+        v = np.zeros(x.shape)
+        # the vortices are summed in chunks, so the temporary arrays stay small for many vortices
+        chunk_size = max(1, 2 ** 20 // x.size)
+        for start in range(0, len(speeds), chunk_size):
+            speed = speeds[start:start + chunk_size, np.newaxis]
+            r_x = x.reshape(1, -1) - centers[start:start + chunk_size, 0:1]
+            r_y = y.reshape(1, -1) - centers[start:start + chunk_size, 1:2]
+            r_squared = r_x ** 2 + r_y ** 2
+            # avoid the singularity at the centers
+            scale = np.divide(speed, r_squared, out=np.zeros(r_squared.shape), where=r_squared > 0)
+            u += np.sum(scale * -r_y, axis=0).reshape(x.shape)
+            v += np.sum(scale * r_x, axis=0).reshape(x.shape)
+        return u, v
+
+    return from_velocity_function(spacial_dim, velocity_function, ghost_layers)
+
+
+def from_velocity_function(spacial_dim, velocity_function, ghost_layers=0):
+    """
+    Sets up the velocities from an analytic velocity field. The function is evaluated once at the centers of all inner
+    u-faces and once at the centers of all inner v-faces, the boundaries stay zero.
+    :param spacial_dim: the number of cells along each axis, or the number of cells (rows, cols) of a rectangular grid
+    :param velocity_function: a vectorized function (x, y) -> (u, v), which is called with arrays of coordinates
+    :param ghost_layers: the number of ghost layers of the grid
+    :return: the grid containing the velocities
+    """
+    velocities = StaggeredGrid(spacial_dim, ghost_layers)
+    grid_rows, grid_cols = velocities.shape
+
+    # the inner u-faces are located at the left walls of the cells (row, col) with col > 0
+    rows, cols = np.indices((grid_rows, grid_cols - 1))
+    u, _ = velocity_function(cols + 0.5, rows.astype(float))
+    velocities.u[:, 1:grid_cols] = u
+
+    # the inner v-faces are located at the top walls of the cells (row, col) with row > 0
+    rows, cols = np.indices((grid_rows - 1, grid_cols))
+    _, v = velocity_function(cols.astype(float), rows + 0.5)
+    velocities.v[1:grid_rows, :] = v
 
     return velocities
 
 
-def step(velocities, solve, dt, rho=1):
+def step(
+        velocities,
+        solve,
+        dt,
+        rho=1,
+        advection_scheme='semi_lagrangian',
+        backtrace='euler',
+        scalars=None,
+        solid=None,
+        diffuse=None,
+        workers=1,
+        profiler=None
+):
     """
     Perform one step of the fluid simulation.
     :param velocities: the grid containing the velocities
     :param dt: the time step
     :param rho: the density of the fluid
-    :return: the new grid containing the velocities
+    :param advection_scheme: the advection scheme ('semi_lagrangian', 'maccormack' or 'bfecc'), see advection.advect
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see advection.trace_faces
+    :param scalars: None or cell centered scalar fields, which are transported by the fluid, see advection.advect_fields
+    :param solid: None or a boolean array of shape (rows, cols), which is True for the cells of static obstacles. The
+    solver has to be set up with the same obstacles
+    :param diffuse: None for an inviscid fluid, or the implicit diffusion of the velocities, see
+    viscosity.setup_viscosity_solver
+    :param workers: the number of threads running the advection and the projection in bands of rows, see
+    parallel.map_bands
+    :param profiler: None or a profiler (see profiling.Profiler), which times the phases of the step
+    :return: the new grid containing the velocities, the pressure and the new scalars (None, if no scalars are given)
+    """
+    masks = face_masks(solid) if solid is not None else None
+    with phase(profiler, 'advect'):
+        velocities, scalars = advect_fields(velocities, scalars, dt, advection_scheme, backtrace, workers=workers)
+        if masks is not None:
+            apply_obstacles(velocities, masks)
+    if diffuse is not None:
+        with phase(profiler, 'diffuse'):
+            diffuse(velocities, dt)
+    with phase(profiler, 'project'):
+        velocities, pressure = project(solve, velocities, dt, rho, workers=workers, profiler=profiler)
+        if masks is not None:
+            apply_obstacles(velocities, masks)
+    return velocities, pressure, scalars
+
+
+class FluidStepper:
+    """
+    Steps the fluid simulation without allocating new grids or pressure fields.
+    The velocities alternate between two preallocated grids: the advection writes into the back buffer, the projection
+    corrects it in place, then both are swapped. The divergence and the pressure are solved in preallocated arrays, and
+    the intermediate grids of the error correcting advection schemes are reused. The temporaries of the backtrace and
+    the interpolation and the work vectors of the scipy solvers are still allocated by every step. The velocities
+    returned by step are overwritten by the next but one step and the pressure by the next step, so they have to be
+    copied to be kept.
+    """
+
+    def __init__(
+            self,
+            velocities,
+            solve,
+            dt,
+            rho=1,
+            advection_scheme='semi_lagrangian',
+            backtrace='euler',
+            scalars=None,
+            solid=None,
+            diffuse=None,
+            workers=1,
+            telemetry=None,
+            profiler=None
+    ):
+        """
+        :param velocities: the grid containing the initial velocities, which is used as one of the buffers. A batch of
+        grids is stepped at once, see run_ensemble
+        :param solve: the solver of the Poisson equation, which has to accept out (see projection.setup_solver)
+        :param dt: the time step
+        :param rho: the density of the fluid
+        :param advection_scheme: the advection scheme ('semi_lagrangian', 'maccormack' or 'bfecc')
+        :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3')
+        :param scalars: None or cell centered scalar fields, which are transported by the fluid
+        :param solid: None or a boolean array, which is True for the cells of static obstacles. The solver has to be set
+        up with the same obstacles
+        :param diffuse: None for an inviscid fluid, or the implicit diffusion of the velocities
+        :param workers: the number of threads running the advection and the projection in bands of rows
+        :param telemetry: None, or a sink with a method append(record) (see telemetry.RingBufferSink and
+        profiling.JsonLinesSink), which receives a dict with the metrics of every step: the step, the simulated time,
+        the time step, the CFL number, the wall time of every phase and the metrics of the projection (see
+        projection.project)
+        :param profiler: None or a profiler (see profiling.Profiler), which times the phases of every step
+        """
+        self.solve = solve
+        self.dt = dt
+        self.rho = rho
+        self.advection_scheme = advection_scheme
+        self.backtrace = backtrace
+        self.workers = workers
+
+        self.velocities = velocities
+        self.scalars = scalars
+        self.pressure = None
+        self._back_buffer = StaggeredGrid(velocities.grid_dim, velocities.ghost_layers, velocities.batch_size)
+        self._divergence = np.empty(velocities.batch_shape + velocities.shape)
+        self._pressure = np.empty(velocities.batch_shape + velocities.shape)
+        self._scratch = {}
+        self._masks = face_masks(solid) if solid is not None else None
+        self.diffuse = diffuse
+        self.telemetry = telemetry
+        self.profiler = profiler
+        self.step_count = 0
+        self.time = 0.
+
+    def step(self, dt=None):
+        """
+        Perform one step of the fluid simulation.
+        :param dt: the time step of this step, None for the time step of the stepper
+        :return: the grid containing the velocities, the pressure and the scalars (None, if no scalars are given)
+        """
+        dt = self.dt if dt is None else dt
+        record = None
+        if self.telemetry is not None:
+            record = {
+                'step': self.step_count, 'time': self.time, 'dt': dt,
+                'cfl': float(max_velocity(self.velocities) * dt)
+            }
+
+        start = time.perf_counter()
+        with phase(self.profiler, 'advect'):
+            advected, self.scalars = advect_fields(
+                self.velocities, self.scalars, dt, self.advection_scheme, self.backtrace, out=self._back_buffer,
+                workers=self.workers, scratch=self._scratch
+            )
+            if self._masks is not None:
+                apply_obstacles(advected, self._masks)
+        advect_time = time.perf_counter()
+        if self.diffuse is not None:
+            with phase(self.profiler, 'diffuse'):
+                self.diffuse(advected, dt)
+        diffuse_time = time.perf_counter()
+        with phase(self.profiler, 'project'):
+            _, self.pressure = project(
+                self.solve, advected, dt, self.rho, out=advected, divergence_out=self._divergence,
+                pressure_out=self._pressure, workers=self.workers, metrics=record, profiler=self.profiler
+            )
+            if self._masks is not None:
+                apply_obstacles(advected, self._masks)
+        self._back_buffer, self.velocities = self.velocities, advected
+        self.step_count += 1
+        self.time += dt
+
+        if record is not None:
+            record['advect_seconds'] = advect_time - start
+            record['diffuse_seconds'] = diffuse_time - advect_time
+            record['step_seconds'] = time.perf_counter() - start
+            self.telemetry.append(record)
+        return self.velocities, self.pressure, self.scalars
+
+    def advance(self, duration, cfl):
+        """
+        Advances the simulation by duration seconds in equally long substeps. The number of substeps is chosen, so that
+        no particle is traced back further than cfl cells per substep, see cfl_substeps.
+        :param duration: the simulated time to advance
+        :param cfl: the target CFL number
+        :return: the grid containing the velocities, the pressure and the scalars after the last substep, and the
+        number of substeps
+        """
+        substeps = cfl_substeps(self.velocities, duration, cfl)
+        for _ in range(substeps):
+            self.step(duration / substeps)
+        return self.velocities, self.pressure, self.scalars, substeps
+
+
+def max_velocity(velocities):
+    """
+    :return: the largest absolute velocity component of all faces
     """
-    velocities = advect(velocities, dt)
-    velocities, pressure = project(solve, velocities, dt, rho)
-    return velocities, pressure
+    return max(np.abs(velocities.u).max(), np.abs(velocities.v).max())
 
 
-def run_simulation(spacial_dim, vortex_speeds, vortex_centers, clockwise, steps, dt, rho=1):
+def cfl_substeps(velocities, duration, cfl):
+    """
+    Calculates the number of equally long substeps to simulate duration seconds with a CFL number of at most cfl, based
+    on the largest face velocity. A calm flow is simulated with a single step.
+    :param velocities: the grid containing the velocities
+    :param duration: the simulated time
+    :param cfl: the target CFL number, the largest number of cells a particle may travel per substep
+    :return: the number of substeps
+    """
+    if cfl <= 0:
+        raise ValueError("Invalid CFL number. Please choose a positive number")
+    # dx = 1, so the CFL number of a time step dt is max_velocity * dt
+    return max(1, int(np.ceil(max_velocity(velocities) * duration / cfl)))
+
+
+# the frames of a run: lists with one entry per step, scalars and tracer_positions are None, if not simulated
+SimulationResult = namedtuple('SimulationResult', ['velocities', 'pressures', 'scalars', 'tracer_positions'])
+
+
+def run_simulation(
+        spacial_dim,
+        vortex_speeds,
+        vortex_centers,
+        clockwise,
+        steps,
+        dt,
+        rho=1,
+        ghost_layers=0,
+        solver='direct',
+        solver_options=None,
+        advection_scheme='semi_lagrangian',
+        backtrace='euler',
+        scalars=None,
+        cfl=None,
+        solid=None,
+        viscosity=0,
+        viscosity_solver=None,
+        workers=1,
+        tracers=None,
+        telemetry=None,
+        profiler=None
+):
+    """
+    Runs the fluid simulation.
+    :param spacial_dim: the number of cells along each axis, or the number of cells (rows, cols) of a rectangular grid
+    :param dt: the time between two frames. Without a CFL number, every frame is one step of the simulation
+    :param cfl: None for a fixed time step, or the target CFL number of adaptive time stepping. Every frame is then
+    simulated in as many substeps as the fastest velocity requires, see cfl_substeps
+    :param scalars: None or cell centered scalar fields (e.g. dye, density or temperature) of shape
+    (rows, cols) or (number of fields, rows, cols), which are transported by the fluid
+    :param solid: None or a boolean array of shape (rows, cols), which is True for the cells of static
+    obstacles
+    :param viscosity: the kinematic viscosity of the fluid, which is diffused implicitly. Zero for an inviscid fluid
+    :param viscosity_solver: the method of the implicit diffusion ('spectral' or 'direct'), None for 'spectral'
+    without and 'direct' with obstacles
+    :param workers: the number of threads running the advection and the projection in bands of rows. The results do
+    not depend on the number of threads
+    :param tracers: None or tracer particles (see tracers.TracerParticles), which are advected after every step
+    :param telemetry: None, or a sink receiving the metrics of every step (see FluidStepper)
+    :param profiler: None or a profiler (see profiling.Profiler), which times the setup and the phases of every frame
+    :return: a SimulationResult with the velocities as regular grids, the pressures, the scalars (None without
+    scalars) and copies of the positions of the tracers (None without tracers) of every step
+    """
+    from tqdm import tqdm  # only the runs show a progress bar, the steps are used without it
+
     print("Setting up vortexes...")
-    velocities = StaggeredGrid(spacial_dim)
-    for vortex_speed, vortex_center, is_clockwise in zip(vortex_speeds, vortex_centers, clockwise):
-        vortex = setup_vortex(spacial_dim, vortex_speed, vortex_center, is_clockwise)
-        velocities.u += vortex.u
-        velocities.v += vortex.v
+    velocities = setup_vortices(spacial_dim, vortex_speeds, vortex_centers, clockwise, ghost_layers)
+    if solid is not None:
+        apply_obstacles(velocities, face_masks(solid))
 
     print("Preparing solver...")
-    solve = setup_solver(spacial_dim)
+    with phase(profiler, 'setup_solver'):
+        solve = setup_solver(spacial_dim, solver, solid, **(solver_options or {}))
+        diffuse = None
+        if viscosity > 0:
+            if viscosity_solver is None:
+                viscosity_solver = 'spectral' if solid is None else 'direct'
+            diffuse = setup_viscosity_solver(spacial_dim, viscosity, viscosity_solver, solid)
 
     print("Performing first pressure projection...")
-    velocities, pressures = project(solve, velocities, dt, rho)
+    velocities, pressures = project(solve, velocities, dt, rho, profiler=profiler)
+    if solid is not None:
+        apply_obstacles(velocities, face_masks(solid))
+    if profiler is not None:
+        profiler.end_setup()
 
-    resulting_velocities = [velocities]
+    # the stepper reuses its grids and its pressure, so only the regular grids and copies of the pressures are kept
+    resulting_velocities = [velocities.to_regular_grid()]
     resulting_pressures = [pressures]
+    resulting_scalars = None
+    if scalars is not None:
+        scalars = np.array(scalars, dtype=float)
+        resulting_scalars = [scalars]
+    resulting_positions = None
+    if tracers is not None:
+        resulting_positions = [tracers.positions.copy()]
 
-    for _ in tqdm(range(steps), desc="Running simulation", unit="steps"):
-        velocities, pressures = step(velocities, solve, dt, rho)
-        resulting_velocities.append(velocities)
-        resulting_pressures.append(pressures)
+    stepper = FluidStepper(
+        velocities, solve, dt, rho, advection_scheme, backtrace, scalars, solid, diffuse, workers, telemetry, profiler
+    )
+    progress = tqdm(range(steps), desc="Running simulation", unit="steps")
+    if profiler is not None:
+        profiler.attach(progress)
+    for _ in progress:
+        postfix = {}
+        if cfl is None:
+            velocities, pressures, scalars = stepper.step()
+        else:
+            velocities, pressures, scalars, postfix['substeps'] = stepper.advance(dt, cfl)
+        if isinstance(solve, ConjugateGradientSolver):
+            postfix.update(iterations=solve.last_iterations, residual=f"{solve.last_residual:.1e}")
+        if postfix:
+            progress.set_postfix(postfix)
+        with phase(profiler, 'store'):
+            resulting_velocities.append(velocities.to_regular_grid())
+            resulting_pressures.append(pressures.copy())
+            if resulting_scalars is not None:
+                resulting_scalars.append(scalars)
+        if tracers is not None:
+            with phase(profiler, 'tracers'):
+                resulting_positions.append(tracers.advect(velocities, dt).copy())
+        if profiler is not None:
+            if 'substeps' in postfix:
+                profiler.count('substeps', postfix['substeps'])
+            profiler.end_step()
 
-    return list(map(lambda x: x.to_regular_grid(), resulting_velocities)), resulting_pressures
+    return SimulationResult(resulting_velocities, resulting_pressures, resulting_scalars, resulting_positions)
 
 
+def setup_ensemble(spacial_dim, vortex_speeds, vortex_centers, clockwise, ghost_layers=0):
+    """
+    Sets up a batch of grids, each containing the superposition of its own vortices (see setup_vortices).
+    :param spacial_dim: the number of cells along each axis, or the number of cells (rows, cols) of a rectangular grid
+    :param vortex_speeds: the speeds of the vortices of every grid
+    :param vortex_centers: the centers (x, y) of the vortices of every grid
+    :param clockwise: whether the vortices of every grid rotate clockwise
+    :param ghost_layers: the number of ghost layers of the grids
+    :return: the batch of grids containing the velocities
+    """
+    if not len(vortex_speeds) == len(vortex_centers) == len(clockwise):
+        raise ValueError("Invalid ensemble. Please choose the same number of vortex speeds, centers and directions")
+
+    velocities = StaggeredGrid(spacial_dim, ghost_layers, len(vortex_speeds))
+    for member, configuration in enumerate(zip(vortex_speeds, vortex_centers, clockwise)):
+        grid = setup_vortices(spacial_dim, *configuration)
+        velocities.u[member] = grid.u
+        velocities.v[member] = grid.v
+    return velocities
+
+
+def run_ensemble(
+        spacial_dim,
+        vortex_speeds,
+        vortex_centers,
+        clockwise,
+        steps,
+        dt,
+        rho=1,
+        ghost_layers=0,
+        solver='direct',
+        advection_scheme='semi_lagrangian',
+        backtrace='euler',
+        scalars=None,
+        cfl=None,
+        solid=None,
+        workers=1,
+        profiler=None
+):
+    """
+    Runs an ensemble of fluid simulations, which share the grid dimension, the time step and the density, but start from
+    different vortices. All simulations are held in one batch of grids: they are advected in one vectorized pass and
+    their pressures are solved together, as the columns of one multi-column solve of the same solver.
+    :param spacial_dim: the number of cells along each axis, or the number of cells (rows, cols) of a rectangular grid
+    :param vortex_speeds: the speeds of the vortices of every simulation
+    :param vortex_centers: the centers (x, y) of the vortices of every simulation
+    :param clockwise: whether the vortices of every simulation rotate clockwise
+    :param solver: the method of the Poisson solver ('direct' or 'spectral'), see projection.setup_solver
+    :param scalars: None or cell centered scalar fields of shape (ensemble size, rows, cols) or
+    (number of fields, ensemble size, rows, cols), which are transported by the simulations
+    :param cfl: None for a fixed time step, or the target CFL number of adaptive time stepping. All simulations take the
+    same substeps, which the fastest velocity of the ensemble requires
+    :return: a SimulationResult (see run_simulation) with the velocities as regular grids of shape
+    (ensemble size, rows, cols, 2), the pressures of shape (ensemble size, rows, cols) and the scalars of every step
+    :param profiler: None or a profiler (see profiling.Profiler), which times the phases of every frame
+    """
+    from tqdm import tqdm
+
+    if solver == 'cg':
+        raise ValueError(
+            "The conjugate gradient solver solves one right hand side at a time. Please choose 'direct' or 'spectral'"
+        )
+
+    print("Setting up vortexes...")
+    velocities = setup_ensemble(spacial_dim, vortex_speeds, vortex_centers, clockwise, ghost_layers)
+    if solid is not None:
+        apply_obstacles(velocities, face_masks(solid))
+
+    print("Preparing solver...")
+    solve = setup_solver(spacial_dim, solver, solid)
+
+    print("Performing first pressure projection...")
+    velocities, pressures = project(solve, velocities, dt, rho, workers=workers)
+    if solid is not None:
+        apply_obstacles(velocities, face_masks(solid))
+
+    resulting_velocities = [velocities.to_regular_grid()]
+    resulting_pressures = [pressures]
+    resulting_scalars = None
+    if scalars is not None:
+        scalars = np.array(scalars, dtype=float)
+        resulting_scalars = [scalars]
+
+    stepper = FluidStepper(
+        velocities, solve, dt, rho, advection_scheme, backtrace, scalars, solid, workers=workers, profiler=profiler
+    )
+    progress = tqdm(range(steps), desc=f"Running ensemble of {velocities.batch_size}", unit="steps")
+    if profiler is not None:
+        profiler.attach(progress)
+    for _ in progress:
+        if cfl is None:
+            velocities, pressures, scalars = stepper.step()
+        else:
+            velocities, pressures, scalars, substeps = stepper.advance(dt, cfl)
+            progress.set_postfix(substeps=substeps)
+        resulting_velocities.append(velocities.to_regular_grid())
+        resulting_pressures.append(pressures.copy())
+        if resulting_scalars is not None:
+            resulting_scalars.append(scalars)
+        if profiler is not None:
+            profiler.end_step()
 
+    return SimulationResult(resulting_velocities, resulting_pressures, resulting_scalars, None)
@@ -0,0 +1,58 @@
+import numpy as np
+
+from profiling import phase
+from .advection_3d import advect_fields
+from .datastructures.staggered_grid_3d import StaggeredGrid3D, grid_shape_3d
+from .projection_3d import project
+
+
+def setup_smoke(spacial_dim, center, radius):
+    """
+    Sets up a fluid at rest with a ball of smoke
+    :param spacial_dim: the number of cells along each axis, or the number of cells (layers, rows, cols)
+    :param center: the center (x, y, z) of the ball
+    :param radius: the radius of the ball, in cells
+    :return: the 3D grid containing the velocities and the smoke density at the cell centers, of shape
+    (layers, rows, cols)
+    """
+    z, y, x = np.indices(grid_shape_3d(spacial_dim), dtype=float)
+    distance = np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2 + (z - center[2]) ** 2)
+    density = np.clip(radius + 0.5 - distance, 0, 1)
+    return StaggeredGrid3D(spacial_dim), density
+
+
+def step(velocities, solve, dt, rho=1, backtrace='euler', scalars=None, buoyancy=0, workers=1, profiler=None):
+    """
+    Perform one step of the 3D fluid simulation, see fluid_simulation.step.
+    :param velocities: the 3D grid containing the velocities
+    :param solve: the solver of the Poisson equation, see projection_3d.setup_solver
+    :param dt: the time step
+    :param rho: the density of the fluid
+    :param backtrace: the integration of the backtrace ('euler', 'rk2' or 'rk3'), see advection_3d.integrate_backtrace
+    :param scalars: None or cell centered scalar fields, which are transported by the fluid. The first field is the
+    smoke density, which the buoyancy acts on
+    :param buoyancy: the upward acceleration of the smoke per unit density. Up is the direction of the first row (-y),
+    which is the top of an image of a layer
+    :param workers: the number of threads running the advection and the projection in bands of layers
+    :param profiler: None or a profiler (see profiling.Profiler), which times the phases of the step
+    :return: the new grid containing the velocities, the pressure and the new scalars (None, if no scalars are given)
+    """
+    with phase(profiler, 'advect'):
+        velocities, scalars = advect_fields(velocities, scalars, dt, backtrace, workers=workers)
+    if buoyancy != 0 and scalars is not None:
+        with phase(profiler, 'buoyancy'):
+            add_buoyancy(velocities, np.reshape(scalars, (-1,) + velocities.shape)[0], buoyancy, dt)
+    with phase(profiler, 'project'):
+        velocities, pressure = project(solve, velocities, dt, rho, out=velocities, workers=workers)
+    return velocities, pressure, scalars
+
+
+def add_buoyancy(velocities, density, buoyancy, dt):
+    """
+    Accelerates the inner v-faces upwards, proportional to the mean smoke density of the two cells they separate
+    :param velocities: the 3D grid containing the velocities, which is changed in place
+    :param density: the smoke density at the cell centers, of shape (layers, rows, cols)
+    :param buoyancy: the upward acceleration per unit density
+    :param dt: the time step
+    """
+    velocities.v[:, 1:-1, :] -= 0.5 * dt * buoyancy * (density[:, :-1, :] + density[:, 1:, :])
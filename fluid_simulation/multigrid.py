@@ -0,0 +1,77 @@
+import numpy as np
+import scipy.sparse as sp
+
+
+class MultigridPreconditioner:
+    """
+    Aggregation multigrid V-cycle, used as preconditioner of the conjugate gradient method.
+    The unknowns are cells of a 2D or 3D grid. On every level 2x2 (or 2x2x2) neighbouring cells are aggregated into one
+    coarse cell, the coarse matrix is the Galerkin product P^T A P of the piecewise constant prolongation P. The cycle
+    uses the same number of damped Jacobi sweeps before and after the coarse grid correction, so the preconditioner is
+    symmetric.
+    """
+
+    def __init__(
+            self, A, rows, cols, smoothing_steps=2, coarsest_size=64, omega=2 / 3, correction_scale=1.8, layers=None
+    ):
+        """
+        :param A: the symmetric positive definite matrix
+        :param rows: the row of the cell of every unknown
+        :param cols: the column of the cell of every unknown
+        :param smoothing_steps: the number of Jacobi sweeps before and after the coarse grid correction
+        :param coarsest_size: the coarsening stops, once a level has at most this many unknowns
+        :param omega: the damping of the Jacobi sweeps
+        :param correction_scale: the coarse grid correction is scaled by this factor, since the piecewise constant
+        prolongation underestimates smooth errors
+        :param layers: None for a 2D grid, or the layer of the cell of every unknown of a 3D grid
+        """
+        self.smoothing_steps = smoothing_steps
+        self.correction_scale = correction_scale
+        self.levels = []
+
+        A = sp.csr_matrix(A)
+        cells = [np.asarray(rows), np.asarray(cols)]
+        if layers is not None:
+            cells.insert(0, np.asarray(layers))
+        while A.shape[0] > coarsest_size:
+            coarse_cells = [axis // 2 for axis in cells]
+            coarse_shape = [axis.max() + 1 for axis in coarse_cells]
+            aggregates, fine_to_coarse = np.unique(
+                np.ravel_multi_index(coarse_cells, coarse_shape), return_inverse=True
+            )
+            if len(aggregates) == A.shape[0]:
+                break
+
+            P = sp.csr_matrix(
+                (np.ones(A.shape[0]), (np.arange(A.shape[0]), fine_to_coarse)),
+                shape=(A.shape[0], len(aggregates))
+            )
+            self.levels.append((A, omega / A.diagonal(), P, P.T.tocsr()))
+
+            A = (P.T @ A @ P).tocsr()
+            cells = np.unravel_index(aggregates, coarse_shape)
+
+        self.coarsest_inverse = np.linalg.inv(A.toarray())
+
+    def __call__(self, b):
+        return self._cycle(0, b)
+
+    def _cycle(self, level, b):
+        if level == len(self.levels):
+            return self.coarsest_inverse @ b
+
+        A, inverse_diagonal, P, R = self.levels[level]
+
+        # pre-smoothing, starting from zero
+        x = inverse_diagonal * b
+        for _ in range(self.smoothing_steps - 1):
+            x += inverse_diagonal * (b - A @ x)
+
+        # coarse grid correction
+        x += self.correction_scale * (P @ self._cycle(level + 1, R @ (b - A @ x)))
+
+        # post-smoothing
+        for _ in range(self.smoothing_steps):
+            x += inverse_diagonal * (b - A @ x)
+
+        return x
@@ -0,0 +1,72 @@
+import hashlib
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def face_masks(solid):
+    """
+    Finds the faces that are open to the flow. A face is closed, if it touches a solid cell or the boundary of the grid.
+    :param solid: a boolean array of shape (rows, cols), which is True for the solid cells
+    :return: boolean arrays of the shapes of u and v, which are True for the open faces
+    """
+    solid = np.asarray(solid, dtype=bool)
+    rows, cols = solid.shape
+
+    u_open = np.zeros((rows, cols + 1), dtype=bool)
+    u_open[:, 1:-1] = ~(solid[:, :-1] | solid[:, 1:])  # neither the left nor the right cell is solid
+
+    v_open = np.zeros((rows + 1, cols), dtype=bool)
+    v_open[1:-1, :] = ~(solid[:-1, :] | solid[1:, :])  # neither the top nor the bottom cell is solid
+
+    return u_open, v_open
+
+
+def apply_obstacles(velocities, masks):
+    """
+    Sets the velocities of all closed faces to zero, in place.
+    :param velocities: the grid containing the velocities
+    :param masks: the open faces, as returned by face_masks
+    :return: the grid containing the velocities
+    """
+    u_open, v_open = masks
+    np.multiply(velocities.u, u_open, out=velocities.u)
+    np.multiply(velocities.v, v_open, out=velocities.v)
+    return velocities
+
+
+def fluid_components(solid):
+    """
+    Labels the connected components of the fluid cells. Cells are connected through the faces they share.
+    :param solid: a boolean array of shape (rows, cols), which is True for the solid cells
+    :return: the label of every cell, flattened row by row, -1 for solid cells
+    """
+    import scipy.sparse.csgraph as csgraph  # loads scipy.sparse.linalg, so only on first use
+
+    solid = np.asarray(solid, dtype=bool)
+    fluid = ~solid.reshape(-1)
+    cells = np.arange(solid.size).reshape(solid.shape)
+
+    # pairs of horizontally and vertically neighbouring fluid cells
+    horizontal = ~(solid[:, :-1] | solid[:, 1:])
+    vertical = ~(solid[:-1, :] | solid[1:, :])
+    first = np.concatenate([cells[:, :-1][horizontal], cells[:-1, :][vertical]])
+    second = np.concatenate([cells[:, 1:][horizontal], cells[1:, :][vertical]])
+
+    adjacency = sp.csr_matrix((np.ones(len(first)), (first, second)), shape=(solid.size, solid.size))
+    _, labels = csgraph.connected_components(adjacency, directed=False)
+
+    # renumber the components of the fluid cells, starting from zero
+    _, labels[fluid] = np.unique(labels[fluid], return_inverse=True)
+    labels[~fluid] = -1
+    return labels
+
+
+def mask_key(solid):
+    """
+    :return: a hashable key identifying the mask, None for no mask
+    """
+    if solid is None:
+        return None
+    solid = np.asarray(solid, dtype=bool)
+    return solid.shape, hashlib.sha1(np.packbits(solid).tobytes()).hexdigest()
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# thread pools, keyed by their number of workers
+_executors = {}
+
+
+def row_bands(rows, workers):
+    """
+    Splits the rows of a grid into contiguous bands of (almost) equal size
+    :param rows: the number of rows
+    :param workers: the number of bands, at most one band per row is created
+    :return: a list of the bands (start, stop)
+    """
+    bounds = np.linspace(0, rows, max(1, min(workers, rows)) + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def map_bands(function, rows, workers, *arguments):
+    """
+    Calls the function for every band of rows. With more than one worker, the bands are processed by a thread pool,
+    which runs in parallel, as long as the function spends its time in NumPy operations that release the GIL.
+    :param function: a function (band, *arguments of the band) -> result
+    :param rows: the number of rows
+    :param workers: the number of threads
+    :param arguments: lists with one argument per band, e.g. the results of a previous call of map_bands
+    :return: the results of the bands, in the order of row_bands
+    """
+    bands = row_bands(rows, workers)
+    if len(bands) == 1:
+        return [function(bands[0], *[argument[0] for argument in arguments])]
+
+    if workers not in _executors:
+        _executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fluid')
+    return list(_executors[workers].map(function, bands, *arguments))
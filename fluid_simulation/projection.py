@@ -1,79 +1,206 @@
+import time
+
 import numpy as np
+import scipy.fft as fft
 import scipy.sparse as sp
-import scipy.sparse.linalg as spl
 
-from datastructures.staggered_grid import StaggeredGrid
+from profiling import phase
+from .datastructures.staggered_grid import StaggeredGrid, grid_shape
+from .multigrid import MultigridPreconditioner
+from .obstacles import fluid_components, mask_key
+from .parallel import map_bands
+from .telemetry import divergence_norms
 
 
-def project(solve, velocities, dt, rho=1):
+def project(
+        solve,
+        velocities,
+        dt,
+        rho=1,
+        out=None,
+        divergence_out=None,
+        pressure_out=None,
+        workers=1,
+        metrics=None,
+        profiler=None
+):
     """
     Project the velocities to be mass-conserving.
-    :param velocities: the grid containing the velocities
+    The pressures of a batch of grids are solved together, as one column per grid.
+    :param velocities: the grid containing the velocities, or a batch of grids
     :param dt: the time step
-    :return: the new grid containing the velocities
+    :param out: a grid to write the corrected velocities into, which may be the grid of the velocities itself
+    :param divergence_out: an array of shape (rows, cols), or (batch_size, rows, cols), to calculate the divergence in
+    :param pressure_out: an array of the same shape to solve the pressure in, see solve_poisson_equation
+    :param workers: the number of threads calculating the divergence and the correction in bands of rows
+    :param metrics: None, or a dict to record the metrics of the projection in: the wall time of every phase
+    (divergence_seconds, solve_seconds, correct_seconds), the largest and the L2 divergence before and after the
+    projection (see telemetry.divergence_norms) and the iterations and the residual of an iterative solver (None for
+    the direct solvers). The divergence after the projection costs an additional pass over the grid
+    :param profiler: None or a profiler (see profiling.Profiler), which times the divergence, the solve and the
+    correction as phases and counts the iterations of an iterative solver
+    :return: the new grid containing the velocities and the pressure of shape (rows, cols), or (batch_size, rows, cols),
+    which is pressure_out, if given
     """
-    divergence = calculate_divergence(velocities)
-    pressure = solve_poisson_equation(solve, divergence, dt, rho)
-    pressure = pressure.reshape(velocities.grid_dim, velocities.grid_dim) # reshape the pressure back to grid form
-    velocities = correct_velocities(velocities, pressure, dt)
-    new_divergence = calculate_divergence(velocities)
+    start = time.perf_counter()
+    with phase(profiler, 'divergence'):
+        divergence = calculate_divergence(velocities, divergence_out, workers)
+    divergence_time = time.perf_counter()
+    if metrics is not None:
+        metrics['divergence_max_before'], metrics['divergence_l2_before'] = divergence_norms(divergence)
+
+    solve_start = time.perf_counter()
+    with phase(profiler, 'solve'):
+        if pressure_out is None:
+            # reshape the pressure back to grid form
+            pressure = solve_poisson_equation(solve, divergence, dt, rho).T.reshape(
+                velocities.batch_shape + velocities.shape
+            )
+        else:
+            # the columns are a view of pressure_out, like the ones of the divergence
+            solve_poisson_equation(
+                solve, divergence, dt, rho, out=pressure_out.reshape(velocities.batch_shape + (-1,)).T
+            )
+            pressure = pressure_out
+    solve_time = time.perf_counter()
+    if profiler is not None and hasattr(solve, 'last_iterations'):
+        profiler.count('solver_iterations', solve.last_iterations)
+
+    with phase(profiler, 'correct'):
+        velocities = correct_velocities(velocities, pressure, dt, rho, out=out, workers=workers)
+    correct_time = time.perf_counter()
+
+    if metrics is not None:
+        metrics['divergence_seconds'] = divergence_time - start
+        metrics['solve_seconds'] = solve_time - solve_start
+        metrics['correct_seconds'] = correct_time - solve_time
+        metrics['solver_iterations'] = getattr(solve, 'last_iterations', None)
+        residual = getattr(solve, 'last_residual', None)
+        metrics['solver_residual'] = None if residual is None else float(residual)
+        metrics['divergence_max_after'], metrics['divergence_l2_after'] = divergence_norms(
+            calculate_divergence(velocities, workers=workers)
+        )
     return velocities, pressure
 
 
-def calculate_divergence(velocities):
+def calculate_divergence(velocities, out=None, workers=1):
     """
     Calculate the divergence of the velocities.
     :param velocities: the grid containing the velocities
-    :return: the divergence of the velocities, reshaped into a 1D array for compatibility with the next steps
+    :param out: an array of shape (rows, cols), or (batch_size, rows, cols), to write the divergence into, instead of
+    allocating a new one
+    :param workers: the number of threads calculating the divergence in bands of rows (see parallel.map_bands)
+    :return: the divergence of the velocities, reshaped into a 1D array for compatibility with the next steps. For a
+    batch of grids, the divergence of every grid is a column of an array of shape (rows * cols, batch_size)
     """
-    divergence = np.zeros((velocities.grid_dim, velocities.grid_dim))
-    for row in range(velocities.grid_dim):
-        for col in range(velocities.grid_dim):
-            up, right, down, left = velocities[row, col]
-            divergence[row, col] = right - left + down - up  # dx = 1, so we don't need to divide by dx
-    return divergence.reshape(-1)
+    if out is None:
+        out = np.empty(velocities.batch_shape + velocities.shape)
+
+    def divergence_band(band):
+        start, stop = band
+        divergence = out[..., start:stop, :]
+        u, v = velocities.u, velocities.v
+        # dx = 1, so we don't need to divide by dx
+        np.subtract(u[..., start:stop, 1:], u[..., start:stop, :-1], out=divergence)  # right - left
+        divergence += v[..., start + 1:stop + 1, :]  # down
+        divergence -= v[..., start:stop, :]  # up
 
+    map_bands(divergence_band, velocities.rows, workers)
+    return out.reshape(velocities.batch_shape + (-1,)).T
 
-def solve_poisson_equation(solve, divergence, dt, rho=1):
+
+def solve_poisson_equation(solve, divergence, dt, rho=1, out=None):
     """
     Solve the Poisson equation for the pressure.
     :param solve: the function to solve the linear system of equations
     :param divergence: the divergence of the velocities
     :param dt: the time step
     :param rho: the density of the fluid
-    :return: the pressure field
+    :param out: None, or an array of the shape of the divergence to solve the pressure in. The right hand side is scaled
+    into it and solved in place, so the solver has to accept out (like the solvers of setup_solver)
+    :return: the pressure field (out, if given)
     """
-    return solve(-rho / dt * divergence)
+    if out is None:
+        return solve(-rho / dt * divergence)
+    np.multiply(divergence, -rho / dt, out=out)
+    return solve(out, out=out)
+
+
+# solvers of the poisson equation, keyed by the method, the grid dimension and the obstacle mask
+_solver_cache = {}
 
 
-def setup_solver(grid_dim):
+def setup_solver(grid_dim, method='direct', solid=None, **options):
     """
     Set up the solver for the Poisson equation.
-    :param grid_dim: the dimension of the grid
-    :return: a function that solves the linear system of equations for the Poisson equation
-    """
-    main_diagonal = np.ones(grid_dim ** 2) * 4
-    for i in range(grid_dim ** 2):
-        if i < grid_dim:
-            main_diagonal[i] -= 1
-        if i >= grid_dim ** 2 - grid_dim:
-            main_diagonal[i] -= 1
-        if (i + 1) % grid_dim == 0:
-            main_diagonal[i] -= 1
-        if i % grid_dim == 0:
-            main_diagonal[i] -= 1
-
-    right_neighbour_diagonal = np.ones(grid_dim ** 2) * -1
-    for i in range(grid_dim ** 2):
-        if i % grid_dim == 0:
-            right_neighbour_diagonal[i] = 0
-
-    left_neighbour_diagonal = np.ones(grid_dim ** 2) * -1
-    for i in range(grid_dim ** 2):
-        if i % grid_dim == grid_dim - 1:
-            left_neighbour_diagonal[i] = 0
-
-    vertical_neighbour_diagonal = np.ones(grid_dim ** 2) * -1
+    The solvers are cached, so setting up a solver for the same grid dimension and obstacles again is free.
+    :param grid_dim: the dimension of the grid, an int for a square grid or the number of cells (rows, cols)
+    :param method: the method to solve the equation with:
+        'direct' factorizes the sparse Poisson matrix,
+        'spectral' diagonalizes the Poisson matrix with a discrete cosine transform and needs no setup,
+        'cg' solves the equation iteratively with a warm started, preconditioned conjugate gradient method
+    :param solid: None or a boolean array of shape (rows, cols), which is True for the solid cells of static
+    obstacles (not supported by the 'spectral' method)
+    :param options: the options of the conjugate gradient method (see ConjugateGradientSolver)
+    :return: a function that solves the linear system of equations for the Poisson equation: solve(rhs, out=None), which
+    writes the pressure into out, if given. out may be rhs itself
+    """
+    if method == 'cg':
+        # the solver keeps the last pressure for warm starts, so only its preconditioner is cached
+        return ConjugateGradientSolver(grid_dim, solid=solid, **options)
+    if options:
+        raise ValueError(f"The '{method}' solver has no options")
+
+    key = (method, grid_shape(grid_dim), mask_key(solid))
+    if key not in _solver_cache:
+        if method == 'direct':
+            if solid is None:
+                _solver_cache[key] = _factorize_poisson_matrix(poisson_matrix(grid_dim))
+            else:
+                _solver_cache[key] = _factorize_masked_poisson_matrix(poisson_matrix(grid_dim, solid), solid)
+        elif method == 'spectral':
+            if solid is not None:
+                raise ValueError("The spectral solver does not support obstacles. Please choose 'direct' or 'cg'")
+            _solver_cache[key] = _spectral_poisson_solver(grid_dim)
+        else:
+            raise ValueError("Invalid solver method. Please choose 'direct', 'spectral' or 'cg'")
+    return _solver_cache[key]
+
+
+def clear_solver_cache():
+    """
+    Removes all cached factorizations
+    """
+    _solver_cache.clear()
+
+
+def poisson_matrix(grid_dim, solid=None):
+    """
+    Assemble the matrix of the Poisson equation with Neumann boundary conditions (the negative laplacian).
+    :param grid_dim: the dimension of the grid, an int for a square grid or the number of cells (rows, cols)
+    :param solid: None or a boolean array of shape (rows, cols), which is True for the solid cells. The walls of
+    obstacles are Neumann boundaries as well, see masked_poisson_matrix
+    :return: the sparse matrix of shape (rows * cols, rows * cols)
+    """
+    if solid is not None:
+        return masked_poisson_matrix(solid)
+
+    grid_rows, grid_cols = grid_shape(grid_dim)
+    cell_count = grid_rows * grid_cols
+    rows, cols = np.divmod(np.arange(cell_count), grid_cols)
+
+    # every cell at the boundary has one neighbour less for each boundary it touches
+    main_diagonal = (
+            4.
+            - (rows == 0) - (rows == grid_rows - 1)
+            - (cols == 0) - (cols == grid_cols - 1)
+    )
+
+    # cells at the start of a row have no left neighbour, cells at the end of a row have no right neighbour
+    right_neighbour_diagonal = np.where(cols == 0, 0., -1.)
+    left_neighbour_diagonal = np.where(cols == grid_cols - 1, 0., -1.)
+
+    vertical_neighbour_diagonal = np.ones(cell_count) * -1
 
     data = np.array([
         main_diagonal,
@@ -82,47 +209,326 @@ def setup_solver(grid_dim):
         vertical_neighbour_diagonal,
         vertical_neighbour_diagonal
     ])
-    offsets = np.array([0, 1, -1, grid_dim, -grid_dim])
+    offsets = np.array([0, 1, -1, grid_cols, -grid_cols])
 
     A = sp.dia_matrix(
         (data, offsets),
-        shape=(grid_dim ** 2, grid_dim ** 2)
-    )  # dx = 1, so we don't need to divide by dx**2
+        shape=(cell_count, cell_count)
+    ).tocsr()  # dx = 1, so we don't need to divide by dx**2
+
+    row_sums = np.asarray(A.sum(axis=1)).reshape(-1)
+    assert np.all(row_sums == 0), \
+        f"Row {np.flatnonzero(row_sums)[0]} is not zero. Check the boundary conditions of the poisson matrix."
 
-    for i in range(grid_dim ** 2):
-        assert np.sum(np.array(A.toarray())[i]) == 0, \
-            f"Row {i} is not zero. Check the boundary conditions of the poisson matrix."
+    return A
 
-    return spl.factorized(A.tocsc())
 
+def masked_poisson_matrix(solid):
+    """
+    Assemble the matrix of the Poisson equation for a grid with solid cells. Two fluid cells are coupled, if they share
+    a face, the diagonal entry of a fluid cell is its number of fluid neighbours. The rows of the solid cells are the
+    identity, so their pressure is zero for a right hand side of zero.
+    :param solid: a boolean array of shape (rows, cols), which is True for the solid cells
+    :return: the sparse matrix of shape (rows * cols, rows * cols)
+    """
+    solid = np.asarray(solid, dtype=bool)
+    cell_count = solid.size
+    cells = np.arange(cell_count).reshape(solid.shape)
+
+    # pairs of horizontally and vertically neighbouring fluid cells
+    horizontal = ~(solid[:, :-1] | solid[:, 1:])
+    vertical = ~(solid[:-1, :] | solid[1:, :])
+    first = np.concatenate([cells[:, :-1][horizontal], cells[:-1, :][vertical]])
+    second = np.concatenate([cells[:, 1:][horizontal], cells[1:, :][vertical]])
+
+    main_diagonal = np.bincount(first, minlength=cell_count) + np.bincount(second, minlength=cell_count)
+    main_diagonal = np.where(solid.reshape(-1), 1., main_diagonal)
+
+    A = sp.csr_matrix(
+        (
+            np.concatenate([main_diagonal, -np.ones(2 * len(first))]),
+            (np.concatenate([cells.reshape(-1), first, second]), np.concatenate([cells.reshape(-1), second, first]))
+        ),
+        shape=(cell_count, cell_count)
+    )
+
+    row_sums = np.asarray(A.sum(axis=1)).reshape(-1)
+    assert np.all(row_sums == solid.reshape(-1)), \
+        "The rows of the fluid cells do not sum up to zero. Check the boundary conditions of the poisson matrix."
+
+    return A
+
+
+def _factorize_poisson_matrix(A):
+    """
+    Factorize the Poisson matrix.
+    With Neumann boundary conditions the matrix is singular, every constant can be added to a solution. To fix the gauge,
+    the first cell is additionally pinned to zero, which makes the matrix regular. The right hand side is projected onto
+    the range of the matrix before solving, and the pressure is shifted to a mean of zero afterwards.
+    :param A: the Poisson matrix
+    :return: a function that solves the linear system of equations for one or more right hand sides (as columns)
+    """
+    import scipy.sparse.linalg as spl  # imported on first use, like in all solvers below
+
+    lu_solve = spl.factorized(_pin_first_cell(A).tocsc())
 
-def correct_velocities(velocities, pressure, dt, rho=1):
+    def solve(rhs, out=None):
+        # remove the component in the null space, which is only caused by rounding errors for a closed domain
+        pressure = lu_solve(rhs - np.mean(rhs, axis=0))
+        return np.subtract(pressure, np.mean(pressure, axis=0), out=out)
+
+    return solve
+
+
+def _factorize_masked_poisson_matrix(A, solid):
+    """
+    Factorize the Poisson matrix of a grid with solid cells, see masked_poisson_matrix.
+    Every connected component of fluid cells is singular on its own, so the first cell of every component is pinned.
+    The right hand side is projected onto the range of the matrix by removing its mean in every component, and the
+    pressure of every component is shifted to a mean of zero afterwards.
+    :param A: the masked Poisson matrix
+    :param solid: the solid cells
+    :return: a function that solves the linear system of equations for one or more right hand sides (as columns)
+    """
+    labels = fluid_components(solid)
+    remove_means = _component_mean_remover(labels)
+    import scipy.sparse.linalg as spl
+
+    lu_solve = spl.factorized(_pin_component_cells(A, labels).tocsc())
+
+    def solve(rhs, out=None):
+        return remove_means(lu_solve(remove_means(rhs)), out)
+
+    return solve
+
+
+def _component_mean_remover(labels):
+    """
+    :param labels: the component of every cell, -1 for solid cells (see obstacles.fluid_components)
+    :return: a function remove_means(x, out=None), that removes the mean of every component from one or more vectors
+    (as columns) and sets the solid cells to zero
+    """
+    fluid_cells = np.flatnonzero(labels >= 0)
+    fluid_labels = labels[fluid_cells]
+    counts = np.bincount(fluid_labels)
+
+    # averaging sums up the cells of a component divided by their number, spreading copies the means to the cells
+    averaging = sp.csr_matrix(
+        (1 / counts[fluid_labels], (fluid_labels, fluid_cells)), shape=(len(counts), len(labels))
+    )
+    spreading = sp.csr_matrix(
+        (np.ones(len(fluid_cells)), (fluid_cells, fluid_labels)), shape=(len(labels), len(counts))
+    )
+    fluid = (labels >= 0).astype(float)
+
+    def remove_means(x, out=None):
+        return np.multiply(x - spreading @ (averaging @ x), fluid.reshape(fluid.shape + (1,) * (x.ndim - 1)), out=out)
+
+    return remove_means
+
+
+def _pin_component_cells(A, labels):
+    """
+    Adds one to the diagonal entry of the first cell of every fluid component, see _pin_first_cell
+    """
+    fluid_cells = np.flatnonzero(labels >= 0)
+    _, first = np.unique(labels[fluid_cells], return_index=True)
+    first_cells = fluid_cells[first]
+    return (A + sp.csr_matrix((np.ones(len(first_cells)), (first_cells, first_cells)), shape=A.shape)).tocsr()
+
+
+def _pin_first_cell(A):
+    """
+    Adds one to the first diagonal entry of the singular Poisson matrix. For a right hand side in the range of the
+    Poisson matrix, the solution of the resulting regular matrix is the solution with a pressure of zero in the first
+    cell.
+    """
+    return (A + sp.csr_matrix(([1.], ([0], [0])), shape=A.shape)).tocsr()
+
+
+def _spectral_poisson_solver(grid_dim):
+    """
+    Set up a solver for the Poisson equation, that uses the discrete cosine transform (DCT-II).
+    The Poisson matrix with Neumann boundary conditions is diagonalized by the DCT-II along both axes, its eigenvalues are
+    (2 - 2 cos(pi * k / rows)) + (2 - 2 cos(pi * l / cols)). The eigenvalue of the constant mode (k = l = 0) is zero,
+    this mode is dropped, which yields the solution with a mean of zero.
+    :param grid_dim: the dimension of the grid, an int for a square grid or the number of cells (rows, cols)
+    :return: a function that solves the linear system of equations for one or more right hand sides (as columns)
+    """
+    rows, cols = grid_shape(grid_dim)
+    row_eigenvalues = 2 - 2 * np.cos(np.pi * np.arange(rows) / rows)
+    col_eigenvalues = 2 - 2 * np.cos(np.pi * np.arange(cols) / cols)
+    eigenvalues = row_eigenvalues[:, None] + col_eigenvalues[None, :]
+    eigenvalues[0, 0] = 1  # avoid the division by zero, the constant mode is dropped below
+    inverse_eigenvalues = 1 / eigenvalues
+    inverse_eigenvalues[0, 0] = 0
+
+    def solve(rhs, out=None):
+        grid_rhs = rhs.reshape((rows, cols) + rhs.shape[1:])
+        if out is not None:
+            # scipy transforms a float array in place with overwrite_x, so the pressure is solved in out
+            grid_out = out.reshape(grid_rhs.shape)
+            if out is not rhs:
+                np.copyto(grid_out, grid_rhs)
+            grid_rhs = grid_out
+        coefficients = fft.dctn(grid_rhs, type=2, axes=(0, 1), norm='ortho', overwrite_x=out is not None)
+        coefficients *= inverse_eigenvalues.reshape(inverse_eigenvalues.shape + (1,) * (rhs.ndim - 1))
+        pressure = fft.idctn(coefficients, type=2, axes=(0, 1), norm='ortho', overwrite_x=True).reshape(rhs.shape)
+        if out is None:
+            return pressure
+        if not np.shares_memory(pressure, out):
+            np.copyto(out, pressure)
+        return out
+
+    return solve
+
+
+class ConjugateGradientSolver:
+    """
+    Solves the Poisson equation iteratively with the preconditioned conjugate gradient method.
+    Every solve is warm started from the pressure of the previous solve, which changes little between steps. The number
+    of iterations and the relative residual of every solve are recorded.
+    """
+
+    def __init__(self, grid_dim, rtol=1e-6, maxiter=None, preconditioner='multigrid', solid=None):
+        """
+        :param grid_dim: the dimension of the grid, an int for a square grid or the number of cells (rows, cols)
+        :param rtol: the tolerance of the residual, relative to the right hand side
+        :param maxiter: the maximum number of iterations per solve, None for no limit. With a limit, a solve might stop
+        before reaching the tolerance, which trades exact incompressibility for a fixed cost per step
+        :param preconditioner: the preconditioner to use:
+            'multigrid' an aggregation multigrid V-cycle (see MultigridPreconditioner),
+            'jacobi' the inverse of the diagonal,
+            None no preconditioning
+        :param solid: None or a boolean array of shape (rows, cols), which is True for the solid cells
+        """
+        self.grid_dim = grid_dim
+        self.rtol = rtol
+        self.maxiter = maxiter
+        self.A, self.M, self._remove_means = self._setup(grid_dim, preconditioner, solid)
+
+        self.pressure = None  # the last solution, with a pressure of zero in the first cell
+        self.last_iterations = 0
+        self.last_residual = 0.
+        self.iterations = []
+        self.residuals = []
+
+    def _setup(self, grid_dim, preconditioner, solid):
+        """
+        :return: the pinned Poisson matrix, the preconditioner and the function removing the null space from one vector,
+        remove_means(x, out=None). Subclasses for other grids override it, see _conjugate_gradient_setup
+        """
+        return _conjugate_gradient_setup(grid_dim, preconditioner, solid)
+
+    def __call__(self, rhs, out=None):
+        """
+        Solve the Poisson equation
+        :param rhs: the right hand side
+        :param out: None or an array to write the pressure into, which may be rhs itself. The iterations of scipy still
+        allocate their own vectors
+        :return: the pressure field with a mean of zero (out, if given)
+        """
+        import scipy.sparse.linalg as spl
+
+        rhs = self._remove_means(rhs, out)  # remove the component in the null space
+
+        iterations = 0
+
+        def count(_):
+            nonlocal iterations
+            iterations += 1
+
+        pressure, _ = spl.cg(
+            self.A, rhs, x0=self.pressure, rtol=self.rtol, maxiter=self.maxiter, M=self.M, callback=count
+        )
+
+        rhs_norm = np.linalg.norm(rhs)
+        residual = np.linalg.norm(rhs - self.A @ pressure) / rhs_norm if rhs_norm > 0 else 0.
+
+        self.pressure = pressure
+        self.last_iterations = iterations
+        self.last_residual = residual
+        self.iterations.append(iterations)
+        self.residuals.append(residual)
+        return self._remove_means(pressure, out)
+
+
+def _conjugate_gradient_setup(grid_dim, preconditioner, solid=None):
+    """
+    Set up the pinned Poisson matrix, the preconditioner and the removal of the null space for the conjugate gradient
+    method. All are cached.
+    """
+    key = ('cg', preconditioner, grid_shape(grid_dim), mask_key(solid))
+    if key not in _solver_cache:
+        if solid is None:
+            A = _pin_first_cell(poisson_matrix(grid_dim))
+
+            def remove_means(x, out=None):
+                return np.subtract(x, np.mean(x), out=out)
+        else:
+            labels = fluid_components(solid)
+            A = _pin_component_cells(poisson_matrix(grid_dim, solid), labels)
+            remove_means = _component_mean_remover(labels)
+
+        grid_rows, grid_cols = grid_shape(grid_dim)
+        rows, cols = np.divmod(np.arange(grid_rows * grid_cols), grid_cols)
+        _solver_cache[key] = A, _conjugate_gradient_preconditioner(A, preconditioner, rows, cols), remove_means
+    return _solver_cache[key]
+
+
+def _conjugate_gradient_preconditioner(A, preconditioner, rows, cols, layers=None):
+    """
+    Set up the preconditioner of the conjugate gradient method.
+    :param A: the pinned Poisson matrix
+    :param preconditioner: 'multigrid', 'jacobi' or None, see ConjugateGradientSolver
+    :param rows: the row of the cell of every unknown, which the multigrid aggregates
+    :param cols: the column of the cell of every unknown
+    :param layers: None for a 2D grid, or the layer of the cell of every unknown of a 3D grid
+    :return: the preconditioner, None for no preconditioning
+    """
+    import scipy.sparse.linalg as spl
+
+    if preconditioner == 'multigrid':
+        return spl.LinearOperator(A.shape, matvec=MultigridPreconditioner(A, rows, cols, layers=layers))
+    if preconditioner == 'jacobi':
+        return sp.diags(1 / A.diagonal()).tocsr()
+    if preconditioner is None:
+        return None
+    raise ValueError("Invalid preconditioner. Please choose 'multigrid', 'jacobi' or None")
+
+
+def correct_velocities(velocities, pressure, dt, rho=1, out=None, workers=1):
     """
     Correct the velocities to be mass-conserving.
     :param velocities: the grid containing the velocities
-    :param pressure: the pressure field
+    :param pressure: the pressure field, of shape (rows, cols) or (batch_size, rows, cols) for a batch of grids
     :param dt: the time step
     :param rho: the density of the fluid
-    :return: the new grid containing the velocities
-    """
-    new_velocities = StaggeredGrid(velocities.grid_dim)
-    for row in range(velocities.grid_dim):
-        for col in range(velocities.grid_dim):
-            # correct the right velocity, if we are not at the right boundary
-            if col < velocities.grid_dim - 1:
-                new_velocities[row, col, new_velocities.RIGHT] = (
-                        velocities[row, col, velocities.RIGHT]
-                        - dt / rho * (
-                                pressure[row, col + 1] - pressure[row, col]  # TODO: check if this needs to be swapped
-                        )
-                )
-            # correct the bottom velocity, if we are not at the bottom boundary
-            if row < velocities.grid_dim - 1:
-                new_velocities[row, col, new_velocities.BOTTOM] = (
-                        velocities[row, col, velocities.BOTTOM]
-                        - dt / rho * (
-                                pressure[row + 1, col] - pressure[row, col]  # TODO: check if this needs to be swapped
-                        )
-                )
+    :param out: a grid with zero boundaries to write the corrected velocities into, instead of allocating a new one. It
+    may be the grid of the velocities itself
+    :param workers: the number of threads correcting the velocities in bands of rows (see parallel.map_bands)
+    :return: the new grid (or out) containing the velocities
+    """
+    if out is None:
+        new_velocities = StaggeredGrid(velocities.grid_dim, velocities.ghost_layers, velocities.batch_size)
+    else:
+        new_velocities = out
+
+    def correct_band(band):
+        start, stop = band
+        # the v-faces at the bottom walls of the band, except for the bottom boundary
+        v_start, v_stop = start + 1, min(stop, velocities.rows - 1) + 1
+        u, v = (Ellipsis, slice(start, stop), slice(1, -1)), (Ellipsis, slice(v_start, v_stop), slice(None))
+        if new_velocities is not velocities:
+            np.copyto(new_velocities.u[u], velocities.u[u])
+            np.copyto(new_velocities.v[v], velocities.v[v])
+        # correct the right velocities, except for the right boundary
+        new_velocities.u[u] -= dt / rho * (pressure[..., start:stop, 1:] - pressure[..., start:stop, :-1])
+        # correct the bottom velocities, except for the bottom boundary
+        new_velocities.v[v] -= dt / rho * (
+                pressure[..., v_start:v_stop, :] - pressure[..., v_start - 1:v_stop - 1, :]
+        )
+
+    map_bands(correct_band, velocities.rows, workers)
 
     return new_velocities
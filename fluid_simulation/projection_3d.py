@@ -0,0 +1,180 @@
+import numpy as np
+import scipy.fft as fft
+import scipy.sparse as sp
+
+from .datastructures.staggered_grid_3d import StaggeredGrid3D, grid_shape_3d
+from .parallel import map_bands
+from .projection import ConjugateGradientSolver, _conjugate_gradient_preconditioner, _factorize_poisson_matrix, \
+    _pin_first_cell
+
+
+def project(solve, velocities, dt, rho=1, out=None, divergence_out=None, workers=1):
+    """
+    Project the velocities of a 3D grid to be mass-conserving, see projection.project.
+    :param velocities: the 3D grid containing the velocities
+    :param dt: the time step
+    :param out: a grid to write the corrected velocities into, which may be the grid of the velocities itself
+    :param divergence_out: an array of shape (layers, rows, cols) to calculate the divergence in
+    :param workers: the number of threads calculating the divergence and the correction in bands of layers
+    :return: the new grid containing the velocities and the pressure of shape (layers, rows, cols)
+    """
+    divergence = calculate_divergence(velocities, divergence_out, workers)
+    pressure = solve(-rho / dt * divergence).reshape(velocities.shape)
+    velocities = correct_velocities(velocities, pressure, dt, rho, out=out, workers=workers)
+    return velocities, pressure
+
+
+def calculate_divergence(velocities, out=None, workers=1):
+    """
+    Calculate the divergence of the velocities of a 3D grid.
+    :param velocities: the 3D grid containing the velocities
+    :param out: an array of shape (layers, rows, cols) to write the divergence into, instead of allocating a new one
+    :param workers: the number of threads calculating the divergence in bands of layers (see parallel.map_bands)
+    :return: the divergence of the velocities, reshaped into a 1D array
+    """
+    if out is None:
+        out = np.empty(velocities.shape)
+
+    def divergence_band(band):
+        start, stop = band
+        divergence = out[start:stop]
+        u, v, w = velocities.faces
+        # dx = 1, so we don't need to divide by dx
+        np.subtract(u[start:stop, :, 1:], u[start:stop, :, :-1], out=divergence)
+        divergence += v[start:stop, 1:, :]
+        divergence -= v[start:stop, :-1, :]
+        divergence += w[start + 1:stop + 1]
+        divergence -= w[start:stop]
+
+    map_bands(divergence_band, velocities.layers, workers)
+    return out.reshape(-1)
+
+
+def correct_velocities(velocities, pressure, dt, rho=1, out=None, workers=1):
+    """
+    Correct the velocities of a 3D grid to be mass-conserving, see projection.correct_velocities.
+    :param velocities: the 3D grid containing the velocities
+    :param pressure: the pressure field, of shape (layers, rows, cols)
+    :param dt: the time step
+    :param rho: the density of the fluid
+    :param out: a grid with zero boundaries to write the corrected velocities into, instead of allocating a new one. It
+    may be the grid of the velocities itself
+    :param workers: the number of threads correcting the velocities in bands of layers (see parallel.map_bands)
+    :return: the new grid (or out) containing the velocities
+    """
+    new_velocities = StaggeredGrid3D(velocities.grid_dim) if out is None else out
+    scale = dt / rho
+
+    def correct_band(band):
+        start, stop = band
+        # the w-faces at the back walls of the band, except for the back boundary
+        w_start, w_stop = start + 1, min(stop, velocities.layers - 1) + 1
+        u = (slice(start, stop), slice(None), slice(1, -1))
+        v = (slice(start, stop), slice(1, -1), slice(None))
+        w = slice(w_start, w_stop)
+        if new_velocities is not velocities:
+            np.copyto(new_velocities.u[u], velocities.u[u])
+            np.copyto(new_velocities.v[v], velocities.v[v])
+            np.copyto(new_velocities.w[w], velocities.w[w])
+        new_velocities.u[u] -= scale * (pressure[start:stop, :, 1:] - pressure[start:stop, :, :-1])
+        new_velocities.v[v] -= scale * (pressure[start:stop, 1:, :] - pressure[start:stop, :-1, :])
+        new_velocities.w[w] -= scale * (pressure[w_start:w_stop] - pressure[w_start - 1:w_stop - 1])
+
+    map_bands(correct_band, velocities.layers, workers)
+    return new_velocities
+
+
+def setup_solver(grid_dim, method='spectral', **options):
+    """
+    Set up the solver for the Poisson equation of a 3D grid with Neumann boundary conditions.
+    :param grid_dim: the dimension of the grid, an int for a cubic grid or the number of cells (layers, rows, cols)
+    :param method: the method to solve the equation with:
+        'spectral' diagonalizes the Poisson matrix with a discrete cosine transform, O(n log n) without any setup,
+        'cg' solves the equation iteratively with a warm started, preconditioned conjugate gradient method, O(n) memory,
+        'direct' factorizes the sparse Poisson matrix, whose fill-in grows superlinearly, only for small grids
+    :param options: the options of the conjugate gradient method (see ConjugateGradientSolver3D)
+    :return: a function that solves the linear system of equations for the Poisson equation
+    """
+    if method == 'cg':
+        return ConjugateGradientSolver3D(grid_dim, **options)
+    if options:
+        raise ValueError(f"The '{method}' solver has no options")
+    if method == 'spectral':
+        return _spectral_poisson_solver(grid_dim)
+    if method == 'direct':
+        return _factorize_poisson_matrix(poisson_matrix(grid_dim))
+    raise ValueError("Invalid solver method. Please choose 'spectral', 'cg' or 'direct'")
+
+
+def poisson_matrix(grid_dim):
+    """
+    Assemble the 7-point matrix of the Poisson equation with Neumann boundary conditions (the negative laplacian) as
+    the Kronecker sum of the 1D matrices of the three axes.
+    :param grid_dim: the dimension of the grid, an int for a cubic grid or the number of cells (layers, rows, cols)
+    :return: the sparse matrix of shape (layers * rows * cols, layers * rows * cols)
+    """
+    layers, rows, cols = grid_shape_3d(grid_dim)
+
+    def axis_matrix(n):
+        # every cell at the boundary has one neighbour less
+        diagonal = np.full(n, 2.)
+        diagonal[[0, -1]] -= 1
+        return sp.diags([-np.ones(n - 1), diagonal, -np.ones(n - 1)], [-1, 0, 1])
+
+    A = sp.kronsum(sp.kronsum(axis_matrix(cols), axis_matrix(rows)), axis_matrix(layers)).tocsr()
+
+    row_sums = np.asarray(A.sum(axis=1)).reshape(-1)
+    assert np.allclose(row_sums, 0), \
+        f"Row {np.flatnonzero(row_sums)[0]} is not zero. Check the boundary conditions of the poisson matrix."
+    return A
+
+
+def _spectral_poisson_solver(grid_dim):
+    """
+    Set up a solver for the Poisson equation of a 3D grid, that uses the discrete cosine transform (DCT-II) along all
+    three axes, see projection._spectral_poisson_solver. The constant mode is dropped, which yields the solution with a
+    mean of zero.
+    :param grid_dim: the dimension of the grid, an int for a cubic grid or the number of cells (layers, rows, cols)
+    :return: a function that solves the linear system of equations for a right hand side
+    """
+    shape = grid_shape_3d(grid_dim)
+    layer_eigenvalues, row_eigenvalues, col_eigenvalues = [2 - 2 * np.cos(np.pi * np.arange(n) / n) for n in shape]
+    eigenvalues = (
+            layer_eigenvalues[:, None, None] + row_eigenvalues[None, :, None] + col_eigenvalues[None, None, :]
+    )
+    eigenvalues[0, 0, 0] = 1  # avoid the division by zero, the constant mode is dropped below
+    inverse_eigenvalues = 1 / eigenvalues
+    inverse_eigenvalues[0, 0, 0] = 0
+
+    def solve(rhs):
+        coefficients = fft.dctn(rhs.reshape(shape), type=2, norm='ortho')
+        coefficients *= inverse_eigenvalues
+        return fft.idctn(coefficients, type=2, norm='ortho', overwrite_x=True).reshape(rhs.shape)
+
+    return solve
+
+
+class ConjugateGradientSolver3D(ConjugateGradientSolver):
+    """
+    Solves the Poisson equation of a 3D grid with the warm started, preconditioned conjugate gradient method, see
+    ConjugateGradientSolver. The matrix and the preconditioner only store a constant number of entries per cell.
+    """
+
+    def __init__(self, grid_dim, rtol=1e-6, maxiter=None, preconditioner='multigrid'):
+        """
+        :param grid_dim: the dimension of the grid, an int for a cubic grid or the number of cells (layers, rows, cols)
+        :param rtol: the tolerance of the residual, relative to the right hand side
+        :param maxiter: the maximum number of iterations per solve, None for no limit
+        :param preconditioner: 'multigrid' (an aggregation multigrid V-cycle of 2x2x2 cells), 'jacobi' or None
+        """
+        super().__init__(grid_dim, rtol, maxiter, preconditioner)
+
+    def _setup(self, grid_dim, preconditioner, solid):
+        # the 3D grid has no obstacles, so solid is always None
+        A = _pin_first_cell(poisson_matrix(grid_dim))
+        layers, rows, cols = np.unravel_index(np.arange(A.shape[0]), grid_shape_3d(grid_dim))
+
+        def remove_means(x, out=None):
+            return np.subtract(x, np.mean(x), out=out)
+
+        return A, _conjugate_gradient_preconditioner(A, preconditioner, rows, cols, layers), remove_means
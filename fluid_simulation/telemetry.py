@@ -0,0 +1,60 @@
+from collections import deque
+
+import numpy as np
+
+
+class RingBufferSink:
+    """
+    Keeps the records of the last steps in memory. Older records are dropped, so the memory stays constant for long
+    simulations.
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        :param capacity: the number of records to keep
+        """
+        self._records = deque(maxlen=capacity)
+
+    def append(self, record):
+        self._records.append(record)
+
+    def records(self):
+        """
+        :return: the kept records, from the oldest to the newest
+        """
+        return list(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def divergence_norms(divergence):
+    """
+    :param divergence: the divergence of all cells
+    :return: the largest absolute divergence and the L2 norm of the divergence, normalized by the number of cells (the
+    root mean square), so grids of different sizes can be compared
+    """
+    return float(np.abs(divergence).max()), float(np.sqrt(np.mean(np.square(divergence))))
+
+
+def summarize(records):
+    """
+    Summarizes the numeric metrics of the records
+    :param records: the records of the steps
+    :return: a dict mapping every metric to its mean and maximum over all records, which have a value for it
+    """
+    summary = {}
+    for key in records[0] if records else []:
+        values = [record[key] for record in records if isinstance(record.get(key), (int, float))]
+        if values and key != 'step':
+            summary[key] = {'mean': float(np.mean(values)), 'max': float(np.max(values))}
+    return summary
@@ -1,9 +1,11 @@
 import unittest
 import numpy as np
 
-from advection import interpolate_u, interpolate_v, extrapolate_horizontally, extrapolate_vertically, extrapolate
-from datastructures.staggered_grid import StaggeredGrid
-from datastructures.errors import StaggeredGridIndexError
+from .advection import interpolate_u, interpolate_v, extrapolate_horizontally, extrapolate_vertically, extrapolate, \
+    advect, trace_particle, interpolate_u_array, interpolate_v_array, extrapolate_array, trace_faces, \
+    advect_fields, trace_cells, sample_cells
+from .datastructures.staggered_grid import StaggeredGrid
+from .datastructures.errors import StaggeredGridIndexError
 
 
 class AdvectionTest(unittest.TestCase):
@@ -150,5 +152,144 @@ class AdvectionTest(unittest.TestCase):
             v_ext_bottom
         ))
 
+    def test_interpolate_arrays(self):
+        s = StaggeredGrid(2)
+        s.u = np.array([[1, 2, 3], [4, 5, 6]])
+        s.v = np.array([[1, 2], [3, 4], [5, 6]])
+
+        x = np.array([0.25, 0.75, 0.25, 0.75, 0.25, 1.75, 1.25, -1.3])
+        y = np.array([0.25, 0.25, 0.75, 0.75, 1.25, 0.25, 1.75, -2.6])
+
+        self.assertTrue(np.array_equal(
+            interpolate_u_array(x, y, s),
+            [interpolate_u(x_i, y_i, s) for x_i, y_i in zip(x, y)]
+        ))
+        self.assertTrue(np.array_equal(
+            interpolate_v_array(x, y, s),
+            [interpolate_v(x_i, y_i, s) for x_i, y_i in zip(x, y)]
+        ))
+
+    def test_extrapolate_array(self):
+        s = StaggeredGrid(3)
+        s.u = np.random.default_rng(0).normal(size=s.u.shape)
+        s.v = np.random.default_rng(1).normal(size=s.v.shape)
+
+        rows, cols = np.meshgrid(np.arange(-4, 8), np.arange(-4, 8), indexing='ij')
+        outside = (rows < 0) | (rows > 2) | (cols < 0) | (cols > 2)
+        rows, cols = rows[outside], cols[outside]
+
+        for side in [s.TOP, s.RIGHT, s.BOTTOM, s.LEFT]:
+            self.assertTrue(np.array_equal(
+                extrapolate_array(rows, cols, side, s),
+                [extrapolate(row, col, side, s) for row, col in zip(rows, cols)]
+            ))
+
+    def test_advect_matches_scalar_tracing(self):
+        rng = np.random.default_rng(42)
+        for grid_dim, dt in [(2, 0.1), (5, 1), (8, 4), ((3, 7), 1.5), ((6, 4), 2)]:
+            s = StaggeredGrid(grid_dim)
+            s.u = rng.normal(size=s.u.shape)
+            s.v = rng.normal(size=s.v.shape)
+
+            expected = StaggeredGrid(grid_dim)
+            for row in range(s.rows):
+                for col in range(s.cols):
+                    if col < s.cols - 1:
+                        x, y = trace_particle(row, col, s.RIGHT, s, dt)
+                        expected.set_right(row, col, interpolate_u(x, y, s))
+                    if row < s.rows - 1:
+                        x, y = trace_particle(row, col, s.BOTTOM, s, dt)
+                        expected.set_bottom(row, col, interpolate_v(x, y, s))
+
+            result = advect(s, dt)
+            self.assertTrue(np.array_equal(expected.u, result.u))
+            self.assertTrue(np.array_equal(expected.v, result.v))
+
+    def test_advect_with_ghost_layers(self):
+        rng = np.random.default_rng(7)
+        s = StaggeredGrid((10, 13))
+        s.u = rng.normal(size=s.u.shape)
+        s.v = rng.normal(size=s.v.shape)
+        padded = StaggeredGrid((10, 13), ghost_layers=2)
+        padded.u = s.u
+        padded.v = s.v
+
+        # no particle leaves the grid by more than half a cell in both directions, so the results are identical
+        expected = advect(s, 0.2)
+        result = advect(padded, 0.2)
+        self.assertEqual(result.ghost_layers, 2)
+        self.assertTrue(np.array_equal(expected.u, result.u))
+        self.assertTrue(np.array_equal(expected.v, result.v))
+
+    def test_backtrace_in_uniform_flow(self):
+        s = StaggeredGrid(6)
+        s.u[:] = 0.5
+        s.v[:] = -0.25
+
+        for backtrace in ['rk2', 'rk3']:
+            for (x, y), (expected_x, expected_y) in zip(trace_faces(s, 1, backtrace), trace_faces(s, 1, 'euler')):
+                self.assertTrue(np.allclose(x, expected_x))
+                self.assertTrue(np.allclose(y, expected_y))
+
+    def test_error_correcting_schemes(self):
+        rng = np.random.default_rng(11)
+        s = StaggeredGrid(8)
+        s.u = rng.normal(size=s.u.shape)
+        s.v = rng.normal(size=s.v.shape)
+
+        semi_lagrangian = advect(s, 0.3)
+        for scheme in ['maccormack', 'bfecc']:
+            result = advect(s, 0.3, scheme, 'rk2')
+            self.assertFalse(np.allclose(result.u, semi_lagrangian.u))
+
+            # the limiter prevents new extrema
+            self.assertLessEqual(np.abs(result.u).max(), np.abs(s.u).max())
+            self.assertLessEqual(np.abs(result.v).max(), np.abs(s.v).max())
+
+            # the boundaries are not advected
+            self.assertTrue(np.all(result.u[:, [0, -1]] == 0))
+            self.assertTrue(np.all(result.v[[0, -1], :] == 0))
+
+        with self.assertRaises(ValueError):
+            advect(s, 0.3, 'unknown')
+
+    def test_sample_cells(self):
+        fields = np.arange(2 * 9, dtype=float).reshape(2, 3, 3)
+
+        # at the cell centers the fields are returned unchanged
+        y, x = np.indices((3, 3))
+        self.assertTrue(np.array_equal(sample_cells(fields, (x, y)), fields))
+
+        # linear between the centers, clamped outside the grid
+        sampled = sample_cells(fields, (np.array([0.5, -1, 5]), np.array([1.25, 0, 2])))
+        self.assertTrue(np.allclose(sampled[0], [4.25, 0, 8]))
+        self.assertTrue(np.allclose(sampled[1], [13.25, 9, 17]))
+
+    def test_advect_fields(self):
+        s = StaggeredGrid(8)
+        s.u[:, 1:8] = 0.5
+        s.v[1:8, :] = -0.25
+
+        # the velocities are advected as by advect
+        dye = np.random.default_rng(12).random((3, 8, 8))
+        advected, scalars = advect_fields(s, dye, 0.4)
+        self.assertTrue(np.array_equal(advected.u, advect(s, 0.4).u))
+        self.assertEqual(scalars.shape, dye.shape)
+        self.assertIsNone(advect_fields(s, None, 0.4)[1])
+
+        # every field is sampled at the origins of the cell centers
+        x, y = trace_cells(s, 0.4)
+        self.assertTrue(np.allclose(x[3:5, 3:5], np.indices((2, 2))[1] + 3 - 0.2))
+        self.assertTrue(np.allclose(y[3:5, 3:5], np.indices((2, 2))[0] + 3 + 0.1))
+        for field, result in zip(dye, scalars):
+            self.assertTrue(np.allclose(result, sample_cells(field, (x, y))))
+
+        # the error correcting schemes do not create new extrema
+        for scheme in ['maccormack', 'bfecc']:
+            _, corrected = advect_fields(s, dye, 0.4, scheme, 'rk3')
+            self.assertGreaterEqual(corrected.min(), dye.min())
+            self.assertLessEqual(corrected.max(), dye.max())
+
+
 if __name__ == '__main__':
     unittest.main()
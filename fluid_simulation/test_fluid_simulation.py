@@ -0,0 +1,183 @@
+import unittest
+import numpy as np
+
+from .fluid_simulation import setup_vortex, setup_vortices, from_velocity_function, step, FluidStepper, \
+    cfl_substeps, setup_ensemble, run_ensemble, run_simulation
+from .datastructures.staggered_grid import StaggeredGrid
+from .projection import setup_solver
+from .spectral_simulation import run_simulation as run_spectral_simulation
+from .tracers import TracerParticles
+
+
+class FluidSimulationTest(unittest.TestCase):
+    def test_setup_vortex(self):
+        spacial_dim, speed, center = 6, 3, np.array([2.5, 3.5])
+
+        # the velocities of every face, calculated one by one
+        expected = StaggeredGrid(spacial_dim)
+        for row in range(spacial_dim):
+            for col in range(spacial_dim):
+                if col < spacial_dim - 1:
+                    r = np.array(expected.coords(row, col, expected.RIGHT)) - center
+                    expected.set_right(row, col, speed / np.linalg.norm(r) ** 2 * -r[1] * -1)
+                if row < spacial_dim - 1:
+                    r = np.array(expected.coords(row, col, expected.BOTTOM)) - center
+                    expected.set_bottom(row, col, speed / np.linalg.norm(r) ** 2 * r[0] * -1)
+
+        vortex = setup_vortex(spacial_dim, speed, center, clockwise=False)
+        self.assertTrue(np.allclose(vortex.u, expected.u))
+        self.assertTrue(np.allclose(vortex.v, expected.v))
+
+    def test_setup_vortices(self):
+        speeds = [1, 2, 3]
+        centers = [(1.5, 1.5), (3, 2.5), (4.5, 0.5)]
+        clockwise = [True, False, True]
+
+        vortices = setup_vortices(6, speeds, centers, clockwise, ghost_layers=1)
+        self.assertEqual(vortices.ghost_layers, 1)
+
+        expected_u = sum(setup_vortex(6, *vortex).u for vortex in zip(speeds, centers, clockwise))
+        expected_v = sum(setup_vortex(6, *vortex).v for vortex in zip(speeds, centers, clockwise))
+        self.assertTrue(np.allclose(vortices.u, expected_u))
+        self.assertTrue(np.allclose(vortices.v, expected_v))
+
+        # the center (3, 2.5) lies on a v-face, whose velocity is zero instead of infinite
+        self.assertTrue(np.all(np.isfinite(vortices.u)) and np.all(np.isfinite(vortices.v)))
+        self.assertEqual(setup_vortex(6, 2, (3, 2.5)).v[3, 3], 0)
+
+    def test_from_velocity_function(self):
+        velocities = from_velocity_function(4, lambda x, y: (x + 10 * y, -y))
+
+        self.assertTrue(np.array_equal(velocities.u[2], [0, 20.5, 21.5, 22.5, 0]))
+        self.assertTrue(np.array_equal(velocities.v[:, 1], [0, -0.5, -1.5, -2.5, 0]))
+
+    def test_fluid_stepper(self):
+        solid = np.zeros((10, 10), dtype=bool)
+        solid[4:6, 2:5] = True
+        for scheme, ghost_layers, obstacles in [
+            ('semi_lagrangian', 0, None), ('bfecc', 0, None), ('maccormack', 2, None), ('semi_lagrangian', 0, solid)
+        ]:
+            solve = setup_solver(10, solid=obstacles)
+            velocities = setup_vortices(10, [3, 2], [(3.5, 4.5), (6.5, 5.5)], [True, False], ghost_layers)
+            scalars = np.random.default_rng(13).random((10, 10))
+            stepper = FluidStepper(velocities, solve, 0.1, 1.5, scheme, 'rk2', scalars, obstacles)
+
+            expected = setup_vortices(10, [3, 2], [(3.5, 4.5), (6.5, 5.5)], [True, False], ghost_layers)
+            expected_scalars = scalars
+            buffers = set()
+            pressures = set()
+            for _ in range(4):
+                expected, expected_pressure, expected_scalars = step(
+                    expected, solve, 0.1, 1.5, scheme, 'rk2', expected_scalars, obstacles
+                )
+                result, pressure, result_scalars = stepper.step()
+                buffers.add(id(result))
+                pressures.add(id(pressure))
+
+                self.assertTrue(np.array_equal(result.u, expected.u))
+                self.assertTrue(np.array_equal(result.v, expected.v))
+                self.assertTrue(np.array_equal(pressure, expected_pressure))
+                self.assertTrue(np.array_equal(result_scalars, expected_scalars))
+
+            # the velocities alternate between two grids, the pressure is solved in the same array
+            self.assertEqual(len(buffers), 2)
+            self.assertEqual(len(pressures), 1)
+
+        # the faces of the obstacle stay closed
+        self.assertTrue(np.all(result.u[4:6, 2:6] == 0))
+        self.assertTrue(np.all(result.v[4:7, 2:5] == 0))
+
+    def test_rectangular_channel(self):
+        solid = np.zeros((6, 16), dtype=bool)
+        solid[2:4, 5] = True
+        velocities = setup_vortices((6, 16), [2, 2], [(4.5, 2.5), (10.5, 3.5)], [True, False])
+        stepper = FluidStepper(velocities, setup_solver((6, 16), solid=solid), 0.1, solid=solid)
+
+        for _ in range(3):
+            result, pressure, _ = stepper.step()
+
+        self.assertEqual(result.to_regular_grid().shape, (6, 16, 2))
+        self.assertEqual(pressure.shape, (6, 16))
+        self.assertTrue(np.all(np.isfinite(result.u)) and np.all(np.isfinite(result.v)))
+
+    def test_cfl_substeps(self):
+        velocities = StaggeredGrid(4)
+        self.assertEqual(cfl_substeps(velocities, 0.5, 1), 1)
+
+        velocities.u[1, 2] = -3
+        velocities.v[2, 1] = 2
+        self.assertEqual(cfl_substeps(velocities, 0.5, 1), 2)
+        self.assertEqual(cfl_substeps(velocities, 0.5, 0.5), 3)
+
+        with self.assertRaises(ValueError):
+            cfl_substeps(velocities, 0.5, 0)
+
+    def test_advance(self):
+        solve = setup_solver(10)
+        velocities = setup_vortices(10, [6], [(4.5, 4.5)], [True])
+        stepper = FluidStepper(velocities, solve, 0.4)
+        substeps = cfl_substeps(velocities, 0.4, 0.5)
+        self.assertGreater(substeps, 1)
+
+        expected = setup_vortices(10, [6], [(4.5, 4.5)], [True])
+        for _ in range(substeps):
+            expected, _, _ = step(expected, solve, 0.4 / substeps)
+
+        result, _, _, result_substeps = stepper.advance(0.4, 0.5)
+        self.assertEqual(result_substeps, substeps)
+        self.assertTrue(np.allclose(result.u, expected.u))
+        self.assertTrue(np.allclose(result.v, expected.v))
+
+    def test_ensemble(self):
+        speeds = [[3, 2], [4], [1, 1, 1]]
+        centers = [[(3.5, 4.5), (6.5, 5.5)], [(5, 5)], [(2.5, 2.5), (5.5, 6.5), (7.5, 3.5)]]
+        clockwise = [[True, False], [True], [False, True, True]]
+        scalars = np.random.default_rng(42).random((2, 3, 10, 12))
+
+        for solver, ghost_layers in [('direct', 0), ('spectral', 1)]:
+            solve = setup_solver((10, 12), solver)
+            ensemble = setup_ensemble((10, 12), speeds, centers, clockwise, ghost_layers)
+            self.assertEqual(ensemble.u.shape, (3, 10, 13))
+            stepper = FluidStepper(ensemble, solve, 0.1, 1.5, 'maccormack', 'rk2', scalars)
+            for _ in range(3):
+                result, pressure, result_scalars = stepper.step()
+
+            # every member of the ensemble is stepped as on its own
+            for member in range(3):
+                single = FluidStepper(
+                    setup_vortices((10, 12), speeds[member], centers[member], clockwise[member], ghost_layers),
+                    solve, 0.1, 1.5, 'maccormack', 'rk2', scalars[:, member]
+                )
+                for _ in range(3):
+                    expected, expected_pressure, expected_scalars = single.step()
+                self.assertTrue(np.allclose(result.u[member], expected.u))
+                self.assertTrue(np.allclose(result.v[member], expected.v))
+                self.assertTrue(np.allclose(pressure[member], expected_pressure))
+                self.assertTrue(np.allclose(result_scalars[:, member], expected_scalars))
+
+        with self.assertRaises(ValueError):
+            run_ensemble(10, speeds, centers, clockwise, 1, 0.1, solver='cg')
+
+    def test_run_results(self):
+        # every run returns the same fields, the ones not simulated are None
+        scalars = np.ones((2, 6, 8))
+        tracers = TracerParticles(5, (6, 8), seed=43)
+        results = run_simulation((6, 8), [3], [(4, 3)], [True], 2, 0.05, scalars=scalars, tracers=tracers)
+        self.assertEqual([len(frames) for frames in results], [3, 3, 3, 3])
+        self.assertEqual(results.scalars[-1].shape, (2, 6, 8))
+        self.assertEqual(results.tracer_positions[-1].shape, (5, 2))
+
+        for results in [
+            run_simulation((6, 8), [3], [(4, 3)], [True], 2, 0.05),
+            run_spectral_simulation((6, 8), [3], [(4, 3)], [True], 2, 0.05),
+            run_ensemble((6, 8), [[3], [2]], [[(4, 3)], [(3, 4)]], [[True], [False]], 2, 0.05)
+        ]:
+            velocities, pressures, scalars, tracer_positions = results
+            self.assertEqual(len(velocities), 3)
+            self.assertEqual(len(pressures), 3)
+            self.assertIsNone(scalars)
+            self.assertIsNone(tracer_positions)
+
+
+if __name__ == '__main__':
+    unittest.main()
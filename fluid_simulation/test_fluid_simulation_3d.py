@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+
+from . import advection_3d
+from .advection_3d import advect_fields, trilinear
+from .fluid_simulation_3d import setup_smoke, step
+from .projection_3d import setup_solver, calculate_divergence
+from .datastructures.staggered_grid_3d import StaggeredGrid3D, from_regular_grid_3d
+from .tracers import bilinear
+
+
+class FluidSimulation3DTest(unittest.TestCase):
+    def test_regular_grid(self):
+        grid = np.random.default_rng(0).normal(size=(3, 4, 5, 3))
+        velocities = from_regular_grid_3d(grid)
+        self.assertEqual([face.shape for face in velocities.faces], [(3, 4, 6), (3, 5, 5), (4, 4, 5)])
+        self.assertEqual(velocities.to_regular_grid().shape, (3, 4, 5, 3))
+        self.assertAlmostEqual(velocities.w[2, 1, 3], (grid[1, 1, 3, 2] + grid[2, 1, 3, 2]) / 2)
+
+    def test_trilinear(self):
+        values = np.random.default_rng(1).normal(size=(4, 5, 6))
+        i, j = np.random.default_rng(2).uniform(-1, 7, size=(2, 100))
+
+        # inside a layer, the interpolation is bilinear
+        self.assertTrue(np.allclose(trilinear(values, i, j, np.full(100, 2.)), bilinear(values[2], i, j)))
+        # between two layers, it is linear
+        self.assertTrue(np.allclose(
+            trilinear(values, i, j, np.full(100, 1.25)),
+            0.75 * bilinear(values[1], i, j) + 0.25 * bilinear(values[2], i, j)
+        ))
+        # a stack of arrays is interpolated at the same indices
+        stacked = trilinear(np.stack([values, 2 * values]), i, j, np.full(100, 1.25))
+        self.assertTrue(np.allclose(stacked[1], 2 * stacked[0]))
+
+    def test_advect_uniform_flow(self):
+        velocities = StaggeredGrid3D((6, 7, 8))
+        velocities.u[:, :, 1:-1] = 1
+        smoke = np.zeros((6, 7, 8))
+        smoke[2:4, 2:4, 2:4] = 1
+
+        for backtrace in ['euler', 'rk2', 'rk3']:
+            advected, advected_smoke = advect_fields(velocities, smoke, 1., backtrace)
+            # the smoke moves by one cell along x
+            self.assertTrue(np.allclose(advected_smoke, np.roll(smoke, 1, axis=2)), backtrace)
+            # except for the faces next to the left wall, which trace back into the wall
+            self.assertTrue(np.allclose(advected.u[:, :, 2:-1], 1))
+
+        with self.assertRaises(ValueError):
+            advect_fields(velocities, None, 1., 'rk4')
+
+    def test_bands_and_chunks_are_bitwise_identical(self):
+        velocities, smoke = setup_smoke((9, 8, 7), (3, 4, 5), 2)
+        velocities.u[:, :, 1:-1] = np.random.default_rng(3).normal(size=(9, 8, 6))
+        velocities.w[1:-1] = np.random.default_rng(4).normal(size=(8, 8, 7))
+        scalars = np.stack([smoke, 1 - smoke])
+
+        expected, expected_scalars = advect_fields(velocities, scalars, 0.5, 'rk2')
+        chunk_size = advection_3d.CHUNK_SIZE
+        try:
+            advection_3d.CHUNK_SIZE = 100
+            for workers in [1, 2, 4]:
+                advected, advected_scalars = advect_fields(velocities, scalars, 0.5, 'rk2', workers=workers)
+                self.assertTrue(np.array_equal(advected_scalars, expected_scalars))
+                for face, expected_face in zip(advected.faces, expected.faces):
+                    self.assertTrue(np.array_equal(face, expected_face))
+        finally:
+            advection_3d.CHUNK_SIZE = chunk_size
+
+    def test_rising_smoke(self):
+        velocities, smoke = setup_smoke(16, (7.5, 10, 7.5), 3)
+        solve = setup_solver(16)
+        rows = np.arange(16)[None, :, None]
+
+        def height(density):
+            return np.sum(density * rows) / np.sum(density)
+
+        start = height(smoke)
+        for _ in range(10):
+            velocities, pressure, smoke = step(velocities, solve, 0.2, rho=1.5, scalars=smoke, buoyancy=2)
+
+        # the smoke rises towards the first row, the velocities stay free of divergence
+        self.assertLess(height(smoke), start - 0.5)
+        self.assertLess(np.abs(calculate_divergence(velocities)).max(), 1e-10)
+        self.assertEqual(pressure.shape, (16, 16, 16))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+
+from .obstacles import face_masks, apply_obstacles, fluid_components, mask_key
+from .datastructures.staggered_grid import StaggeredGrid
+
+
+class ObstaclesTest(unittest.TestCase):
+    def test_face_masks(self):
+        solid = np.zeros((3, 3), dtype=bool)
+        solid[1, 1] = True
+
+        u_open, v_open = face_masks(solid)
+
+        self.assertTrue(np.array_equal(u_open, [[0, 1, 1, 0], [0, 0, 0, 0], [0, 1, 1, 0]]))
+        self.assertTrue(np.array_equal(v_open, [[0, 0, 0], [1, 0, 1], [1, 0, 1], [0, 0, 0]]))
+
+        s = StaggeredGrid(3)
+        s.u[:] = 1
+        s.v[:] = 2
+        apply_obstacles(s, (u_open, v_open))
+        self.assertTrue(np.array_equal(s.u, u_open * 1.))
+        self.assertTrue(np.array_equal(s.v, v_open * 2.))
+
+    def test_fluid_components(self):
+        # a wall in the middle column separates the fluid into two components
+        solid = np.zeros((4, 5), dtype=bool)
+        solid[:, 2] = True
+
+        labels = fluid_components(solid).reshape(4, 5)
+
+        self.assertTrue(np.all(labels[:, 2] == -1))
+        self.assertTrue(np.all(labels[:, :2] == 0))
+        self.assertTrue(np.all(labels[:, 3:] == 1))
+
+    def test_mask_key(self):
+        solid = np.zeros((4, 4), dtype=bool)
+        self.assertIsNone(mask_key(None))
+        self.assertEqual(mask_key(solid), mask_key(solid.copy()))
+
+        solid[2, 3] = True
+        self.assertNotEqual(mask_key(solid), mask_key(np.zeros((4, 4), dtype=bool)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+import numpy as np
+
+from .parallel import row_bands, map_bands
+from .advection import advect_fields
+from .projection import calculate_divergence, correct_velocities
+from .datastructures.staggered_grid import StaggeredGrid
+
+
+class ParallelTest(unittest.TestCase):
+    def test_row_bands(self):
+        self.assertEqual(row_bands(10, 1), [(0, 10)])
+        self.assertEqual(row_bands(10, 3), [(0, 3), (3, 6), (6, 10)])
+        # there are never more bands than rows
+        self.assertEqual(row_bands(2, 8), [(0, 1), (1, 2)])
+
+        # the results are returned in the order of the bands, with one argument per band
+        self.assertEqual(map_bands(lambda band, offset: band[0] + offset, 10, 4, [1, 2, 3, 4]), [1, 4, 8, 11])
+
+    def test_bands_are_bitwise_identical(self):
+        rng = np.random.default_rng(41)
+        s = StaggeredGrid((13, 9), ghost_layers=1)
+        s.u[:, 1:-1] = rng.normal(size=(13, 8))
+        s.v[1:-1, :] = rng.normal(size=(12, 9))
+        dye = rng.random((2, 13, 9))
+        pressure = rng.normal(size=(13, 9))
+
+        for scheme in ['semi_lagrangian', 'maccormack', 'bfecc']:
+            serial, serial_dye = advect_fields(s, dye, 0.7, scheme, 'rk2')
+            for workers in [2, 5, 20]:
+                banded, banded_dye = advect_fields(s, dye, 0.7, scheme, 'rk2', workers=workers)
+                self.assertTrue(np.array_equal(banded.u, serial.u))
+                self.assertTrue(np.array_equal(banded.v, serial.v))
+                self.assertTrue(np.array_equal(banded_dye, serial_dye))
+
+        divergence = calculate_divergence(s)
+        corrected = correct_velocities(s, pressure, 0.3, 1.5)
+        for workers in [2, 5, 20]:
+            self.assertTrue(np.array_equal(calculate_divergence(s, workers=workers), divergence))
+            banded = correct_velocities(s, pressure, 0.3, 1.5, workers=workers)
+            self.assertTrue(np.array_equal(banded.u, corrected.u))
+            self.assertTrue(np.array_equal(banded.v, corrected.v))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import unittest
+import numpy as np
+
+from .projection import calculate_divergence, correct_velocities, poisson_matrix, setup_solver, project
+from .datastructures.staggered_grid import StaggeredGrid
+from .obstacles import face_masks, apply_obstacles
+
+
+class ProjectionTest(unittest.TestCase):
+    def test_calculate_divergence(self):
+        s = StaggeredGrid(2)
+        s.u = np.array([[1, 2, 3], [4, 5, 6]])
+        s.v = np.array([[1, 2], [3, 4], [5, 6]])
+
+        divergence = calculate_divergence(s)
+
+        self.assertEqual(divergence.shape, (4,))
+        for row in range(2):
+            for col in range(2):
+                up, right, down, left = s[row, col]
+                self.assertEqual(divergence[row * 2 + col], right - left + down - up)
+
+    def test_correct_velocities(self):
+        s = StaggeredGrid(2)
+        s.u = np.array([[1., 2, 3], [4, 5, 6]])
+        s.v = np.array([[1., 2], [3, 4], [5, 6]])
+        pressure = np.array([[1., 2], [4, 8]])
+
+        corrected = correct_velocities(s, pressure, 0.5, 2)
+
+        # the boundaries are set to zero, the inner faces are corrected by the pressure gradient
+        self.assertTrue(np.array_equal(corrected.u, [[0, 1.75, 0], [0, 4, 0]]))
+        self.assertTrue(np.array_equal(corrected.v, [[0, 0], [2.25, 2.5], [0, 0]]))
+
+        # the correction can be written into the grid itself
+        s.u[:, [0, -1]] = 0
+        s.v[[0, -1], :] = 0
+        self.assertIs(correct_velocities(s, pressure, 0.5, 2, out=s), s)
+        self.assertTrue(np.array_equal(s.u, corrected.u))
+        self.assertTrue(np.array_equal(s.v, corrected.v))
+
+    def test_poisson_matrix(self):
+        A = poisson_matrix(3).toarray()
+
+        self.assertTrue(np.array_equal(A, A.T))
+        self.assertTrue(np.array_equal(np.diag(A), [2, 3, 2, 3, 4, 3, 2, 3, 2]))
+        self.assertTrue(np.array_equal(A[4], [0, -1, 0, -1, 4, -1, 0, -1, 0]))
+        self.assertTrue(np.array_equal(A[2], [0, -1, 2, 0, 0, -1, 0, 0, 0]))
+
+    def test_setup_solver(self):
+        A = poisson_matrix(6)
+        solve = setup_solver(6)
+        self.assertIs(solve, setup_solver(6))
+
+        rhs = np.random.default_rng(3).normal(size=36)
+        rhs -= rhs.mean()
+        pressure = solve(rhs)
+
+        self.assertAlmostEqual(pressure.mean(), 0)
+        self.assertTrue(np.allclose(A @ pressure, rhs))
+
+        # multiple right hand sides are solved as columns
+        pressures = solve(np.stack([rhs, 2 * rhs], axis=1))
+        self.assertTrue(np.allclose(pressures[:, 0], pressure))
+        self.assertTrue(np.allclose(pressures[:, 1], 2 * pressure))
+
+    def test_spectral_solver(self):
+        direct = setup_solver(7)
+        spectral = setup_solver(7, 'spectral')
+
+        rhs = np.random.default_rng(4).normal(size=(49, 2))
+        rhs -= rhs.mean(axis=0)
+
+        self.assertTrue(np.allclose(spectral(rhs[:, 0]), direct(rhs[:, 0])))
+        self.assertTrue(np.allclose(spectral(rhs), direct(rhs)))
+
+        # the constant mode is dropped
+        self.assertTrue(np.allclose(spectral(np.ones(49)), 0))
+
+        with self.assertRaises(ValueError):
+            setup_solver(7, 'unknown')
+
+    def test_conjugate_gradient_solver(self):
+        direct = setup_solver(12)
+        rhs = np.random.default_rng(5).normal(size=144)
+        rhs -= rhs.mean()
+
+        for preconditioner in ['multigrid', 'jacobi', None]:
+            solve = setup_solver(12, 'cg', rtol=1e-10, preconditioner=preconditioner)
+            self.assertTrue(np.allclose(solve(rhs), direct(rhs)))
+            self.assertEqual(len(solve.iterations), 1)
+            self.assertLess(solve.last_residual, 1e-10)
+
+            # warm started from the previous pressure, the same system is already solved
+            solve(rhs)
+            self.assertEqual(solve.last_iterations, 0)
+
+        solve = setup_solver(12, 'cg', maxiter=1, preconditioner=None)
+        solve(rhs)
+        self.assertEqual(solve.last_iterations, 1)
+        self.assertGreater(solve.last_residual, 1e-10)
+
+        with self.assertRaises(ValueError):
+            setup_solver(12, 'direct', rtol=1e-3)
+
+    def test_rectangular_grid(self):
+        A = poisson_matrix((2, 3)).toarray()
+        self.assertTrue(np.array_equal(A, A.T))
+        self.assertTrue(np.array_equal(np.diag(A), [2, 3, 2, 2, 3, 2]))
+        self.assertTrue(np.array_equal(A[1], [-1, 3, -1, 0, -1, 0]))
+
+        rng = np.random.default_rng(18)
+        s = StaggeredGrid((6, 11))
+        s.u[:, 1:-1] = rng.normal(size=(6, 10))
+        s.v[1:-1, :] = rng.normal(size=(5, 11))
+
+        projected, pressure = project(setup_solver((6, 11)), s, 0.1)
+        self.assertEqual(pressure.shape, (6, 11))
+        self.assertTrue(np.allclose(calculate_divergence(projected), 0))
+
+        for method, options in [('spectral', {}), ('cg', {'rtol': 1e-10})]:
+            _, other_pressure = project(setup_solver((6, 11), method, **options), s, 0.1)
+            self.assertTrue(np.allclose(other_pressure, pressure))
+
+    def test_density(self):
+        # the pressure scales with the density and the correction divides it out again, so the projected velocities
+        # are divergence free for every density
+        rng = np.random.default_rng(20)
+        solid = np.zeros((6, 11), dtype=bool)
+        solid[2:4, 5] = True
+        for method, options, obstacles, batch_size in [
+            ('direct', {}, None, None), ('direct', {}, solid, None), ('spectral', {}, None, None),
+            ('cg', {'rtol': 1e-10}, None, None), ('spectral', {}, None, 2)
+        ]:
+            s = StaggeredGrid((6, 11), batch_size=batch_size)
+            s.u[..., 1:-1] = rng.normal(size=s.u[..., 1:-1].shape)
+            s.v[..., 1:-1, :] = rng.normal(size=s.v[..., 1:-1, :].shape)
+            masks = None
+            if obstacles is not None:
+                masks = face_masks(obstacles)
+                apply_obstacles(s, masks)
+            solve = setup_solver((6, 11), method, obstacles, **options)
+            _, unit_pressure = project(solve, s, 0.1)
+
+            for rho in [0.5, 1.5, 4]:
+                projected, pressure = project(solve, s, 0.1, rho)
+                if masks is not None:
+                    apply_obstacles(projected, masks)
+                self.assertLess(np.abs(calculate_divergence(projected)).max(), 1e-8)
+                self.assertTrue(np.allclose(pressure, rho * unit_pressure))
+
+    def test_pressure_out(self):
+        rng = np.random.default_rng(19)
+        solid = np.zeros((6, 11), dtype=bool)
+        solid[2:4, 5] = True
+        for method, options, obstacles, batch_size in [
+            ('direct', {}, None, None), ('direct', {}, solid, None), ('spectral', {}, None, None),
+            ('cg', {'rtol': 1e-10}, None, None), ('direct', {}, None, 3), ('spectral', {}, None, 3)
+        ]:
+            s = StaggeredGrid((6, 11), batch_size=batch_size)
+            s.u[..., 1:-1] = rng.normal(size=s.u[..., 1:-1].shape)
+            s.v[..., 1:-1, :] = rng.normal(size=s.v[..., 1:-1, :].shape)
+            if obstacles is not None:
+                apply_obstacles(s, face_masks(obstacles))
+            solve = setup_solver((6, 11), method, obstacles, **options)
+            projected, pressure = project(solve, s, 0.1, 1.5)
+
+            # the pressure is solved in the given array and equals the one of a new array
+            pressure_out = np.empty(pressure.shape)
+            out = StaggeredGrid((6, 11), batch_size=batch_size)
+            projected_out, result = project(solve, s, 0.1, 1.5, out=out, pressure_out=pressure_out)
+            self.assertIs(result, pressure_out)
+            self.assertTrue(np.allclose(pressure_out, pressure))
+            self.assertTrue(np.allclose(projected_out.u, projected.u))
+            self.assertTrue(np.allclose(projected_out.v, projected.v))
+
+    def test_masked_poisson_matrix(self):
+        # without solid cells, the masked matrix is the regular one
+        self.assertEqual((poisson_matrix(4, np.zeros((4, 4), dtype=bool)) != poisson_matrix(4)).nnz, 0)
+
+        solid = np.zeros((3, 3), dtype=bool)
+        solid[1, 1] = True
+        A = poisson_matrix(3, solid).toarray()
+
+        self.assertTrue(np.array_equal(A, A.T))
+        self.assertTrue(np.array_equal(np.diag(A), [2, 2, 2, 2, 1, 2, 2, 2, 2]))
+        self.assertTrue(np.array_equal(A[1], [-1, 2, -1, 0, 0, 0, 0, 0, 0]))
+        self.assertTrue(np.array_equal(A[4], [0, 0, 0, 0, 1, 0, 0, 0, 0]))
+
+    def test_obstacles(self):
+        # a wall separates the fluid into two components, with a block inside the right one
+        solid = np.zeros((10, 10), dtype=bool)
+        solid[:, 4] = True
+        solid[3:6, 6:8] = True
+        masks = face_masks(solid)
+
+        rng = np.random.default_rng(14)
+        s = StaggeredGrid(10)
+        s.u[:, 1:-1] = rng.normal(size=(10, 9))
+        s.v[1:-1, :] = rng.normal(size=(9, 10))
+        apply_obstacles(s, masks)
+
+        direct = setup_solver(10, 'direct', solid)
+        self.assertIs(direct, setup_solver(10, 'direct', solid.copy()))
+        cg = setup_solver(10, 'cg', solid, rtol=1e-10)
+
+        projected, pressure = project(direct, s, 0.1)
+        apply_obstacles(projected, masks)
+        self.assertTrue(np.allclose(calculate_divergence(projected), 0))
+
+        # the pressure is zero in the solid cells and has a mean of zero in both components
+        self.assertTrue(np.all(pressure[solid] == 0))
+        right = ~solid
+        right[:, :4] = False
+        self.assertAlmostEqual(pressure[:, :4].mean(), 0)
+        self.assertAlmostEqual(pressure[right].mean(), 0)
+
+        _, cg_pressure = project(cg, s, 0.1)
+        self.assertTrue(np.allclose(cg_pressure, pressure))
+
+        with self.assertRaises(ValueError):
+            setup_solver(10, 'spectral', solid)
+
+
+if __name__ == '__main__':
+    unittest.main()
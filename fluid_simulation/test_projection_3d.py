@@ -0,0 +1,91 @@
+import unittest
+import numpy as np
+
+from .projection_3d import calculate_divergence, correct_velocities, poisson_matrix, setup_solver, project
+from .datastructures.staggered_grid_3d import StaggeredGrid3D
+
+
+def random_velocities(grid_dim, seed):
+    """
+    :return: a 3D grid with random velocities at the inner faces
+    """
+    rng = np.random.default_rng(seed)
+    velocities = StaggeredGrid3D(grid_dim)
+    velocities.u[:, :, 1:-1] = rng.normal(size=velocities.u[:, :, 1:-1].shape)
+    velocities.v[:, 1:-1, :] = rng.normal(size=velocities.v[:, 1:-1, :].shape)
+    velocities.w[1:-1] = rng.normal(size=velocities.w[1:-1].shape)
+    return velocities
+
+
+class Projection3DTest(unittest.TestCase):
+    def test_calculate_divergence(self):
+        velocities = random_velocities((3, 4, 5), 0)
+        divergence = calculate_divergence(velocities).reshape(3, 4, 5)
+
+        layer, row, col = 1, 2, 3
+        self.assertAlmostEqual(
+            divergence[layer, row, col],
+            velocities.u[layer, row, col + 1] - velocities.u[layer, row, col]
+            + velocities.v[layer, row + 1, col] - velocities.v[layer, row, col]
+            + velocities.w[layer + 1, row, col] - velocities.w[layer, row, col]
+        )
+        # the walls are closed, so the total divergence is zero
+        self.assertAlmostEqual(divergence.sum(), 0)
+
+    def test_solvers(self):
+        grid_dim = (5, 6, 7)
+        A = poisson_matrix(grid_dim)
+        self.assertEqual(A.shape, (210, 210))
+        self.assertEqual(A[100, 100], 6)
+
+        rhs = np.random.default_rng(1).normal(size=210)
+        rhs -= rhs.mean()
+        for method in ['spectral', 'direct', 'cg']:
+            pressure = setup_solver(grid_dim, method)(rhs)
+            self.assertTrue(np.allclose(A @ pressure, rhs, atol=1e-5), method)
+            self.assertAlmostEqual(pressure.mean(), 0)
+
+        # every preconditioner converges, the solver records its iterations like the one of 2D grids
+        for preconditioner in ['jacobi', None]:
+            solve = setup_solver(grid_dim, 'cg', preconditioner=preconditioner)
+            self.assertTrue(np.allclose(A @ solve(rhs), rhs, atol=1e-5), preconditioner)
+            self.assertEqual(solve.iterations, [solve.last_iterations])
+
+        with self.assertRaises(ValueError):
+            setup_solver(grid_dim, 'spectral', rtol=1e-3)
+        with self.assertRaises(ValueError):
+            setup_solver(grid_dim, 'cg', preconditioner='ilu')
+
+    def test_project(self):
+        for method in ['spectral', 'cg']:
+            velocities = random_velocities((6, 8, 10), 2)
+            solve = setup_solver((6, 8, 10), method)
+            projected, pressure = project(solve, velocities, 0.1, 1.5)
+
+            self.assertEqual(pressure.shape, (6, 8, 10))
+            self.assertLess(np.abs(calculate_divergence(projected)).max(), 1e-5)
+            # the walls stay closed
+            self.assertTrue(np.all(projected.u[:, :, [0, -1]] == 0))
+            self.assertTrue(np.all(projected.w[[0, -1]] == 0))
+        self.assertGreater(solve.last_iterations, 0)
+
+    def test_bands_are_bitwise_identical(self):
+        velocities = random_velocities((7, 5, 6), 3)
+        pressure = np.random.default_rng(4).normal(size=(7, 5, 6))
+
+        divergence = calculate_divergence(velocities)
+        corrected = correct_velocities(velocities, pressure, 0.1, 1.5)
+        for workers in [2, 3, 7]:
+            self.assertTrue(np.array_equal(calculate_divergence(velocities, workers=workers), divergence))
+            banded = correct_velocities(velocities, pressure, 0.1, 1.5, workers=workers)
+            for face, expected in zip(banded.faces, corrected.faces):
+                self.assertTrue(np.array_equal(face, expected))
+
+        # the correction can be written into the grid itself
+        self.assertIs(correct_velocities(velocities, pressure, 0.1, 1.5, out=velocities, workers=3), velocities)
+        for face, expected in zip(velocities.faces, corrected.faces):
+            self.assertTrue(np.array_equal(face, expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import numpy as np
+
+from profiling import Profiler
+from .spectral_simulation import setup_vorticity, SpectralStepper
+
+
+def taylor_green(rows, cols, amplitude=1.):
+    """
+    :return: the vorticity and the velocities of a Taylor-Green vortex, with the streamfunction
+    psi = amplitude / k sin(k_x x) sin(k_y y)
+    """
+    k_x, k_y = 2 * np.pi / cols, 2 * np.pi / rows
+    y, x = np.indices((rows, cols), dtype=float)
+    u = amplitude * k_y / k_x * np.sin(k_x * x) * np.cos(k_y * y)
+    v = -amplitude * np.cos(k_x * x) * np.sin(k_y * y)
+    vorticity = amplitude / k_x * (k_x ** 2 + k_y ** 2) * np.sin(k_x * x) * np.sin(k_y * y)
+    return vorticity, u, v
+
+
+class SpectralSimulationTest(unittest.TestCase):
+    def test_setup_vorticity(self):
+        vorticity = setup_vorticity(64, [3, 2], [(20, 30), (50, 10)], [True, False], core_radius=1.5)
+        stepper = SpectralStepper(vorticity, 0.1)
+        velocities = stepper.velocities()
+
+        # outside of the core, the velocity decreases with the inverse of the distance to the center
+        self.assertAlmostEqual(velocities[30, 26, 1], 3 / 6, delta=0.03)
+        self.assertAlmostEqual(velocities[24, 20, 0], 3 / 6, delta=0.03)
+        self.assertAlmostEqual(velocities[10, 44, 1], 2 / 6, delta=0.03)
+
+        # the vortices wrap around the periodic boundaries
+        wrapped = setup_vorticity(64, [3], [(63.5, 0)], [True])
+        self.assertAlmostEqual(wrapped[0, 0], wrapped[0, 63])
+
+    def test_taylor_green(self):
+        vorticity, u, v = taylor_green(32, 48)
+        stepper = SpectralStepper(vorticity, 0.5, rho=2)
+
+        velocities = stepper.velocities()
+        self.assertTrue(np.allclose(velocities[..., 0], u))
+        self.assertTrue(np.allclose(velocities[..., 1], v))
+        self.assertTrue(np.allclose(stepper.vorticity(), vorticity))
+
+        # the pressure of the Taylor-Green vortex
+        k_x, k_y = 2 * np.pi / 48, 2 * np.pi / 32
+        y, x = np.indices((32, 48), dtype=float)
+        pressure = 2 / 4 * ((k_y / k_x) ** 2 * np.cos(2 * k_x * x) + np.cos(2 * k_y * y))
+        self.assertTrue(np.allclose(stepper.pressure(), pressure))
+
+        # the inviscid vortex is a steady state
+        for _ in range(10):
+            stepper.step()
+        self.assertTrue(np.allclose(stepper.vorticity(), vorticity))
+
+    def test_viscous_decay(self):
+        vorticity, _, _ = taylor_green(32, 32)
+        stepper = SpectralStepper(vorticity, 0.5, viscosity=2)
+        for _ in range(20):
+            stepper.step()
+
+        k_squared = 2 * (2 * np.pi / 32) ** 2
+        self.assertTrue(np.allclose(stepper.vorticity(), vorticity * np.exp(-2 * k_squared * 10), atol=1e-6))
+
+    def test_conservation(self):
+        vorticity = setup_vorticity(48, [3, 3, -2], [(16, 16), (30, 20), (24, 34)], [True, True, True], 2.)
+        stepper = SpectralStepper(vorticity, 0.1)
+
+        def energy_and_enstrophy():
+            return np.sum(stepper.velocities() ** 2), np.sum(stepper.vorticity() ** 2)
+
+        energy, enstrophy = energy_and_enstrophy()
+        for _ in range(40):
+            velocities, _ = stepper.step()
+
+        # the inviscid flow keeps its energy and enstrophy, up to the small losses of the dealiasing
+        new_energy, new_enstrophy = energy_and_enstrophy()
+        self.assertAlmostEqual(new_energy / energy, 1, delta=1e-3)
+        self.assertAlmostEqual(new_enstrophy / enstrophy, 1, delta=2e-2)
+
+        # the velocities are free of divergence
+        k_x = 2 * np.pi * np.fft.fftfreq(48)
+        divergence = np.fft.ifft(1j * k_x * np.fft.fft(velocities[..., 0], axis=1), axis=1).real
+        divergence += np.fft.ifft(1j * k_x[:, None] * np.fft.fft(velocities[..., 1], axis=0), axis=0).real
+        self.assertLess(np.abs(divergence).max(), 1e-10)
+
+        with self.assertRaises(ValueError):
+            stepper.advance(1, 0)
+
+    def test_advance(self):
+        vorticity = setup_vorticity(32, [3, -2], [(10, 12), (20, 18)], [True, True], 2.)
+        profiler = Profiler()
+        stepper = SpectralStepper(vorticity, 0.1, profiler=profiler)
+        expected = SpectralStepper(vorticity, 0.1)
+
+        velocities, pressure, substeps = stepper.advance(1, 0.5)
+        self.assertGreater(substeps, 1)
+        for _ in range(substeps):
+            expected_velocities, expected_pressure = expected.step(1 / substeps)
+        self.assertTrue(np.allclose(velocities, expected_velocities))
+        self.assertTrue(np.allclose(pressure, expected_pressure))
+
+        # the fields are only evaluated for the number of substeps and once after the last substep
+        profiler.end_step()
+        summary = profiler.summary()
+        self.assertEqual(summary['integrate']['calls'], substeps)
+        self.assertEqual(summary['velocities']['calls'], 2)
+        self.assertEqual(summary['pressure']['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from profiling import JsonLinesSink, read_json_lines
+from .telemetry import RingBufferSink, summarize
+from .fluid_simulation import setup_vortices, FluidStepper
+from .projection import setup_solver
+
+
+class TelemetryTest(unittest.TestCase):
+    def test_ring_buffer(self):
+        with RingBufferSink(3) as sink:
+            for i in range(5):
+                sink.append({'step': i})
+        self.assertEqual(len(sink), 3)
+        self.assertEqual([record['step'] for record in sink.records()], [2, 3, 4])
+
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'telemetry.jsonl')
+            with JsonLinesSink(path) as sink:
+                sink.append({'step': 0, 'cfl': 0.5})
+                sink.append({'step': 1, 'cfl': 1.5})
+            records = read_json_lines(path)
+
+        self.assertEqual(records, [{'step': 0, 'cfl': 0.5}, {'step': 1, 'cfl': 1.5}])
+        self.assertEqual(summarize(records), {'cfl': {'mean': 1., 'max': 1.5}})
+
+    def test_stepper_records(self):
+        for solver in ['direct', 'cg']:
+            velocities = setup_vortices(16, [4, 4], [(5.5, 5.5), (10.5, 10.5)], [True, False])
+            sink = RingBufferSink()
+            stepper = FluidStepper(velocities, setup_solver(16, solver), 0.1, telemetry=sink)
+            for _ in range(3):
+                stepper.step()
+
+            records = sink.records()
+            self.assertEqual([record['step'] for record in records], [0, 1, 2])
+            self.assertAlmostEqual(records[-1]['time'], 0.2)
+            for record in records:
+                # the projection removes the divergence of the advected velocities
+                self.assertGreater(record['divergence_max_before'], 1e-3)
+                self.assertLess(record['divergence_max_after'], 1e-6 * record['divergence_max_before'])
+                self.assertLess(record['divergence_l2_after'], record['divergence_l2_before'])
+                self.assertGreater(record['cfl'], 0)
+                self.assertGreaterEqual(record['step_seconds'], record['solve_seconds'])
+                if solver == 'cg':
+                    self.assertGreater(record['solver_iterations'], 0)
+                else:
+                    self.assertIsNone(record['solver_iterations'])
+
+        # without a sink, no metrics are collected
+        stepper = FluidStepper(velocities, setup_solver(16), 0.1)
+        stepper.step()
+        self.assertEqual(stepper.step_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
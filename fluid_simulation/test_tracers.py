@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+
+from .tracers import TracerParticles, sample_velocities
+from .advection import interpolate_u_array, interpolate_v_array
+from .fluid_simulation import setup_vortices
+from .datastructures.staggered_grid import StaggeredGrid
+
+
+class TracersTest(unittest.TestCase):
+    def test_sample_velocities(self):
+        velocities = setup_vortices((9, 12), [3, 2], [(3.5, 4.5), (8.5, 5.5)], [True, False])
+        x, y = np.random.default_rng(43).uniform([0.5, 0.5], [10.5, 7.5], size=(100, 2)).T
+
+        # inside the grid, the interpolation matches the interpolation of the advection
+        u, v = sample_velocities(velocities.u, velocities.v, x, y)
+        self.assertTrue(np.allclose(u, interpolate_u_array(x, y, velocities)))
+        self.assertTrue(np.allclose(v, interpolate_v_array(x, y, velocities)))
+
+    def test_advect(self):
+        velocities = StaggeredGrid(10)
+        velocities.u[:, 1:-1] = 2
+        velocities.v[1:-1, :] = -1
+
+        tracers = TracerParticles(1000, 10, seed=44)
+        self.assertEqual(tracers.positions.shape, (1000, 2))
+        self.assertEqual(tracers.positions.dtype, np.float32)
+        self.assertTrue(np.all(tracers.positions >= -0.5) and np.all(tracers.positions <= 9.5))
+
+        # away from the walls, the particles move with the uniform flow
+        inner = np.all((tracers.positions > 1) & (tracers.positions < 8), axis=1)
+        expected = tracers.positions[inner] + [0.2, -0.1]
+        positions = tracers.advect(velocities, 0.1)
+        self.assertIs(positions, tracers.positions)
+        self.assertTrue(np.allclose(positions[inner], expected, atol=1e-5))
+
+        # the particles stay inside the grid
+        for _ in range(100):
+            tracers.advect(velocities, 0.1)
+        self.assertTrue(np.all(tracers.positions >= -0.5) and np.all(tracers.positions <= 9.5))
+
+    def test_midpoint_method(self):
+        # a solid body rotation around the center, which keeps the distance of the particles to the center
+        velocities = StaggeredGrid(21)
+        velocities.u[:, 1:-1] = -(np.arange(21)[:, None] - 10.)
+        velocities.v[1:-1, :] = np.arange(21)[None, :] - 10.
+
+        tracers = TracerParticles(200, 21, seed=45)
+        tracers.positions[:] = 10 + np.random.default_rng(45).uniform(-5, 5, size=(200, 2))
+        radius = np.linalg.norm(tracers.positions - 10, axis=1)
+        for _ in range(10):
+            tracers.advect(velocities, 0.05)
+
+        # the error of the midpoint method grows with dt^3 per step, explicit euler would grow the radius by 1%
+        self.assertTrue(np.allclose(np.linalg.norm(tracers.positions - 10, axis=1), radius, rtol=1e-3))
+
+    def test_respawn(self):
+        solid = np.zeros((8, 8), dtype=bool)
+        solid[2:6, 2:6] = True
+        velocities = StaggeredGrid(8)
+        velocities.u[:, 1:-1] = 3
+
+        tracers = TracerParticles(500, 8, lifetime=5, solid=solid, seed=46)
+        self.assertFalse(np.any(solid[tracers.cell_rows(), tracers.cell_cols()]))
+        self.assertTrue(np.all(tracers.ages < 5))
+
+        # the particles carried into the obstacle and the expired particles are respawned in the fluid
+        for _ in range(7):
+            tracers.advect(velocities, 0.2)
+            self.assertFalse(np.any(solid[tracers.cell_rows(), tracers.cell_cols()]))
+            self.assertTrue(np.all(tracers.ages < 5))
+
+        before = tracers.positions.copy()
+        tracers.reseed()
+        self.assertFalse(np.allclose(tracers.positions, before))
+        self.assertTrue(np.all(tracers.ages == 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+
+from .viscosity import setup_viscosity_solver, diffusion_laplacian
+from .datastructures.staggered_grid import StaggeredGrid
+
+
+def random_grid(grid_dim, seed):
+    rng = np.random.default_rng(seed)
+    s = StaggeredGrid(grid_dim)
+    s.u[:, 1:-1] = rng.normal(size=(s.rows, s.cols - 1))
+    s.v[1:-1, :] = rng.normal(size=(s.rows - 1, s.cols))
+    return s
+
+
+class ViscosityTest(unittest.TestCase):
+    def test_diffusion_laplacian(self):
+        open_faces = np.ones((3, 2), dtype=bool)
+        open_faces[2, 0] = False
+        L = diffusion_laplacian(open_faces).toarray()
+
+        self.assertTrue(np.array_equal(L, L.T))
+        # two neighbours along the normal axis, one or two along the tangential axis, closed faces are zero
+        self.assertTrue(np.array_equal(np.diag(L), [3, 3, 4, 4, 0, 3]))
+        self.assertTrue(np.array_equal(L[2], [-1, 0, 4, -1, 0, 0]))
+        self.assertTrue(np.array_equal(L[4], [0, 0, 0, 0, 0, 0]))
+
+    def test_spectral_and_direct(self):
+        spectral = random_grid(9, 15)
+        direct = random_grid(9, 15)
+
+        setup_viscosity_solver(9, 0.7, 'spectral')(spectral, 0.3)
+        setup_viscosity_solver(9, 0.7, 'direct')(direct, 0.3)
+
+        self.assertTrue(np.allclose(spectral.u, direct.u))
+        self.assertTrue(np.allclose(spectral.v, direct.v))
+        self.assertTrue(np.all(spectral.u[:, [0, -1]] == 0))
+        self.assertTrue(np.all(spectral.v[[0, -1], :] == 0))
+        self.assertIs(setup_viscosity_solver(9, 0.7), setup_viscosity_solver(9, 0.7))
+
+        # the solution fulfills (I - viscosity * dt * laplacian) u_new = u
+        original = random_grid(9, 15)
+        L = diffusion_laplacian(np.ones((9, 8), dtype=bool))
+        residual = (direct.u[:, 1:-1].reshape(-1) + 0.7 * 0.3 * L @ direct.u[:, 1:-1].reshape(-1))
+        self.assertTrue(np.allclose(residual, original.u[:, 1:-1].reshape(-1)))
+
+    def test_rectangular_grid(self):
+        spectral = random_grid((5, 9), 19)
+        direct = random_grid((5, 9), 19)
+
+        setup_viscosity_solver((5, 9), 0.4, 'spectral')(spectral, 0.5)
+        setup_viscosity_solver((5, 9), 0.4, 'direct')(direct, 0.5)
+
+        self.assertTrue(np.allclose(spectral.u, direct.u))
+        self.assertTrue(np.allclose(spectral.v, direct.v))
+
+    def test_high_viscosity(self):
+        # the implicit diffusion stays stable and smooths the velocities towards zero
+        s = random_grid(8, 16)
+        setup_viscosity_solver(8, 1e6)(s, 1)
+        self.assertLess(np.abs(s.u).max(), 1e-5)
+        self.assertLess(np.abs(s.v).max(), 1e-5)
+
+    def test_obstacles(self):
+        solid = np.zeros((8, 8), dtype=bool)
+        solid[2:4, 3:6] = True
+        s = random_grid(8, 17)
+        setup_viscosity_solver(8, 0.5, 'direct', solid)(s, 0.2)
+
+        self.assertTrue(np.all(s.u[2:4, 3:7] == 0))
+        self.assertTrue(np.all(s.v[2:5, 3:6] == 0))
+
+        with self.assertRaises(ValueError):
+            setup_viscosity_solver(8, 0.5, 'spectral', solid)
+        with self.assertRaises(ValueError):
+            setup_viscosity_solver(8, 0.5, 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import numpy as np
+
+from .datastructures.staggered_grid import grid_shape
+
+
+class TracerParticles:
+    """
+    Massless particles, which are carried along by the fluid to visualize the flow.
+    The positions (x, y) of all particles are stored in one float32 array of shape (count, 2), which can be passed to a
+    scatter plot directly. They are advected with the midpoint method (RK2) through the staggered velocities, which are
+    interpolated bilinearly in single precision, see sample_velocities.
+    """
+
+    def __init__(self, count, grid_dim, lifetime=None, solid=None, seed=None):
+        """
+        Seeds the particles uniformly in the fluid cells
+        :param count: the number of particles
+        :param grid_dim: the grid dimension, an int for a square grid or the number of cells (rows, cols)
+        :param lifetime: None to keep the particles forever, or the number of steps after which a particle is respawned
+        at a random position. The initial ages are random, so the particles are not respawned all at once
+        :param solid: None or a boolean array of shape (rows, cols), which is True for the solid cells. Particles are
+        only seeded in fluid cells and are respawned, if they are carried into a solid cell
+        :param seed: the seed of the random positions
+        """
+        self.rows, self.cols = grid_shape(grid_dim)
+        self.lifetime = lifetime
+        self.solid = None if solid is None else np.asarray(solid, dtype=bool)
+        self._fluid_cells = np.flatnonzero(~self.solid) if solid is not None else None
+        self._rng = np.random.default_rng(seed)
+
+        self.positions = np.empty((count, 2), dtype=np.float32)
+        self.ages = np.zeros(count, dtype=np.int64)
+        self.reseed()
+        if lifetime is not None:
+            self.ages = self._rng.integers(0, lifetime, count)
+
+    @property
+    def count(self):
+        return len(self.positions)
+
+    def reseed(self):
+        """
+        Moves all particles to new random positions in the fluid cells
+        """
+        self.respawn(np.ones(self.count, dtype=bool))
+
+    def respawn(self, particles):
+        """
+        Moves the particles to new random positions in the fluid cells and resets their ages
+        :param particles: a boolean mask or the indices of the particles to respawn
+        """
+        count = len(self.positions[particles])
+        if self._fluid_cells is None:
+            cells = self._rng.integers(0, self.rows * self.cols, count)
+        else:
+            cells = self._fluid_cells[self._rng.integers(0, len(self._fluid_cells), count)]
+        rows, cols = np.divmod(cells, self.cols)
+
+        # uniformly distributed inside the cells, whose centers are at the integer coordinates
+        offsets = self._rng.random((count, 2), dtype=np.float32) - np.float32(0.5)
+        offsets[:, 0] += cols
+        offsets[:, 1] += rows
+        self.positions[particles] = offsets
+        self.ages[particles] = 0
+
+    def advect(self, velocities, dt):
+        """
+        Moves the particles along the velocities by dt seconds with the midpoint method, in place. Particles are kept
+        inside the grid, particles in solid cells and particles older than the lifetime are respawned.
+        :param velocities: the grid containing the velocities
+        :param dt: the time step
+        :return: the positions of the particles
+        """
+        u = velocities.u.astype(np.float32)
+        v = velocities.v.astype(np.float32)
+        dt = np.float32(dt)
+        x, y = self.positions[:, 0], self.positions[:, 1]
+
+        k1_x, k1_y = sample_velocities(u, v, x, y)
+        k2_x, k2_y = sample_velocities(u, v, x + 0.5 * dt * k1_x, y + 0.5 * dt * k1_y)
+        x += dt * k2_x
+        y += dt * k2_y
+
+        # the walls are closed, so particles only leave the grid by the error of the time integration
+        np.clip(x, -0.5, self.cols - 0.5, out=x)
+        np.clip(y, -0.5, self.rows - 0.5, out=y)
+
+        expired = np.zeros(self.count, dtype=bool)
+        if self.lifetime is not None:
+            self.ages += 1
+            expired |= self.ages >= self.lifetime
+        if self.solid is not None:
+            expired |= self.solid[self.cell_rows(), self.cell_cols()]
+        if expired.any():
+            self.respawn(expired)
+
+        return self.positions
+
+    def cell_rows(self):
+        """
+        :return: the rows of the cells containing the particles
+        """
+        return np.clip(np.floor(self.positions[:, 1] + 0.5).astype(np.int64), 0, self.rows - 1)
+
+    def cell_cols(self):
+        """
+        :return: the columns of the cells containing the particles
+        """
+        return np.clip(np.floor(self.positions[:, 0] + 0.5).astype(np.int64), 0, self.cols - 1)
+
+
+def sample_velocities(u, v, x, y):
+    """
+    Bilinearly interpolates the staggered velocities at arbitrary positions. The u-face (row, col) is located at
+    (col - 0.5, row), the v-face (row, col) at (col, row - 0.5). Positions beyond the outermost faces are clamped to
+    them. Unlike advection.interpolate_u_array, nothing is extrapolated, which keeps the sampling of many particles cheap.
+    :param u: the u velocities, of shape (rows, cols + 1)
+    :param v: the v velocities, of shape (rows + 1, cols)
+    :param x: the x coordinates of the positions
+    :param y: the y coordinates of the positions
+    :return: the velocities (u, v) at the positions, in the precision of the velocities
+    """
+    return bilinear(u, x + 0.5, y), bilinear(v, x, y + 0.5)
+
+
+def bilinear(values, i, j):
+    """
+    Bilinearly interpolates a 2D array at continuous indices, clamped to the array
+    :param values: the array of shape (rows, cols), with at least two rows and columns
+    :param i: the column indices
+    :param j: the row indices
+    :return: the interpolated values
+    """
+    rows, cols = values.shape
+    i = np.clip(i, 0, cols - 1)
+    j = np.clip(j, 0, rows - 1)
+    left = np.minimum(np.floor(i), cols - 2)
+    top = np.minimum(np.floor(j), rows - 2)
+    alpha = i - left
+    beta = j - top
+
+    # the four neighbours are gathered from the flattened array with a single index
+    flat = values.reshape(-1)
+    index = top.astype(np.int64) * cols + left.astype(np.int64)
+    upper = flat[index] * (1 - alpha) + flat[index + 1] * alpha
+    lower = flat[index + cols] * (1 - alpha) + flat[index + cols + 1] * alpha
+    return upper * (1 - beta) + lower * beta
@@ -0,0 +1,132 @@
+import numpy as np
+import scipy.fft as fft
+import scipy.sparse as sp
+
+from .datastructures.staggered_grid import grid_shape
+from .obstacles import face_masks, mask_key
+
+# diffusion solvers, keyed by the method, the grid dimension, the viscosity and the obstacle mask
+_solver_cache = {}
+
+
+def setup_viscosity_solver(grid_dim, viscosity, method='spectral', solid=None):
+    """
+    Set up the implicit diffusion of the velocities, which solves (I - viscosity * dt * laplacian) u_new = u for the u-
+    and the v-velocities. Being implicit, it is stable for every viscosity and time step. The solvers are cached.
+    The boundary faces (and the faces of obstacles) are zero, which is a Dirichlet condition for the velocity normal to
+    a wall. The velocity tangential to a wall has no neighbour beyond the wall, which is a Neumann (free slip) condition.
+    :param grid_dim: the dimension of the grid, an int for a square grid or the number of cells (rows, cols)
+    :param viscosity: the kinematic viscosity of the fluid
+    :param method: the method to solve the equation with:
+        'spectral' diagonalizes the equation with a discrete sine transform along the normal and a discrete cosine
+        transform along the tangential axis of every velocity component,
+        'direct' factorizes the sparse matrix, the factorizations are cached for every time step
+    :param solid: None or a boolean array of shape (rows, cols), which is True for the solid cells of static
+    obstacles (only supported by the 'direct' method)
+    :return: a function (velocities, dt) -> velocities, that diffuses the inner faces of the velocities in place
+    """
+    key = (method, grid_shape(grid_dim), viscosity, mask_key(solid))
+    if key not in _solver_cache:
+        if method == 'spectral':
+            if solid is not None:
+                raise ValueError("The spectral viscosity solver does not support obstacles. Please choose 'direct'")
+            _solver_cache[key] = _spectral_viscosity_solver(grid_dim, viscosity)
+        elif method == 'direct':
+            _solver_cache[key] = _direct_viscosity_solver(grid_dim, viscosity, solid)
+        else:
+            raise ValueError("Invalid viscosity solver method. Please choose 'spectral' or 'direct'")
+    return _solver_cache[key]
+
+
+def _spectral_viscosity_solver(grid_dim, viscosity):
+    """
+    Set up the spectral diffusion. Along the normal axis of a velocity component, the inner faces are diagonalized by the
+    DST-I with the eigenvalues 2 - 2 cos(pi * k / n) for k = 1, ..., n - 1. Along the tangential axis, the faces are
+    diagonalized by the DCT-II with the eigenvalues 2 - 2 cos(pi * l / m) for l = 0, ..., m - 1. n and m are the numbers
+    of cells along the respective axes.
+    """
+    rows, cols = grid_shape(grid_dim)
+
+    def eigenvalues(tangential_cells, normal_cells):
+        # in the orientation of the inner u-faces, the normal axis is the x-axis (axis 1)
+        normal_eigenvalues = 2 - 2 * np.cos(np.pi * np.arange(1, normal_cells) / normal_cells)
+        tangential_eigenvalues = 2 - 2 * np.cos(np.pi * np.arange(tangential_cells) / tangential_cells)
+        return tangential_eigenvalues[:, None] + normal_eigenvalues[None, :]
+
+    u_eigenvalues = eigenvalues(rows, cols)
+    v_eigenvalues = eigenvalues(cols, rows)
+
+    def diffuse_component(inner, dt, component_eigenvalues):
+        coefficients = fft.dct(fft.dst(inner, type=1, axis=1, norm='ortho'), type=2, axis=0, norm='ortho')
+        coefficients /= 1 + viscosity * dt * component_eigenvalues
+        inner[...] = fft.idst(fft.idct(coefficients, type=2, axis=0, norm='ortho'), type=1, axis=1, norm='ortho')
+
+    def diffuse(velocities, dt):
+        diffuse_component(velocities.u[:, 1:cols], dt, u_eigenvalues)
+        # the transposed inner v-faces have the orientation of the inner u-faces
+        diffuse_component(velocities.v[1:rows, :].T, dt, v_eigenvalues)
+        return velocities
+
+    return diffuse
+
+
+def _direct_viscosity_solver(grid_dim, viscosity, solid):
+    """
+    Set up the diffusion with sparse factorizations. The faces of obstacles are identity rows, so they stay zero.
+    """
+    import scipy.sparse.linalg as spl
+
+    rows, cols = grid_shape(grid_dim)
+    if solid is None:
+        solid = np.zeros((rows, cols), dtype=bool)
+    u_open, v_open = face_masks(solid)
+    # both components in the orientation of the inner u-faces, see _spectral_viscosity_solver
+    open_faces = [u_open[:, 1:cols], v_open[1:rows, :].T]
+    laplacians = [diffusion_laplacian(faces) for faces in open_faces]
+
+    # factorizations for every time step used so far, the adaptive time stepping only uses a few
+    factorizations = {}
+
+    def diffuse(velocities, dt):
+        if dt not in factorizations:
+            factorizations[dt] = [
+                spl.factorized((sp.identity(L.shape[0]) + viscosity * dt * L).tocsc()) for L in laplacians
+            ]
+
+        for inner, faces, solve in zip(
+                [velocities.u[:, 1:cols], velocities.v[1:rows, :].T], open_faces, factorizations[dt]
+        ):
+            inner[...] = solve(np.where(faces, inner, 0).reshape(-1)).reshape(inner.shape)
+        return velocities
+
+    return diffuse
+
+
+def diffusion_laplacian(open_faces):
+    """
+    Assemble the negative laplacian of the inner faces of a velocity component in the orientation of the u-faces: axis 1
+    is the normal axis, whose boundary faces are zero (Dirichlet), axis 0 is the tangential axis without neighbours
+    beyond the walls (Neumann). Closed faces are zero as well, their rows are zero.
+    :param open_faces: a boolean array, which is True for the open inner faces
+    :return: the sparse matrix of shape (open_faces.size, open_faces.size)
+    """
+    rows, cols = open_faces.shape
+    faces = np.arange(open_faces.size).reshape(open_faces.shape)
+
+    # every face has two neighbours along the normal axis and one or two along the tangential axis
+    neighbour_count = 2 + (np.arange(rows) > 0)[:, None] + (np.arange(rows) < rows - 1)[:, None] + np.zeros(cols)
+    main_diagonal = np.where(open_faces, neighbour_count, 0).reshape(-1)
+
+    # pairs of open neighbouring faces are coupled
+    horizontal = open_faces[:, :-1] & open_faces[:, 1:]
+    vertical = open_faces[:-1, :] & open_faces[1:, :]
+    first = np.concatenate([faces[:, :-1][horizontal], faces[:-1, :][vertical]])
+    second = np.concatenate([faces[:, 1:][horizontal], faces[1:, :][vertical]])
+
+    return sp.csr_matrix(
+        (
+            np.concatenate([main_diagonal, -np.ones(2 * len(first))]),
+            (np.concatenate([faces.reshape(-1), first, second]), np.concatenate([faces.reshape(-1), second, first]))
+        ),
+        shape=(open_faces.size, open_faces.size)
+    )
@@ -0,0 +1 @@
+from .heated_plate_simulation import run_simulation, generate_sparse_fdm_matrix
@@ -1,7 +1,7 @@
 import numpy as np
 import scipy.sparse as sp
-import scipy.sparse.linalg as spl
-from tqdm import tqdm
+
+from profiling import phase
 
 
 def generate_sparse_fdm_matrix(spacial_dim, boundary_conditions) -> sp.lil_matrix:
@@ -94,13 +94,15 @@ def generate_sparse_fdm_matrix(spacial_dim, boundary_conditions) -> sp.lil_matri
     return sparse_matrix
 
 
-def calculate_forward_euler_step(grid_vector, dx, dt, a, fdm_matrix) -> np.ndarray:
+def calculate_forward_euler_step(grid_vector, dx, dt, a, fdm_matrix, profiler=None) -> np.ndarray:
     # calculate the next step of the simulation using the forward euler method
-    return grid_vector + a * dt / dx**2 * fdm_matrix.dot(grid_vector)
+    with phase(profiler, 'matvec'):
+        return grid_vector + a * dt / dx**2 * fdm_matrix.dot(grid_vector)
 
 
-def calculate_implicit_euler_step(grid_vector, solve) -> np.ndarray:
-    return solve(grid_vector)
+def calculate_implicit_euler_step(grid_vector, solve, profiler=None) -> np.ndarray:
+    with phase(profiler, 'solve'):
+        return solve(grid_vector)
 
 
 def run_simulation(
@@ -111,15 +113,25 @@ def run_simulation(
         dt,
         heat_positions,
         boundary_conditions='unisolated',
-        simulator='forward'
+        simulator='forward',
+        profiler=None
 ) -> list[np.ndarray]:
+    # the profiler (see profiling.Profiler) times the assembly, the factorization and the phases of every step
+    # scipy.sparse.linalg and tqdm are imported on demand, so importing the simulation stays fast
+    import scipy.sparse.linalg as spl
+    from tqdm import tqdm
+
     results = []
 
     # generate the sparse matrix for the finite difference method
-    fdm_matrix = generate_sparse_fdm_matrix(spacial_dim, boundary_conditions)
+    with phase(profiler, 'assemble'):
+        fdm_matrix = generate_sparse_fdm_matrix(spacial_dim, boundary_conditions)
 
     if simulator == 'implicit':
-        solve = spl.factorized(sp.eye(spacial_dim**2).tocsc() - a * dt / dx**2 * fdm_matrix.tocsc())
+        with phase(profiler, 'factorize'):
+            solve = spl.factorized(sp.eye(spacial_dim**2).tocsc() - a * dt / dx**2 * fdm_matrix.tocsc())
+    if profiler is not None:
+        profiler.end_setup()
 
     # initialize the grid with the initial conditions
     results.append(np.zeros(spacial_dim**2))
@@ -127,12 +139,17 @@ def run_simulation(
         results[0][position[0] * spacial_dim + position[1]] = position[2]
 
     # run the simulation for the specified number of time steps
-    for i in tqdm(range(time_steps), desc="Running simulation", unit="steps"):
+    progress = tqdm(range(time_steps), desc="Running simulation", unit="steps")
+    if profiler is not None:
+        profiler.attach(progress)
+    for i in progress:
         if simulator == 'forward':
-            results.append(calculate_forward_euler_step(results[i], dx, dt, a, fdm_matrix))
+            results.append(calculate_forward_euler_step(results[i], dx, dt, a, fdm_matrix, profiler))
         elif simulator == 'implicit':
-            results.append(calculate_implicit_euler_step(results[i], solve))
+            results.append(calculate_implicit_euler_step(results[i], solve, profiler))
         else:
             raise ValueError("Invalid simulator. Please choose 'forward' or 'implicit'")
+        if profiler is not None:
+            profiler.end_step()
 
     return list(map(lambda x: x.reshape(spacial_dim, spacial_dim), results))
@@ -0,0 +1,2 @@
+from profiling.profiler import Profiler, phase
+from profiling.sinks import TqdmPostfixSink, LogSink, JsonLinesSink, read_json_lines
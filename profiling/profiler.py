@@ -0,0 +1,179 @@
+import cProfile
+import functools
+import io
+import pstats
+import time
+from contextlib import contextmanager, nullcontext
+
+# the context of the phases of a disabled profiler, which is reused, since it does nothing
+_NO_PHASE = nullcontext()
+
+
+def phase(profiler, name):
+    """
+    Times a phase, if profiling is enabled. This is the hook the step functions use, so a disabled profiler only costs
+    a comparison and entering an empty context.
+    :param profiler: None or a Profiler
+    :param name: the name of the phase
+    :return: a context manager timing the phase
+    """
+    return _NO_PHASE if profiler is None else profiler.phase(name)
+
+
+class Profiler:
+    """
+    Collects named phase timers and counters of the steps of a simulation.
+    The step functions time their phases with phase(profiler, name) and count events (e.g. solver iterations) with
+    count. The loop running the steps calls end_step after every step, which passes a record of the step to the sinks:
+    the step, the seconds of every phase (as name_seconds) and the counters. Phases may be nested, the time of an inner
+    phase is part of the time of the outer phase as well. The totals of all steps are kept for the summary.
+    cProfile can be switched on for a number of steps on demand, see request_cprofile.
+    """
+
+    def __init__(self, *sinks):
+        """
+        :param sinks: objects with a method append(record), e.g. TqdmPostfixSink, LogSink or JsonLinesSink. Sinks with
+        a method attach(progress) are attached to the progress bars of the simulations, sinks with a method close()
+        are closed with the profiler
+        """
+        self.sinks = list(sinks)
+        self.steps = 0
+        self.phase_totals = {}  # the seconds and the calls of every phase over all steps
+        self.counter_totals = {}
+        self._seconds = {}  # the seconds of the phases of the current step
+        self._counters = {}
+
+        self._cprofile = None
+        self._cprofile_steps = 0
+        self._cprofile_path = None
+        self.cprofile_stats = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times a phase of the current step
+        :param name: the name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._seconds[name] = self._seconds.get(name, 0.) + seconds
+            total = self.phase_totals.setdefault(name, [0., 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def timed(self, name=None):
+        """
+        A decorator timing every call of a function as a phase
+        :param name: the name of the phase, None for the name of the function
+        """
+        def decorator(function):
+            phase_name = function.__name__ if name is None else name
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.phase(phase_name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def count(self, name, amount=1):
+        """
+        Adds to a counter of the current step
+        :param name: the name of the counter
+        :param amount: the amount to add
+        """
+        self._counters[name] = self._counters.get(name, 0) + amount
+        self.counter_totals[name] = self.counter_totals.get(name, 0) + amount
+
+    def attach(self, progress):
+        """
+        Attaches a progress bar to the sinks, which show the metrics of every step in it
+        :param progress: a tqdm progress bar
+        """
+        for sink in self.sinks:
+            if hasattr(sink, 'attach'):
+                sink.attach(progress)
+
+    def end_step(self):
+        """
+        Ends the current step and passes its record to the sinks
+        :return: the record of the step
+        """
+        record = self._flush(self.steps)
+        self.steps += 1
+        if self._cprofile is not None:
+            self._cprofile_steps -= 1
+            if self._cprofile_steps <= 0:
+                self._stop_cprofile()
+        return record
+
+    def end_setup(self):
+        """
+        Passes the phases timed before the first step (e.g. the assembly of matrices) to the sinks, as a record whose
+        step is 'setup'
+        :return: the record of the setup
+        """
+        return self._flush('setup')
+
+    def _flush(self, step):
+        record = {'step': step}
+        record.update({f"{name}_seconds": seconds for name, seconds in self._seconds.items()})
+        record.update(self._counters)
+        self._seconds = {}
+        self._counters = {}
+        for sink in self.sinks:
+            sink.append(record)
+        return record
+
+    def request_cprofile(self, steps=1, path=None):
+        """
+        Runs cProfile from now on for the given number of steps. Afterwards, the statistics are kept in cprofile_stats
+        and written to the path, if one is given (see pstats.Stats.dump_stats)
+        :param steps: the number of steps to profile
+        :param path: None or the path of the file to write the statistics to
+        """
+        if self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._cprofile_steps = steps
+        self._cprofile_path = path
+
+    def _stop_cprofile(self):
+        self._cprofile.disable()
+        self.cprofile_stats = pstats.Stats(self._cprofile, stream=io.StringIO())
+        if self._cprofile_path is not None:
+            self.cprofile_stats.dump_stats(self._cprofile_path)
+        self._cprofile = None
+
+    def summary(self):
+        """
+        :return: a dict mapping every phase to its total seconds, its number of calls and its mean seconds per step, and
+        every counter to its total and its mean per step
+        """
+        steps = max(self.steps, 1)
+        summary = {
+            name: {'seconds': seconds, 'calls': calls, 'seconds_per_step': seconds / steps}
+            for name, (seconds, calls) in self.phase_totals.items()
+        }
+        summary.update({
+            name: {'total': total, 'per_step': total / steps} for name, total in self.counter_totals.items()
+        })
+        return summary
+
+    def close(self):
+        if self._cprofile is not None:
+            self._stop_cprofile()
+        for sink in self.sinks:
+            if hasattr(sink, 'close'):
+                sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
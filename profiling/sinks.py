@@ -0,0 +1,98 @@
+import json
+import logging
+
+
+def format_metrics(record):
+    """
+    :param record: the record of a step, see Profiler.end_step
+    :return: a dict mapping the phases of the record to their formatted milliseconds and the counters to their values
+    """
+    metrics = {}
+    for key, value in record.items():
+        if key.endswith('_seconds'):
+            metrics[key[:-len('_seconds')]] = f"{value * 1000:.2f}ms"
+        elif key != 'step':
+            metrics[key] = value
+    return metrics
+
+
+class TqdmPostfixSink:
+    """
+    Shows the milliseconds of the phases and the counters of the last step in the postfix of a tqdm progress bar. The
+    simulations attach their progress bars, see Profiler.attach.
+    """
+
+    def __init__(self, progress=None):
+        """
+        :param progress: None or the progress bar to show the metrics in
+        """
+        self.progress = progress
+
+    def attach(self, progress):
+        self.progress = progress
+
+    def append(self, record):
+        if self.progress is None or record['step'] == 'setup':
+            return
+        self.progress.set_postfix(format_metrics(record), refresh=False)
+
+
+class LogSink:
+    """
+    Logs the phases and counters of every n-th step
+    """
+
+    def __init__(self, logger=None, level=logging.INFO, every=1):
+        """
+        :param logger: the logger, None for the logger 'profiling'
+        :param level: the level of the messages
+        :param every: log every n-th step, the setup is always logged
+        """
+        self.logger = logging.getLogger('profiling') if logger is None else logger
+        self.level = level
+        self.every = every
+
+    def append(self, record):
+        step = record['step']
+        if step != 'setup' and step % self.every != 0:
+            return
+        metrics = ", ".join(f"{key} {value}" for key, value in format_metrics(record).items())
+        self.logger.log(self.level, "step %s: %s", step, metrics)
+
+
+class JsonLinesSink:
+    """
+    Writes every record as one line of JSON into a file, which is flushed after every record, so the file can be
+    followed while the simulation runs. Used for the profiles as well as the telemetry of the fluid simulation.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: the path of the file to write
+        """
+        self.path = path
+        self._file = open(path, 'w')
+
+    def append(self, record):
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read_json_lines(path):
+    """
+    Reads the records written by a JsonLinesSink
+    :param path: the path of the file to read
+    :return: the list of the records
+    """
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
@@ -0,0 +1,161 @@
+import logging
+import os
+import pstats
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from cloth_simulation import cloth_simulation
+from fluid_simulation import fluid_simulation, fluid_simulation_3d, spectral_simulation
+from fluid_simulation.projection_3d import setup_solver
+from heated_plate import heated_plate_simulation
+from profiling import Profiler, phase, TqdmPostfixSink, LogSink, JsonLinesSink, read_json_lines
+
+
+class FakeProgress:
+    def __init__(self):
+        self.postfixes = []
+
+    def set_postfix(self, postfix, refresh=True):
+        self.postfixes.append(postfix)
+
+
+class ProfilerTest(unittest.TestCase):
+    def test_phases_and_counters(self):
+        records = []
+
+        class ListSink:
+            append = records.append
+
+        profiler = Profiler(ListSink())
+        with phase(profiler, 'setup'):
+            pass
+        profiler.end_setup()
+        for _ in range(2):
+            with profiler.phase('outer'):
+                with profiler.phase('inner'):
+                    time.sleep(0.001)
+                with profiler.phase('inner'):
+                    pass
+            profiler.count('iterations', 3)
+            profiler.end_step()
+
+        self.assertEqual([record['step'] for record in records], ['setup', 0, 1])
+        self.assertEqual(set(records[0]), {'step', 'setup_seconds'})
+        self.assertEqual(set(records[1]), {'step', 'outer_seconds', 'inner_seconds', 'iterations'})
+        self.assertEqual(records[1]['iterations'], 3)
+        self.assertGreaterEqual(records[1]['outer_seconds'], records[1]['inner_seconds'])
+        self.assertGreater(records[1]['inner_seconds'], 0.001)
+
+        summary = profiler.summary()
+        self.assertEqual(summary['inner']['calls'], 4)
+        self.assertAlmostEqual(summary['inner']['seconds_per_step'], summary['inner']['seconds'] / 2)
+        self.assertEqual(summary['iterations'], {'total': 6, 'per_step': 3})
+
+        # a disabled profiler does nothing, and its phases share one empty context
+        with phase(None, 'inner'):
+            pass
+        self.assertIs(phase(None, 'inner'), phase(None, 'outer'))
+
+    def test_timed(self):
+        profiler = Profiler()
+
+        @profiler.timed()
+        def solve(x):
+            return 2 * x
+
+        self.assertEqual(solve(2), 4)
+        self.assertEqual(solve.__name__, 'solve')
+        self.assertEqual(set(profiler.end_step()), {'step', 'solve_seconds'})
+
+    def test_sinks(self):
+        progress = FakeProgress()
+        tqdm_sink = TqdmPostfixSink()
+        log_sink = LogSink(every=2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.jsonl')
+            with Profiler(tqdm_sink, log_sink, JsonLinesSink(path)) as profiler:
+                profiler.attach(progress)
+                with self.assertLogs('profiling', logging.INFO) as logs:
+                    profiler.end_setup()
+                    for _ in range(3):
+                        with profiler.phase('solve'):
+                            pass
+                        profiler.count('solves')
+                        profiler.end_step()
+            records = read_json_lines(path)
+
+        self.assertIs(tqdm_sink.progress, progress)
+        self.assertEqual(len(progress.postfixes), 3)
+        self.assertEqual(set(progress.postfixes[-1]), {'solve', 'solves'})
+        self.assertTrue(progress.postfixes[-1]['solve'].endswith('ms'))
+        self.assertEqual(len(logs.output), 3)  # the setup and the steps 0 and 2
+        self.assertIn('step 2: solve', logs.output[-1])
+        self.assertEqual([record['step'] for record in records], ['setup', 0, 1, 2])
+        self.assertEqual(records[-1]['solves'], 1)
+
+    def test_request_cprofile(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'profile.prof')
+            profiler = Profiler()
+            profiler.request_cprofile(steps=2, path=path)
+            for _ in range(2):
+                self.assertIsNone(profiler.cprofile_stats)
+                np.linalg.inv(np.eye(4))
+                profiler.end_step()
+            self.assertIsInstance(profiler.cprofile_stats, pstats.Stats)
+            self.assertGreater(os.path.getsize(path), 0)
+
+
+class SimulationHooksTest(unittest.TestCase):
+    def test_heated_plate(self):
+        for simulator, phases in [('forward', {'matvec'}), ('implicit', {'solve'})]:
+            profiler = Profiler()
+            heated_plate_simulation.run_simulation(6, 3, 250, 1, 0.001, [(2, 2, 100)], 'isolated', simulator, profiler)
+            self.assertEqual(profiler.steps, 3)
+            self.assertTrue(phases <= set(profiler.phase_totals), simulator)
+
+    def test_cloth(self):
+        for simulation_type, phases in [
+            ('rk2', {'forces'}),
+            ('implicit_euler', {'setup_matrices', 'assemble_K', 'forces', 'spsolve'})
+        ]:
+            records = []
+            profiler = Profiler(records)
+            cloth_simulation.run_simulation(
+                4, 0.3, 1, np.array([100, 50, 10]), np.zeros(3), np.array([0, 0, 10]), 0.01, 3, simulation_type,
+                profiler=profiler
+            )
+            self.assertEqual(profiler.steps, 3)
+            self.assertEqual(set(profiler.phase_totals), phases, simulation_type)
+            # the assembly of the matrices is recorded as the setup, not as part of the first step
+            self.assertEqual([record['step'] for record in records], ['setup', 0, 1, 2])
+            self.assertNotIn('setup_matrices_seconds', records[1])
+
+        with self.assertRaises(ValueError):
+            cloth_simulation.run_simulation(
+                4, 0.3, 1, np.array([100, 50, 10]), np.zeros(3), np.array([0, 0, 10]), 0.01, 3, 'euler'
+            )
+
+    def test_fluid(self):
+        profiler = Profiler()
+        fluid_simulation.run_simulation(8, [5], [(4, 4)], [True], 2, 0.02, solver='cg', profiler=profiler)
+        self.assertEqual(profiler.steps, 2)
+        self.assertTrue({'advect', 'project', 'divergence', 'solve', 'correct'} <= set(profiler.phase_totals))
+        self.assertGreater(profiler.counter_totals['solver_iterations'], 0)
+
+        profiler = Profiler()
+        spectral_simulation.run_simulation(8, [5], [(4, 4)], [True], 2, 0.02, profiler=profiler)
+        self.assertEqual(profiler.steps, 2)
+        self.assertEqual(set(profiler.phase_totals), {'integrate', 'velocities', 'pressure'})
+
+        profiler = Profiler()
+        velocities, density = fluid_simulation_3d.setup_smoke(6, (3, 3, 3), 2)
+        fluid_simulation_3d.step(velocities, setup_solver(6), 0.02, scalars=density, buoyancy=1, profiler=profiler)
+        self.assertEqual(set(profiler.end_step()), {'step', 'advect_seconds', 'buoyancy_seconds', 'project_seconds'})
+
+
+if __name__ == '__main__':
+    unittest.main()
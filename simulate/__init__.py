@@ -0,0 +1,2 @@
+from simulate.simulators import DEFAULTS, SIMULATORS, run, resolve_parameters
+from simulate.frames import write_frames, read_frames
@@ -0,0 +1,91 @@
+import argparse
+import json
+import sys
+import time
+
+from simulate.frames import write_frames
+from simulate.simulators import DEFAULTS, run, resolve_parameters
+
+
+def parse_value(text):
+    """
+    :param text: the value of a flag, as JSON (e.g. 250, [[25, 25, 750]] or null) or a plain string (e.g. implicit)
+    :return: the parsed value
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def read_config(path):
+    """
+    :param path: the path of a JSON file with a dict of parameters
+    :return: the parameters
+    """
+    with open(path) as file:
+        parameters = json.load(file)
+    if not isinstance(parameters, dict):
+        raise ValueError(f"Invalid config {path}. Please provide a JSON object mapping the parameters to their values")
+    return parameters
+
+
+def main(arguments=None):
+    """
+    Runs a simulation without plotting and writes its frames as .npz archive (see simulate.frames).
+        python -m simulate heated_plate --time-steps 200 --a 300 --output plate.npz
+        python -m simulate fluid --config fluid.json --solver cg [--profile]
+    The parameters are the defaults of the simulator, updated by the config file and then by the flags. The values of
+    the flags are JSON, e.g. --heat-positions "[[25, 25, 750]]", or plain strings.
+    :return: the exit code
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m simulate', description=main.__doc__.split(':return')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    simulators = parser.add_subparsers(dest='command', required=True)  # 'simulator' is a parameter of the plate
+    for simulator, defaults in DEFAULTS.items():
+        command = simulators.add_parser(simulator, help=f"run the {simulator.replace('_', ' ')} simulation")
+        command.add_argument('--config', '-c', help="a JSON file with the parameters")
+        command.add_argument('--output', '-o', help=f"the archive to write the frames to (default: {simulator}.npz)")
+        command.add_argument('--profile', action='store_true', help="print the time spent in every phase")
+        parameters = command.add_argument_group('parameters')
+        for name, value in defaults.items():
+            parameters.add_argument(
+                f"--{name.replace('_', '-')}", dest=name, type=parse_value, default=argparse.SUPPRESS,
+                metavar='VALUE', help=f"default: {json.dumps(value)}"
+            )
+
+    arguments = vars(parser.parse_args(arguments))
+    simulator = arguments.pop('command')
+    config = arguments.pop('config')
+    output = arguments.pop('output') or f"{simulator}.npz"
+    profile = arguments.pop('profile')
+    try:
+        parameters = resolve_parameters(simulator, {**(read_config(config) if config is not None else {}), **arguments})
+    except ValueError as error:
+        parser.error(str(error))
+
+    profiler = None
+    if profile:
+        from profiling import Profiler
+        profiler = Profiler()
+
+    start = time.perf_counter()
+    frames = run(simulator, parameters, profiler)
+    seconds = time.perf_counter() - start
+    write_frames(output, frames, parameters)
+
+    shapes = ", ".join(f"{name} {frame.shape}" for name, frame in frames.items())
+    print(f"Simulated {simulator} in {seconds:.2f}s, wrote {shapes} to {output}")
+    if profiler is not None:
+        for name, totals in profiler.summary().items():
+            if 'seconds' in totals:
+                print(f"    {name}: {totals['seconds']:.3f}s in {totals['calls']} calls")
+            else:
+                print(f"    {name}: {totals['total']} ({totals['per_step']:.3g} per step)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+import json
+import os
+
+import numpy as np
+
+
+def write_frames(path, frames, parameters=None):
+    """
+    Writes the frames of a run as an uncompressed .npz archive with one array per name, and the parameters as JSON.
+    The archive is written to a temporary file, which is renamed when it is complete, so an existing archive is never
+    a partial one.
+    :param path: the path of the archive
+    :param frames: a dict of the named frames as arrays, see simulators.run
+    :param parameters: None or the parameters of the run, which have to be JSON serializable (numpy arrays are written
+    as lists)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    metadata = json.dumps({} if parameters is None else parameters, default=lambda value: value.tolist())
+    temporary = f"{path}.tmp"
+    with open(temporary, 'wb') as file:
+        np.savez(file, parameters=np.array(metadata), **frames)
+    os.replace(temporary, path)
+
+
+def read_frames(path):
+    """
+    :param path: the path of an archive written by write_frames
+    :return: the dict of the named frames and the parameters of the run
+    """
+    with np.load(path) as archive:
+        parameters = json.loads(str(archive['parameters']))
+        frames = {name: archive[name] for name in archive.files if name != 'parameters'}
+    return frames, parameters
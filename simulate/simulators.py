@@ -0,0 +1,130 @@
+import numpy as np
+
+# the parameters of every simulator and their defaults, which match the configurations of the animations. The names
+# are the arguments of the run_simulation functions
+DEFAULTS = {
+    'heated_plate': {
+        'spacial_dim': 100,
+        'time_steps': 1500,
+        'a': 250,
+        'dx': 1,
+        'dt': 0.01,
+        'heat_positions': [[25, 25, 750]],
+        'boundary_conditions': 'isolated',
+        'simulator': 'implicit',
+    },
+    'cloth': {
+        'spacial_dim': 4,
+        'mass': 0.3,
+        'spacing': 1,
+        'spring_constants': [100, 50, 10],
+        'damping_constants': [0, 0, 0],
+        'gravity': [0, 0, 10],
+        'dt': 0.01,
+        'num_steps': 1500,
+        'simulation_type': 'implicit_euler',
+        'num_of_fixed_corners': 2,
+    },
+    'fluid': {
+        'engine': 'staggered',
+        'spacial_dim': 30,
+        'vortex_speeds': [5, 5],
+        'vortex_centers': [[9.5, 9.5], [19.5, 19.5]],
+        'clockwise': [True, True],
+        'steps': 3000,
+        'dt': 0.02,
+        'rho': 1.5,
+        'viscosity': 0,
+        'cfl': None,
+        'workers': 1,
+        'solver': 'direct',
+        'solver_options': {},
+        'advection_scheme': 'semi_lagrangian',
+        'backtrace': 'euler',
+    },
+}
+
+
+def run_heated_plate(parameters, profiler=None):
+    """
+    :return: the temperatures of every step, of shape (steps + 1, spacial_dim, spacial_dim)
+    """
+    from heated_plate.heated_plate_simulation import run_simulation
+
+    return {'temperatures': np.stack(run_simulation(**parameters, profiler=profiler))}
+
+
+def run_cloth(parameters, profiler=None):
+    """
+    :return: the positions of the vertices of every step, of shape (steps + 1, 3, spacial_dim, spacial_dim) with the
+    x, y and z coordinates along the second axis
+    """
+    from cloth_simulation.cloth_simulation import run_simulation
+
+    parameters = dict(parameters)
+    for name in ['spring_constants', 'damping_constants', 'gravity']:
+        parameters[name] = np.asarray(parameters[name], dtype=float)
+    return {'positions': np.array(run_simulation(**parameters, profiler=profiler))}
+
+
+def run_fluid(parameters, profiler=None):
+    """
+    Runs the staggered grid engine in a closed box or the spectral engine in a periodic domain, which ignores the
+    solver and the advection parameters
+    :return: the velocities of every frame as regular grids, of shape (steps + 1, rows, cols, 2), and the pressures, of
+    shape (steps + 1, rows, cols)
+    """
+    parameters = dict(parameters)
+    engine = parameters.pop('engine')
+    if np.ndim(parameters['spacial_dim']) > 0:
+        parameters['spacial_dim'] = tuple(parameters['spacial_dim'])
+    if engine == 'staggered':
+        from fluid_simulation.fluid_simulation import run_simulation
+    elif engine == 'spectral':
+        from fluid_simulation.spectral_simulation import run_simulation
+        for name in ['solver', 'solver_options', 'advection_scheme', 'backtrace']:
+            del parameters[name]
+    else:
+        raise ValueError("Invalid engine. Please choose 'staggered' or 'spectral'")
+
+    results = run_simulation(**parameters, profiler=profiler)
+    return {'velocities': np.stack(results.velocities), 'pressures': np.stack(results.pressures)}
+
+
+# the function running every simulator: parameters, profiler -> a dict of the named frames as arrays, whose first axis
+# are the steps
+SIMULATORS = {
+    'heated_plate': run_heated_plate,
+    'cloth': run_cloth,
+    'fluid': run_fluid,
+}
+
+
+def resolve_parameters(simulator, parameters=None):
+    """
+    :param simulator: the name of the simulator, see SIMULATORS
+    :param parameters: None or a dict of parameters overriding the defaults
+    :return: the defaults of the simulator updated with the parameters
+    """
+    if simulator not in SIMULATORS:
+        raise ValueError(f"Invalid simulator '{simulator}'. Please choose one of {', '.join(SIMULATORS)}")
+    parameters = {} if parameters is None else parameters
+    unknown = sorted(set(parameters) - set(DEFAULTS[simulator]))
+    if unknown:
+        raise ValueError(
+            f"Invalid parameters {', '.join(unknown)} of {simulator}. "
+            f"Please choose from {', '.join(DEFAULTS[simulator])}"
+        )
+    return {**DEFAULTS[simulator], **parameters}
+
+
+def run(simulator, parameters=None, profiler=None):
+    """
+    Runs a simulator without any plotting
+    :param simulator: the name of the simulator, see SIMULATORS
+    :param parameters: None or a dict of parameters overriding the defaults, see DEFAULTS
+    :param profiler: None or a profiler (see profiling.Profiler), which times the phases of every step
+    :return: a dict of the named frames as arrays, whose first axis are the steps
+    """
+    parameters = resolve_parameters(simulator, parameters)
+    return SIMULATORS[simulator](parameters, profiler)
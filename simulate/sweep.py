@@ -0,0 +1,209 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from simulate.frames import write_frames
+from simulate.simulators import run, resolve_parameters
+
+# the file in the output directory receiving the summary of every finished run as one line of JSON
+SUMMARY_FILE = 'runs.jsonl'
+
+
+def expand_grid(grid, parameters=None):
+    """
+    :param grid: a dict mapping parameters to lists of values, e.g. {'a': [100, 250], 'dt': [0.01, 0.001]}
+    :param parameters: None or a dict of parameters shared by all runs
+    :return: the parameters of every combination of the values of the grid, in the order of the grid
+    """
+    shared = {} if parameters is None else parameters
+    names = list(grid)
+    return [{**shared, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+
+def run_name(simulator, parameters):
+    """
+    :param simulator: the name of the simulator
+    :param parameters: the resolved parameters of the run, see simulators.resolve_parameters
+    :return: a name of the run, which is the same for the same parameters. It names the archive of its frames
+    """
+    key = json.dumps(parameters, sort_keys=True, default=lambda value: value.tolist())
+    return f"{simulator}-{hashlib.sha1(key.encode()).hexdigest()[:12]}"
+
+
+def _setup_worker(quiet):
+    # the simulators import their slow modules on first use, which would be timed as part of the first run of a worker
+    import scipy.sparse.linalg  # noqa: F401
+    import tqdm  # noqa: F401
+    import cloth_simulation  # noqa: F401
+    import fluid_simulation  # noqa: F401
+    import heated_plate  # noqa: F401
+
+    if quiet:
+        # the progress bars and messages of the simulations in the workers would interleave, the summaries replace them
+        sys.stdout = sys.stderr = open(os.devnull, 'w')
+
+
+def run_one(simulator, parameters, path):
+    """
+    Runs a simulation and writes its frames to disk, this runs in the worker processes. Only the summary is sent back,
+    the frames stay in the archive.
+    :param simulator: the name of the simulator
+    :param parameters: the resolved parameters of the run
+    :param path: the path of the archive to write the frames to, see frames.write_frames
+    :return: the summary of the run: the seconds of the simulation and of writing the frames, the steps per second, the
+    size of the archive and the seconds of the phases timed by the simulator
+    """
+    from profiling import Profiler
+
+    profiler = Profiler()
+    start = time.perf_counter()
+    frames = run(simulator, parameters, profiler)
+    seconds = time.perf_counter() - start
+    write_frames(path, frames, parameters)
+    steps = len(next(iter(frames.values()))) - 1
+    return {
+        'seconds': seconds,
+        'write_seconds': time.perf_counter() - start - seconds,
+        'steps': steps,
+        'steps_per_second': steps / seconds if seconds > 0 else float('inf'),
+        'bytes': os.path.getsize(path),
+        'phase_seconds': {
+            name: totals['seconds'] for name, totals in profiler.summary().items() if 'seconds' in totals
+        },
+    }
+
+
+def run_sweep(simulator, grid, output_directory, parameters=None, workers=None, resume=True, quiet=True, log=print):
+    """
+    Runs a simulator for every combination of the values of a parameter grid in a pool of processes. Every run writes
+    its frames to an archive in the output directory, which is named after its parameters (see run_name), and appends
+    its summary to runs.jsonl. Runs, whose archive exists, are skipped when resuming, since the archives are only
+    renamed into place when they are complete. Failed runs are reported and left out, so they are retried when resuming.
+    :param simulator: the name of the simulator, see simulators.SIMULATORS
+    :param grid: a dict mapping parameters to lists of values, see expand_grid
+    :param output_directory: the directory of the archives and the summaries
+    :param parameters: None or a dict of parameters shared by all runs
+    :param workers: the number of processes, None for the number of CPUs
+    :param resume: whether to skip the runs, whose archive exists
+    :param quiet: whether to silence the output of the simulations (e.g. their progress bars) in the workers
+    :param log: a function receiving a line for every finished run
+    :return: the summaries of all runs in the order of the grid, with their name, path, parameters and status ('done',
+    'skipped' or 'failed')
+    """
+    runs = []
+    for run_parameters in expand_grid(grid, parameters):
+        run_parameters = resolve_parameters(simulator, run_parameters)
+        name = run_name(simulator, run_parameters)
+        runs.append({
+            'name': name, 'path': os.path.join(output_directory, f"{name}.npz"), 'parameters': run_parameters
+        })
+    os.makedirs(output_directory, exist_ok=True)
+    summary_path = os.path.join(output_directory, SUMMARY_FILE)
+    previous = read_summaries(summary_path) if resume and os.path.exists(summary_path) else {}
+
+    pending = []
+    for summary in runs:
+        if resume and os.path.exists(summary['path']):
+            # the timings of a skipped run are the ones of the run, which wrote its archive
+            summary.update(previous.get(summary['name'], {}), status='skipped')
+        else:
+            pending.append(summary)
+    log(f"Running {len(pending)} of {len(runs)} runs of {simulator}, {len(runs) - len(pending)} exist already")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_setup_worker, initargs=(quiet,)) as executor, \
+            open(summary_path, 'a') as summaries:
+        futures = {
+            executor.submit(run_one, simulator, summary['parameters'], summary['path']): summary for summary in pending
+        }
+        for finished, future in enumerate(as_completed(futures), start=1):
+            summary = futures[future]
+            try:
+                summary.update(future.result(), status='done')
+                log(
+                    f"[{finished}/{len(pending)}] {summary['name']}: {summary['seconds']:.2f}s, "
+                    f"{summary['steps_per_second']:.1f} steps/s"
+                )
+            except Exception as error:  # one failing combination should not stop the sweep
+                summary.update(status='failed', error=repr(error))
+                log(f"[{finished}/{len(pending)}] {summary['name']} failed: {error!r}")
+            summaries.write(json.dumps(summary, default=lambda value: value.tolist()) + "\n")
+            summaries.flush()
+    return runs
+
+
+def read_summaries(path):
+    """
+    :param path: the path of the summaries of a sweep, see run_sweep
+    :return: a dict mapping the names of the finished runs to their last summary
+    """
+    summaries = {}
+    with open(path) as file:
+        for line in file:
+            summary = json.loads(line)
+            if summary['status'] == 'done':
+                summaries[summary['name']] = summary
+    return summaries
+
+
+def summarize_runs(runs):
+    """
+    :param runs: the summaries of the runs, see run_sweep
+    :return: the number of runs per status, and the total and the mean, minimum and maximum seconds of the done runs
+    """
+    seconds = [summary['seconds'] for summary in runs if summary['status'] == 'done']
+    statistics = {
+        status: sum(summary['status'] == status for summary in runs) for status in ['done', 'skipped', 'failed']
+    }
+    if seconds:
+        statistics.update(
+            total_seconds=sum(seconds), mean_seconds=sum(seconds) / len(seconds), min_seconds=min(seconds),
+            max_seconds=max(seconds)
+        )
+    return statistics
+
+
+def main(arguments=None):
+    """
+    Runs a parameter sweep, which is described by a JSON file:
+        {"simulator": "heated_plate", "parameters": {"time_steps": 200}, "grid": {"a": [100, 250], "dt": [0.01, 0.001]}}
+        python -m simulate.sweep sweep.json --output-directory runs [--workers 4] [--no-resume]
+    The parameters are shared by all runs, the grid maps parameters to their values, whose combinations are run.
+    :return: the exit code, 1 if a run failed
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m simulate.sweep', description=main.__doc__.split(':return')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('sweep', help="the JSON file describing the sweep")
+    parser.add_argument('--output-directory', '-o', default='runs', help="the directory of the frames and summaries")
+    parser.add_argument('--workers', '-w', type=int, help="the number of processes (default: the number of CPUs)")
+    parser.add_argument('--no-resume', action='store_true', help="run again, even if the frames of a run exist")
+    arguments = parser.parse_args(arguments)
+
+    with open(arguments.sweep) as file:
+        sweep = json.load(file)
+    try:
+        runs = run_sweep(
+            sweep['simulator'], sweep.get('grid', {}), arguments.output_directory, sweep.get('parameters'),
+            arguments.workers, not arguments.no_resume
+        )
+    except (KeyError, ValueError) as error:
+        parser.error(f"Invalid sweep {arguments.sweep}: {error}")
+
+    statistics = summarize_runs(runs)
+    print(f"{statistics['done']} done, {statistics['skipped']} skipped, {statistics['failed']} failed")
+    if statistics['done'] > 0:
+        print(
+            f"Seconds per run: mean {statistics['mean_seconds']:.2f}, min {statistics['min_seconds']:.2f}, "
+            f"max {statistics['max_seconds']:.2f}, total {statistics['total_seconds']:.2f}"
+        )
+    return 1 if statistics['failed'] > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
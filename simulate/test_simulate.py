@@ -0,0 +1,88 @@
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+from simulate import run, read_frames, write_frames, resolve_parameters
+from simulate.__main__ import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# small runs of every simulator
+SMALL_PARAMETERS = {
+    'heated_plate': {'spacial_dim': 8, 'time_steps': 3, 'heat_positions': [[4, 4, 100]]},
+    'cloth': {'spacial_dim': 3, 'num_steps': 3},
+    'fluid': {
+        'spacial_dim': [6, 8], 'vortex_speeds': [3], 'vortex_centers': [[3, 4]], 'clockwise': [True], 'steps': 3
+    },
+}
+
+
+class SimulateTest(unittest.TestCase):
+    def test_run(self):
+        frames = run('heated_plate', SMALL_PARAMETERS['heated_plate'])
+        self.assertEqual(frames['temperatures'].shape, (4, 8, 8))
+        self.assertEqual(frames['temperatures'][0, 4, 4], 100)
+
+        frames = run('cloth', SMALL_PARAMETERS['cloth'])
+        self.assertEqual(frames['positions'].shape, (4, 3, 3, 3))
+
+        for engine in ['staggered', 'spectral']:
+            frames = run('fluid', {**SMALL_PARAMETERS['fluid'], 'engine': engine})
+            self.assertEqual(frames['velocities'].shape, (4, 6, 8, 2))
+            self.assertEqual(frames['pressures'].shape, (4, 6, 8))
+
+        with self.assertRaises(ValueError):
+            run('water')
+        with self.assertRaises(ValueError):
+            resolve_parameters('cloth', {'rho': 1})
+        with self.assertRaises(ValueError):
+            run('fluid', {**SMALL_PARAMETERS['fluid'], 'engine': 'lattice'})
+
+    def test_frames(self):
+        frames = {'temperatures': np.arange(12.).reshape((3, 2, 2))}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'runs', 'plate.npz')
+            write_frames(path, frames, {'a': 250, 'gravity': np.array([0, 0, 10])})
+            self.assertEqual(os.listdir(os.path.dirname(path)), ['plate.npz'])
+            read, parameters = read_frames(path)
+        np.testing.assert_array_equal(read['temperatures'], frames['temperatures'])
+        self.assertEqual(parameters, {'a': 250, 'gravity': [0, 0, 10]})
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            config = os.path.join(directory, 'cloth.json')
+            with open(config, 'w') as file:
+                json.dump({**SMALL_PARAMETERS['cloth'], 'simulation_type': 'rk2'}, file)
+            output = os.path.join(directory, 'cloth.npz')
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                self.assertEqual(main(['cloth', '--config', config, '--num-steps', '2', '--gravity', '[0, 0, 5]',
+                                       '--output', output, '--profile']), 0)
+            frames, parameters = read_frames(output)
+
+        self.assertEqual(frames['positions'].shape, (3, 3, 3, 3))
+        self.assertEqual(parameters['num_steps'], 2)  # the flags override the config
+        self.assertEqual(parameters['simulation_type'], 'rk2')  # the config overrides the defaults
+        self.assertEqual(parameters['gravity'], [0, 0, 5])
+
+    def test_lazy_imports(self):
+        # importing the simulators neither loads matplotlib nor the slow modules, which are only needed to run them
+        code = (
+            "import sys, simulate, heated_plate, cloth_simulation, fluid_simulation\n"
+            "from fluid_simulation import fluid_animation, fluid_simulation_3d, spectral_simulation\n"
+            "from cloth_simulation import cloth_animation\n"
+            "from heated_plate import heated_plate_animation\n"
+            "print(sorted(m for m in sys.modules if m.startswith(('matplotlib', 'tqdm', 'scipy.sparse.linalg'))))"
+        )
+        output = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
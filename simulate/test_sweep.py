@@ -0,0 +1,74 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from simulate import read_frames
+from simulate.sweep import expand_grid, run_name, run_sweep, summarize_runs, main, SUMMARY_FILE
+
+# small runs of the heated plate, which differ in the diffusion constant and the simulator
+PARAMETERS = {'spacial_dim': 6, 'time_steps': 3, 'heat_positions': [[3, 3, 100]]}
+GRID = {'a': [100, 250], 'simulator': ['forward', 'implicit']}
+
+
+class SweepTest(unittest.TestCase):
+    def test_expand_grid(self):
+        runs = expand_grid(GRID, PARAMETERS)
+        self.assertEqual(len(runs), 4)
+        self.assertEqual([(run['a'], run['simulator']) for run in runs], [
+            (100, 'forward'), (100, 'implicit'), (250, 'forward'), (250, 'implicit')
+        ])
+        self.assertTrue(all(run['spacial_dim'] == 6 for run in runs))
+        self.assertEqual(expand_grid({}), [{}])
+
+        self.assertEqual(run_name('cloth', {'mass': 1, 'dt': 2}), run_name('cloth', {'dt': 2, 'mass': 1}))
+        self.assertNotEqual(run_name('cloth', {'mass': 1}), run_name('cloth', {'mass': 2}))
+
+    def test_run_sweep(self):
+        lines = []
+        with tempfile.TemporaryDirectory() as directory:
+            runs = run_sweep('heated_plate', GRID, directory, PARAMETERS, workers=2, log=lines.append)
+            self.assertEqual([run['status'] for run in runs], ['done'] * 4)
+            self.assertEqual(len(lines), 5)
+            for run in runs:
+                frames, parameters = read_frames(run['path'])
+                self.assertEqual(frames['temperatures'].shape, (4, 6, 6))
+                self.assertEqual(parameters, run['parameters'])
+                self.assertEqual(run['steps'], 3)
+                self.assertGreater(run['bytes'], 0)
+                self.assertIn('assemble', run['phase_seconds'])
+            self.assertEqual(summarize_runs(runs)['done'], 4)
+
+            # resuming skips the existing runs and keeps their timings, a failing run does not stop the others
+            grid = {**GRID, 'simulator': ['forward', 'implicit', 'backward']}
+            resumed = run_sweep('heated_plate', grid, directory, PARAMETERS, workers=2, log=lines.append)
+            statuses = [run['status'] for run in resumed]
+            self.assertEqual(statuses, ['skipped', 'skipped', 'failed'] * 2)
+            self.assertEqual(resumed[0]['seconds'], runs[0]['seconds'])
+            self.assertIn('ValueError', resumed[2]['error'])
+            self.assertFalse(os.path.exists(resumed[2]['path']))
+            self.assertEqual(summarize_runs(resumed), {'done': 0, 'skipped': 4, 'failed': 2})
+
+            with open(os.path.join(directory, SUMMARY_FILE)) as file:
+                self.assertEqual(len(file.readlines()), 6)
+
+            with self.assertRaises(ValueError):
+                run_sweep('heated_plate', {'rho': [1, 2]}, directory)
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sweep.json')
+            with open(path, 'w') as file:
+                json.dump({'simulator': 'heated_plate', 'parameters': PARAMETERS, 'grid': {'a': [100, 250]}}, file)
+            output = os.path.join(directory, 'runs')
+            with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                self.assertEqual(main([path, '--output-directory', output, '--workers', '2']), 0)
+                self.assertEqual(main([path, '--output-directory', output, '--workers', '2']), 0)
+            self.assertIn('0 done, 2 skipped, 0 failed', stdout.getvalue())
+            self.assertEqual(len([name for name in os.listdir(output) if name.endswith('.npz')]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()